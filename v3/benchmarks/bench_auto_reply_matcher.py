@@ -0,0 +1,114 @@
+"""Benchmark: auto-reply rule matching, one search per rule vs AutoReplyMatcher.
+
+Builds a synthetic chat corpus (short chatter, links, code snippets, emoji,
+a small share of help requests) and times, in messages per second:
+- the per-rule loop handle_regex_replies used before: one IGNORECASE search
+  per compiled pattern until one matches
+- AutoReplyMatcher: literal prefilter, then one combined alternation and an
+  in-order check of the rules before the one it found
+
+Both run on the rules in prompts/autoreplyregex.txt and on that list grown to
+RULE_COUNT rules, and must pick the same rule for every message.
+
+Run from the v3 directory:
+    python -m benchmarks.bench_auto_reply_matcher
+"""
+
+import os
+import random
+import re
+import time
+
+from bot.auto_reply_matcher import build_matcher
+
+CORPUS_SIZE = 50_000
+MATCH_SHARE = 0.03
+RULE_COUNT = 60
+RULES_PATH = os.path.join(os.path.dirname(__file__), "..", "prompts", "autoreplyregex.txt")
+
+CHATTER = [
+    "lol", "gg", "nice", "anyone up for a match tonight?", "just got a new monitor, 1440p 165hz",
+    "what fps do you get in cyberpunk with that card", "brb", "that patch note is wild",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "ok so the render finished in 4 minutes",
+    "```py\nfor i in range(10):\n    print(i)\n```", "<:pepehands:123456789012345678>",
+    "my cat just walked across the keyboard", "is the 4070 worth it over the 3080?",
+    "thanks, that fixed it!", "honestly the drivers are fine now", "does anyone know when the sale ends",
+    "I tried it yesterday and it was great", "uploading the log now", "😂😂😂",
+]
+HELP = [
+    "can someone help me with my build", "my mic is not working after the update",
+    "I need help installing the drivers", "nothing worked so far, any ideas?",
+    "anybody help me set this up?", "need help setting up OBS",
+]
+EXTRA_TOPICS = ["drivers", "obs", "mod", "server", "launcher", "overlay", "controller", "stream",
+                "plugin", "update", "install", "crash", "account", "bios", "router"]
+
+
+def _rules() -> str:
+    with open(RULES_PATH, encoding="utf-8") as f:
+        return f.read()
+
+
+def _grown_rules(base: str) -> str:
+    """The shipped rules plus realistic topic rules, RULE_COUNT in total."""
+    rng = random.Random(1)
+    lines = [line for line in base.splitlines() if line.strip()]
+    templates = [r"{t} (?:is )?(?:broken|crash(?:es|ing)?)", r"how (?:do i|to) (?:fix|install) (?:the |my )?{t}",
+                 r"\b{t} won'?t (?:start|load|open)", r"(?:error|issue) with (?:the |my )?{t}"]
+    while len(lines) < RULE_COUNT:
+        lines.append(rng.choice(templates).format(t=rng.choice(EXTRA_TOPICS)))
+    return "\n".join(lines)
+
+
+def _corpus() -> list[str]:
+    rng = random.Random(0)
+    messages = []
+    for _ in range(CORPUS_SIZE):
+        if rng.random() < MATCH_SHARE:
+            messages.append(rng.choice(HELP))
+        else:
+            words = " ".join(rng.choice(CHATTER) for _ in range(rng.randint(1, 3)))
+            messages.append(words if rng.random() < 0.7 else words.upper())
+    return messages
+
+
+def _time(match, corpus: list[str], rounds: int) -> tuple[float, list]:
+    results = [match(text) for text in corpus]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in corpus:
+            match(text)
+    return len(corpus) * rounds / (time.perf_counter() - started), results
+
+
+def _compare(label: str, content: str, corpus: list[str], rounds: int):
+    patterns = [line.strip() for line in content.splitlines() if line.strip()]
+    compiled = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+    matcher = build_matcher(content)
+
+    def loop(text: str):
+        for pattern in compiled:
+            if pattern.search(text):
+                return pattern.pattern
+        return None
+
+    loop_rate, loop_results = _time(loop, corpus, rounds)
+    matcher_rate, matcher_results = _time(matcher.match, corpus, rounds)
+    assert loop_results == matcher_results, "matchers picked different rules"
+    matched = sum(r is not None for r in matcher_results)
+
+    print(f"{label}: {len(patterns)} rules, {len(matcher.literals)} prefilter literals, "
+          f"{matched}/{len(corpus)} messages match")
+    print(f"  per-rule loop  : {loop_rate:12,.0f} messages/s")
+    print(f"  AutoReplyMatcher: {matcher_rate:11,.0f} messages/s ({matcher_rate / loop_rate:.1f}x)")
+
+
+def main(rounds: int = 5):
+    corpus = _corpus()
+    content = _rules()
+    _compare("autoreplyregex.txt", content, corpus, rounds)
+    _compare("grown rule list", _grown_rules(content), corpus, rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark and golden check for the 3DMark GPU name matcher.
+
+Checks every query in gpu_golden_queries.json against both the original
+process.extractOne(..., scorer=custom_fuzzy_scorer) path and the prebuilt
+GpuIndex, then reports per-lookup latency for each and the cost of scoring a
+multi-GPU comparison in one batch. Exits non-zero if either path disagrees
+with the golden corpus.
+
+Run from the v3 directory:
+    python -m benchmarks.bench_gpu_lookup
+"""
+
+import json
+import sys
+import time
+
+from thefuzz import process
+
+from claude.gpu_index import GPU_INDEX
+from claude.tools import custom_fuzzy_scorer
+
+GOLDEN_PATH = "benchmarks/gpu_golden_queries.json"
+COMPARISON = ["4070", "7800 XT", "3080 12GB"]
+
+
+def _original_lookup(query: str):
+    # The pre-index implementation: reload the list and score every name
+    with open("claude/gpu_id_list.json", "r") as file:
+        gpu_id_list = json.load(file)
+    gpu_name_list = [gpu.get("name") for gpu in gpu_id_list]
+    return process.extractOne(query, gpu_name_list, scorer=custom_fuzzy_scorer)
+
+
+def _time_per_lookup(lookup, queries, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            lookup(query)
+    return (time.perf_counter() - start) / (rounds * len(queries))
+
+
+def main(rounds: int = 3) -> int:
+    with open(GOLDEN_PATH) as file:
+        golden = json.load(file)
+
+    failures = 0
+    for case in golden:
+        original = _original_lookup(case["query"])
+        indexed = GPU_INDEX.best_match(case["query"])
+        expected = (case["expected"], case["score"])
+        if (original[0], original[1]) != expected or (indexed[0], indexed[1]) != expected:
+            failures += 1
+            print(f"MISMATCH {case['query']!r}: expected {expected}, original {original}, index {indexed[:2]}")
+
+    queries = [case["query"] for case in golden]
+    before = _time_per_lookup(_original_lookup, queries, rounds)
+    after = _time_per_lookup(GPU_INDEX.best_match, queries, rounds)
+
+    print(f"golden queries: {len(golden)}, mismatches: {failures}")
+    print(f"original: {before * 1000:.2f} ms/lookup")
+    print(f"index:    {after * 1000:.2f} ms/lookup")
+    print(f"speedup:  {before / after:.1f}x")
+
+    batch = _time_per_lookup(lambda queries: GPU_INDEX.best_matches(queries), [COMPARISON], rounds * 20)
+    batch_mismatches = sum(
+        (indexed[0], indexed[1]) != (original[0], original[1])
+        for indexed, original in zip(GPU_INDEX.best_matches(COMPARISON), map(_original_lookup, COMPARISON))
+    )
+    failures += batch_mismatches
+    print(f"batch of {len(COMPARISON)} ({' vs '.join(COMPARISON)}): {batch * 1000:.2f} ms, mismatches: {batch_mismatches}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
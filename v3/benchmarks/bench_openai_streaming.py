@@ -0,0 +1,217 @@
+"""Benchmark: time to first visible character, streamed vs non-streamed OpenAI replies.
+
+Starts a local stub of the OpenAI chat completions endpoint that "generates"
+tokens at a fixed rate, then runs generate_openai_response against it with and
+without a StreamingReply. The first turn of every run is a tool call whose
+JSON arguments arrive split across several chunks, so the incremental
+tool-call assembly is exercised too. Discord is replaced by a stub that
+records when the first message is posted. No network access or API keys are
+needed.
+
+Afterwards it checks that AGENT_MAX_TOKENS and AGENT_MAX_COST_USD stop a
+streamed loop whose model never stops calling tools, which only works when
+the streamed usage chunk arrives.
+
+Run from the v3 directory:
+    python -m benchmarks.bench_openai_streaming
+"""
+
+import asyncio
+import json
+import time
+
+from aiohttp import web
+from openai import AsyncOpenAI
+
+from bot import agent_loop
+from bot.config import Config
+from bot.streaming import StreamingReply
+from claude import tools
+from local_llm import response
+
+TOKENS_PER_SECOND = 40
+ANSWER_TOKENS = 120
+TOOL_ARGUMENT_CHUNKS = ['{"search', '_query": "', 'rtx 4090 ', 'vs 4080"}']
+# Set by the budget check: the model calls a tool on every turn that offers tools
+ALWAYS_CALL_TOOLS = False
+
+
+def _chunk(delta: dict, finish_reason=None) -> bytes:
+    payload = {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "stub",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+def _usage_chunk(completion_tokens: int) -> bytes:
+    # Sent last when the request asks for stream_options.include_usage, as OpenAI does
+    payload = {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "stub",
+        "choices": [],
+        "usage": {"prompt_tokens": 500, "completion_tokens": completion_tokens, "total_tokens": 500 + completion_tokens},
+    }
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+def _completion(message: dict, finish_reason: str) -> dict:
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stub",
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+    }
+
+
+async def _chat_completions(request: web.Request):
+    body = await request.json()
+    is_tool_turn = "tools" in body and (ALWAYS_CALL_TOOLS or body["messages"][-1]["role"] != "tool")
+    delay = 1 / TOKENS_PER_SECOND
+    words = [f"word{index} " for index in range(ANSWER_TOKENS)]
+
+    if not body.get("stream"):
+        # The server still spends the full generation time before answering
+        await asyncio.sleep(delay * (len(TOOL_ARGUMENT_CHUNKS) if is_tool_turn else len(words)))
+        if is_tool_turn:
+            call = {"id": "call_0", "type": "function",
+                    "function": {"name": "exa_web_search", "arguments": "".join(TOOL_ARGUMENT_CHUNKS)}}
+            return web.json_response(_completion({"role": "assistant", "content": None, "tool_calls": [call]}, "tool_calls"))
+        return web.json_response(_completion({"role": "assistant", "content": "".join(words)}, "stop"))
+
+    stream = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await stream.prepare(request)
+    if is_tool_turn:
+        for index, fragment in enumerate(TOOL_ARGUMENT_CHUNKS):
+            await asyncio.sleep(delay)
+            function = {"arguments": fragment}
+            call = {"index": 0, "function": function}
+            if index == 0:
+                call.update(id="call_0", type="function")
+                function["name"] = "exa_web_search"
+            await stream.write(_chunk({"tool_calls": [call]}))
+        await stream.write(_chunk({}, "tool_calls"))
+    else:
+        for word in words:
+            await asyncio.sleep(delay)
+            await stream.write(_chunk({"content": word}))
+        await stream.write(_chunk({}, "stop"))
+    if (body.get("stream_options") or {}).get("include_usage"):
+        await stream.write(_usage_chunk(len(TOOL_ARGUMENT_CHUNKS) if is_tool_turn else len(words)))
+    await stream.write(b"data: [DONE]\n\n")
+    return stream
+
+
+class StubMessage:
+    async def edit(self, content):
+        # Like discord.Message.edit, return the updated message
+        return self
+
+
+async def _run_once(streamed: bool) -> tuple[float, float]:
+    start = time.perf_counter()
+    first_visible = None
+
+    async def send(content):
+        nonlocal first_visible
+        if first_visible is None:
+            first_visible = time.perf_counter() - start
+        return StubMessage()
+
+    stream = StreamingReply(send, edit_interval=0.5) if streamed else None
+    reply = await response.generate_openai_response([{"role": "user", "content": "compare"}], "system", stream=stream)
+    if stream is not None:
+        await stream.finish(reply)
+    else:
+        await send(reply)
+    return first_visible, time.perf_counter() - start
+
+
+async def _check_budgets():
+    """A runaway streamed loop must stop on tokens, then on cost, well before the round limit."""
+    global ALWAYS_CALL_TOOLS
+    ALWAYS_CALL_TOOLS = True
+    saved = (Config.AGENT_MAX_TOOL_ROUNDS, Config.AGENT_DEADLINE_SECONDS, Config.AGENT_MAX_TOKENS,
+             Config.AGENT_MAX_COST_USD, Config.OPENAI_INPUT_COST_PER_MTOK)
+    Config.AGENT_MAX_TOOL_ROUNDS, Config.AGENT_DEADLINE_SECONDS = 50, 0
+    try:
+        # Each stub call reports 500 prompt tokens plus a few completion tokens
+        for limit, tokens, cost in (("tokens", 1500, 0), ("cost", 0, 0.0015)):
+            Config.AGENT_MAX_TOKENS, Config.AGENT_MAX_COST_USD = tokens, cost
+            Config.OPENAI_INPUT_COST_PER_MTOK = 1.0
+            before = agent_loop.stats()[limit]
+            calls = 0
+            stream_complete = response._stream_complete
+
+            async def counting_stream_complete(request, stream):
+                nonlocal calls
+                calls += 1
+                return await stream_complete(request, stream)
+            response._stream_complete = counting_stream_complete
+            try:
+                await response.generate_openai_response([{"role": "user", "content": "compare"}], "system",
+                                                        stream=StreamingReply(lambda content: _async(StubMessage())))
+            finally:
+                response._stream_complete = stream_complete
+            assert agent_loop.stats()[limit] == before + 1, f"{limit} budget did not stop the streamed loop"
+            print(f"{limit} budget stopped a streamed tool loop after {calls} calls (incl. the finalize call)")
+    finally:
+        ALWAYS_CALL_TOOLS = False
+        (Config.AGENT_MAX_TOOL_ROUNDS, Config.AGENT_DEADLINE_SECONDS, Config.AGENT_MAX_TOKENS,
+         Config.AGENT_MAX_COST_USD, Config.OPENAI_INPUT_COST_PER_MTOK) = saved
+
+
+async def _async(value):
+    return value
+
+
+async def main(rounds: int = 3):
+    async def exa_stub(tool_input):
+        return f"stub results for {tool_input['search_query']}"
+    tools.exa_web_search = exa_stub
+
+    # Streamed rounds must still report usage for metering and the loop budgets
+    streamed_usage = []
+    stream_complete = response._stream_complete
+
+    async def recording_stream_complete(request, stream):
+        result = await stream_complete(request, stream)
+        streamed_usage.append(result[3])
+        return result
+    response._stream_complete = recording_stream_complete
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", _chat_completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    response.openaiClient = AsyncOpenAI(api_key="stub", base_url=f"http://127.0.0.1:{port}/v1")
+    Config.MAX_TOKENS = Config.MAX_TOKENS or 1024
+
+    try:
+        results = {}
+        for streamed in (False, True):
+            runs = [await _run_once(streamed) for _ in range(rounds)]
+            results[streamed] = (sum(run[0] for run in runs) / rounds, sum(run[1] for run in runs) / rounds)
+        await _check_budgets()
+    finally:
+        await runner.cleanup()
+
+    assert streamed_usage and all(usage is not None for usage in streamed_usage), "streamed rounds without usage"
+    print(f"stub rate: {TOKENS_PER_SECOND} tokens/s, answer: {ANSWER_TOKENS} tokens, one tool round first")
+    for streamed, label in ((False, "non-streamed"), (True, "streamed")):
+        first, total = results[streamed]
+        print(f"{label:13} first visible char: {first * 1000:7.1f} ms   full reply: {total * 1000:7.1f} ms")
+    print(f"time to first visible char improved {results[False][0] / results[True][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
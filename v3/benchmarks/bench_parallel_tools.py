@@ -0,0 +1,75 @@
+"""Benchmark: serial vs concurrent tool execution in generate_claude_response.
+
+Runs a scripted turn where the model asks for three tools at once (Wolfram,
+3DMark and a YouTube transcript) against a local stub client, with each tool
+replaced by a fixed-latency stub. No network access or API keys are needed.
+
+Run from the v3 directory:
+    python -m benchmarks.bench_parallel_tools
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+from bot import tool_runner
+from bot.config import Config
+from claude import response, tools
+
+TOOL_LATENCY = {
+    "wolfram": 0.40,
+    "threedmark_gpu_performance_lookup": 0.25,
+    "youtube_context": 0.60,
+}
+
+
+def _make_stub_tool(name: str, delay: float):
+    async def stub(tool_input):
+        await asyncio.sleep(delay)
+        return f"{name} result for {tool_input}"
+    return stub
+
+
+class StubMessages:
+    """Scripted Messages API: one three-tool turn, then a final text turn."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            content = [
+                SimpleNamespace(type="tool_use", id=f"toolu_{index}", name=name, input={"q": name})
+                for index, name in enumerate(TOOL_LATENCY)
+            ]
+            return SimpleNamespace(stop_reason="tool_use", content=content)
+        return SimpleNamespace(stop_reason="end_turn", content=[SimpleNamespace(type="text", text="done")])
+
+
+async def _run_once(concurrency: int) -> float:
+    Config.TOOL_MAX_CONCURRENCY = concurrency
+    tool_runner._semaphore = None  # The shared limit is read when the semaphore is first made
+    response.claudeClient = SimpleNamespace(messages=StubMessages())
+    start = time.perf_counter()
+    await response.generate_claude_response([{"role": "user", "content": "hi"}], "system")
+    return time.perf_counter() - start
+
+
+async def main(rounds: int = 5):
+    for name, delay in TOOL_LATENCY.items():
+        setattr(tools, name, _make_stub_tool(name, delay))
+
+    serial = [await _run_once(1) for _ in range(rounds)]
+    concurrent = [await _run_once(len(TOOL_LATENCY)) for _ in range(rounds)]
+
+    serial_avg = sum(serial) / rounds
+    concurrent_avg = sum(concurrent) / rounds
+    print(f"tool latencies: {TOOL_LATENCY}")
+    print(f"serial:     {serial_avg * 1000:.1f} ms/turn")
+    print(f"concurrent: {concurrent_avg * 1000:.1f} ms/turn")
+    print(f"speedup:    {serial_avg / concurrent_avg:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""Benchmark: rebuilding a reply chain from the conversation store vs walking it over REST.
+
+Fills a temporary conversation store with many short reply chains plus one
+chain of CHAIN_DEPTH messages, then times:
+- REST walking as gather_reply_chain did before: one sequential
+  channel.fetch_message per hop against a stub channel that waits
+  REST_LATENCY_MS per call (no network access or Discord token needed)
+- conversation_store.load_chain: one recursive SQLite query for the whole chain,
+  including the hop to the store thread
+
+Run from the v3 directory:
+    python -m benchmarks.bench_reply_chain
+"""
+
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from bot import conversation_store
+from bot.config import Config
+
+CHAIN_DEPTH = 20
+BACKGROUND_MESSAGES = 50_000
+REST_LATENCY_MS = 80
+BOT_USER_ID = 1
+
+
+def _message(message_id: int, parent_id, author_id: int):
+    return SimpleNamespace(
+        id=message_id,
+        reference=SimpleNamespace(message_id=parent_id) if parent_id else None,
+        channel=SimpleNamespace(id=10),
+        guild=SimpleNamespace(id=20),
+        author=SimpleNamespace(id=author_id, display_name=f"user{author_id}"),
+        content=f"<@{BOT_USER_ID}> message {message_id} " + "lorem ipsum " * 20,
+        attachments=[],
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+class StubChannel:
+    def __init__(self, messages: dict):
+        self.messages = messages
+        self.fetches = 0
+
+    async def fetch_message(self, message_id: int):
+        self.fetches += 1
+        await asyncio.sleep(REST_LATENCY_MS / 1000)
+        return self.messages[message_id]
+
+
+async def _rest_walk(channel: StubChannel, start_id: int) -> int:
+    current = channel.messages[start_id]
+    hops = 1
+    while current.reference and hops < CHAIN_DEPTH:
+        current = await channel.fetch_message(current.reference.message_id)
+        hops += 1
+    return hops
+
+
+async def main(rounds: int = 200):
+    directory = tempfile.mkdtemp(prefix="bench_reply_chain_")
+    Config.CONVERSATION_STORE_DB = os.path.join(directory, "conversations.sqlite3")
+    Config.CONVERSATION_STORE_ENABLED = True
+
+    rng = random.Random(0)
+    messages = {}
+    next_id = 1000
+    # Background traffic: short chains so the table is not trivially small
+    while len(messages) < BACKGROUND_MESSAGES:
+        parent = None
+        for _ in range(rng.randint(1, 4)):
+            messages[next_id] = _message(next_id, parent, rng.choice((BOT_USER_ID, 2, 3)))
+            parent = next_id
+            next_id += rng.randint(1, 3)
+    parent = None
+    for hop in range(CHAIN_DEPTH):
+        messages[next_id] = _message(next_id, parent, BOT_USER_ID if hop % 2 else 2)
+        parent = next_id
+        next_id += 1
+    newest = parent
+
+    started = time.perf_counter()
+    for message in messages.values():
+        conversation_store.record(message, BOT_USER_ID)
+    conversation_store.flush()
+    insert_seconds = time.perf_counter() - started
+
+    channel = StubChannel(messages)
+    started = time.perf_counter()
+    rest_hops = await _rest_walk(channel, newest)
+    rest_seconds = time.perf_counter() - started
+
+    rows = await conversation_store.load_chain(newest, CHAIN_DEPTH)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        rows = await conversation_store.load_chain(newest, CHAIN_DEPTH)
+    store_seconds = (time.perf_counter() - started) / rounds
+
+    print(f"store: {len(messages)} messages written in {insert_seconds * 1000:.0f} ms "
+          f"({len(messages) / insert_seconds:,.0f} messages/s, batches of {conversation_store.BATCH_SIZE})")
+    print(f"REST walk  : {rest_hops} messages, {channel.fetches} fetches at {REST_LATENCY_MS} ms: {rest_seconds * 1000:8.1f} ms")
+    print(f"store query: {len(rows)} messages, 1 recursive query:        {store_seconds * 1000:8.3f} ms")
+    print(f"chain rebuild {rest_seconds / store_seconds:,.0f}x faster from the store")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
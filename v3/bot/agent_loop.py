@@ -0,0 +1,103 @@
+"""
+Limits for the provider tool loops.
+
+A LoopController tracks one request's tool rounds, wall-clock time, tokens and
+estimated cost. When any limit is reached the provider makes one last
+"finalize" call with tools disabled so the user still gets an answer built
+from what has been gathered, instead of the loop spinning on.
+"""
+
+import time
+from typing import Optional
+from bot.config import Config
+from bot.logger import logger
+
+FINALIZE_PROMPT = (
+    "You have reached the tool use limit for this request. Do not call any more tools. "
+    "Answer the user now using the information you already have, and say briefly if "
+    "anything could not be looked up."
+)
+LIMIT_MESSAGE = "Sorry, I ran out of time working on that. Please try again with a narrower question."
+
+_limit_counts = {"tool_rounds": 0, "deadline": 0, "tokens": 0, "cost": 0}
+
+
+def estimate_cost(provider: str, input_tokens: int, output_tokens: int,
+                  cache_creation_input_tokens: int = 0, cache_read_input_tokens: int = 0) -> float:
+    """USD cost from the configured per-million-token prices. Cache writes bill at 1.25x input, reads at 0.1x."""
+    if provider == "anthropic":
+        input_price, output_price = Config.ANTHROPIC_INPUT_COST_PER_MTOK, Config.ANTHROPIC_OUTPUT_COST_PER_MTOK
+    else:
+        input_price, output_price = Config.OPENAI_INPUT_COST_PER_MTOK, Config.OPENAI_OUTPUT_COST_PER_MTOK
+    return (
+        input_tokens * input_price
+        + cache_creation_input_tokens * input_price * 1.25
+        + cache_read_input_tokens * input_price * 0.1
+        + output_tokens * output_price
+    ) / 1_000_000
+
+
+def stats() -> dict[str, int]:
+    """How often each limit has fired since startup."""
+    return dict(_limit_counts)
+
+
+class LoopController:
+    """Round, deadline, token and cost limits for one request."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.started = time.monotonic()
+        self.rounds = 0
+        self.tokens = 0
+        self.cost = 0.0
+        self.finalizing = False
+        self.limit: Optional[str] = None
+
+    def record(self, input_tokens: int = 0, output_tokens: int = 0,
+               cache_creation_input_tokens: int = 0, cache_read_input_tokens: int = 0):
+        """Add one API call's usage."""
+        self.tokens += input_tokens + output_tokens + cache_creation_input_tokens + cache_read_input_tokens
+        self.cost += estimate_cost(self.provider, input_tokens, output_tokens,
+                                   cache_creation_input_tokens, cache_read_input_tokens)
+
+    def tool_round_done(self):
+        self.rounds += 1
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def _exceeded(self) -> Optional[str]:
+        if Config.AGENT_MAX_TOOL_ROUNDS and self.rounds >= Config.AGENT_MAX_TOOL_ROUNDS:
+            return "tool_rounds"
+        if Config.AGENT_DEADLINE_SECONDS and self.elapsed() >= Config.AGENT_DEADLINE_SECONDS:
+            return "deadline"
+        if Config.AGENT_MAX_TOKENS and self.tokens >= Config.AGENT_MAX_TOKENS:
+            return "tokens"
+        if Config.AGENT_MAX_COST_USD and self.cost >= Config.AGENT_MAX_COST_USD:
+            return "cost"
+        return None
+
+    def should_finalize(self) -> bool:
+        """
+        Check the limits before the next model call.
+
+        Returns True once, when a limit is first hit; the caller then makes its
+        finalize call with tools disabled.
+        """
+        if self.finalizing:
+            return False
+        limit = self._exceeded()
+        if limit is None:
+            return False
+        self.limit = limit
+        self.finalizing = True
+        _limit_counts[limit] += 1
+        logger.warning(
+            "Agent loop limit '%s' hit after %d tool round(s), %.1fs, %d tokens, $%.4f; finalizing without tools",
+            limit, self.rounds, self.elapsed(), self.tokens, self.cost,
+        )
+        return True
+
+    def summary(self) -> str:
+        return f"{self.rounds} tool round(s), {self.elapsed():.1f}s, {self.tokens} tokens, ${self.cost:.4f}"
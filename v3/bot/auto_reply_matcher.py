@@ -0,0 +1,336 @@
+"""
+Single-pass matcher for the regex auto-reply rules.
+
+Auto-reply matching runs on every non-bot message the bot can see, and almost
+none of them match. Instead of one search per rule:
+1. a literal prefilter rejects the message unless it contains one of the
+   substrings some rule requires. The literals are extracted from each
+   rule's parsed regex, and a single C-level alternation searches the
+   casefolded text for them.
+2. only then does one combined alternation run, with each rule in a named
+   group (r0, r1, ...). It finds the rule matching leftmost in the text,
+   which is not necessarily the first matching rule in file order, so the
+   rules before it are then searched one by one.
+
+Rules that cannot share a combined pattern (their own named groups,
+backreferences, inline global flags) are searched separately, and a rule
+without any required literal disables the prefilter, so the matcher always
+picks the same rule as searching every rule in order.
+
+Rules come from two prompt files: each line of autoreplyregex.txt is a rule
+for every channel, and autoreplyrules.json declares rules scoped to channel
+and guild allowlists, optionally with a per-channel cooldown. AutoReplyRules
+gives each channel its own matcher over just the rules in scope there,
+resolved by one dict lookup per message; channels without rules get None and
+skip the regex stage entirely.
+"""
+
+import json
+import re
+import time
+from typing import Any, Optional
+from bot.logger import logger
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse  # type: ignore[no-redef]
+
+_GROUP_REFERENCE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+AUTO_REPLY_FILES = frozenset({"autoreplyregex.txt", "autoreplyrules.json"})
+# Expired cooldowns are swept once the table grows past this
+COOLDOWN_SWEEP_SIZE = 10_000
+
+
+def _best(requirements: list[list[str]]) -> Optional[list[str]]:
+    """The most selective requirement: longest shortest literal, then fewest alternatives."""
+    if not requirements:
+        return None
+    return max(requirements, key=lambda literals: (min(map(len, literals)), -len(literals)))
+
+
+def _required(items) -> Optional[list[str]]:
+    """
+    Literals of which at least one appears in every match of a parsed
+    sequence, or None if no such set was found.
+    """
+    requirements: list[list[str]] = []
+    run: list[str] = []
+
+    def end_run():
+        if run:
+            requirements.append(["".join(run)])
+            run.clear()
+
+    for op, value in items:
+        if op is sre_parse.LITERAL:
+            run.append(chr(value))
+            continue
+        if op is sre_parse.AT:
+            continue  # Anchors and \b match no text, so the run continues
+        end_run()
+        if op is sre_parse.SUBPATTERN:
+            requirement = _required(value[-1])
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None)):
+            requirement = _required(value[2]) if value[0] >= 1 else None
+        elif op is sre_parse.BRANCH:
+            alternatives = [_required(branch) for branch in value[1]]
+            requirement = None if any(alt is None for alt in alternatives) else sorted(
+                {literal for alt in alternatives for literal in alt})
+        else:
+            requirement = None
+        if requirement:
+            requirements.append(requirement)
+    end_run()
+    return _best(requirements)
+
+
+def required_literals(pattern: str) -> Optional[list[str]]:
+    """Casefolded literals, one of which every match of `pattern` contains; None if unknown."""
+    try:
+        literals = _required(sre_parse.parse(pattern, re.IGNORECASE))
+    except Exception:
+        return None
+    if not literals or not all(literals):
+        return None
+    return [literal.casefold() for literal in literals]
+
+
+class AutoReplyMatcher:
+    """Combined auto-reply rules with a literal prefilter. Immutable once built."""
+
+    def __init__(self, patterns: list[str]):
+        """
+        Raises:
+            re.error: If any pattern is not a valid regex
+        """
+        self.rules = list(patterns)
+        combinable = []
+        self._compiled: list[re.Pattern] = []
+        self._separate: set[int] = set()
+        literals: set[str] = set()
+        self.prefilter_complete = True
+
+        for index, pattern in enumerate(self.rules):
+            compiled = re.compile(pattern, re.IGNORECASE)
+            self._compiled.append(compiled)
+            group = f"(?P<r{index}>{pattern})"
+            if compiled.groupindex or _GROUP_REFERENCE.search(pattern) or not self._compiles(group):
+                self._separate.add(index)
+            else:
+                combinable.append(group)
+            required = required_literals(pattern)
+            if required is None:
+                self.prefilter_complete = False
+            else:
+                literals.update(required)
+
+        # A literal that contains another one adds nothing to an any-of check
+        literals = {literal for literal in literals if not any(other != literal and other in literal for other in literals)}
+        self._combined = re.compile("|".join(combinable), re.IGNORECASE) if combinable else None
+        self._prefilter: Optional[re.Pattern] = None
+        if self.prefilter_complete and literals:
+            self._prefilter = re.compile("|".join(re.escape(literal) for literal in sorted(literals, key=len, reverse=True)))
+        self.literals = sorted(literals)
+        logger.debug("Auto-reply matcher: %d rule(s), %d combined, %d literal(s), prefilter %s",
+                     len(self.rules), len(combinable), len(literals), "on" if self._prefilter else "off")
+
+    @staticmethod
+    def _compiles(pattern: str) -> bool:
+        try:
+            re.compile(pattern, re.IGNORECASE)
+        except re.error:
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match_index(self, text: str, start: int = 0) -> Optional[int]:
+        """Index in self.rules of the first rule from `start` on that matches `text`, or None."""
+        if start >= len(self.rules):
+            return None
+        if self._prefilter is not None and not self._prefilter.search(text.casefold()):
+            return None
+        if start:
+            # Only after an earlier match was passed over; rare enough to search rule by rule
+            return next((index for index in range(start, len(self.rules)) if self._compiled[index].search(text)), None)
+        candidate = None
+        if self._combined is not None:
+            found = self._combined.search(text)
+            if found is not None:
+                candidate = int(found.lastgroup[1:])
+        # Without a candidate no combined rule matches, so only separate rules are left
+        for index in range(candidate if candidate is not None else len(self.rules)):
+            if (candidate is not None or index in self._separate) and self._compiled[index].search(text):
+                return index
+        return candidate
+
+    def match(self, text: str) -> Optional[str]:
+        """The first rule, in order, that matches `text`, or None."""
+        index = self.match_index(text)
+        return self.rules[index] if index is not None else None
+
+
+class AutoReplyRule:
+    """One auto-reply regex and where it applies. No channels and no guilds means everywhere."""
+
+    __slots__ = ("pattern", "channels", "guilds", "cooldown_seconds")
+
+    def __init__(self, pattern: str, channels=(), guilds=(), cooldown_seconds: float = 0):
+        self.pattern = pattern
+        self.channels = frozenset(int(channel) for channel in channels)
+        self.guilds = frozenset(int(guild) for guild in guilds)
+        self.cooldown_seconds = float(cooldown_seconds)
+
+    @property
+    def is_global(self) -> bool:
+        return not self.channels and not self.guilds
+
+    def applies_to(self, guild_id: Optional[int], channel_ids: tuple[int, ...]) -> bool:
+        """Whether the rule is in scope for a channel (or a thread and its parent) in `guild_id`."""
+        return self.is_global or guild_id in self.guilds or any(channel in self.channels for channel in channel_ids)
+
+
+class AutoReplyRules:
+    """
+    All auto-reply rules, with a matcher per channel. Immutable once built
+    except for its caches and cooldowns.
+
+    A channel's rule set is resolved on its first message and cached by
+    channel ID; matchers are compiled once per distinct rule set, so every
+    channel that only sees the global rules shares one matcher.
+    """
+
+    def __init__(self, rules: list[AutoReplyRule], cooldowns: Optional[dict[tuple[str, int], float]] = None):
+        """
+        Args:
+            rules: Rules in priority order
+            cooldowns: (pattern, channel_id) -> monotonic time the rule last fired;
+                pass the previous rule book's to keep cooldowns across reloads
+
+        Raises:
+            re.error: If any pattern is not a valid regex
+        """
+        self.rules = list(rules)
+        self.cooldowns = cooldowns if cooldowns is not None else {}
+        self._scoped = any(not rule.is_global for rule in self.rules)
+        self._longest_cooldown = max((rule.cooldown_seconds for rule in self.rules), default=0)
+        # Rule indices -> (matcher, rules); None when no rule applies
+        self._matchers: dict[tuple[int, ...], Optional[tuple[AutoReplyMatcher, tuple[AutoReplyRule, ...]]]] = {}
+        self._channels: dict[int, Optional[tuple[AutoReplyMatcher, tuple[AutoReplyRule, ...]]]] = {}
+        for rule in self.rules:
+            re.compile(rule.pattern, re.IGNORECASE)
+        # Compiled up front: every channel uses it when no rule is scoped
+        self._global = self._compile(tuple(i for i, rule in enumerate(self.rules) if rule.is_global))
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _compile(self, indices: tuple[int, ...]):
+        if indices not in self._matchers:
+            rules = tuple(self.rules[i] for i in indices)
+            self._matchers[indices] = (AutoReplyMatcher([rule.pattern for rule in rules]), rules) if rules else None
+        return self._matchers[indices]
+
+    def _resolve(self, guild_id: Optional[int], channel_id: int, parent_id: Optional[int]):
+        if not self._scoped:
+            return self._global
+        resolved = self._channels.get(channel_id, False)
+        if resolved is False:
+            channel_ids = (channel_id, parent_id) if parent_id else (channel_id,)
+            resolved = self._compile(tuple(
+                i for i, rule in enumerate(self.rules) if rule.applies_to(guild_id, channel_ids)))
+            self._channels[channel_id] = resolved
+        return resolved
+
+    def match(self, text: str, guild_id: Optional[int], channel_id: int,
+              parent_id: Optional[int] = None) -> Optional[AutoReplyRule]:
+        """
+        The first rule in scope for the channel that matches `text` and is not
+        cooling down there, or None. The returned rule is recorded as firing.
+
+        Args:
+            text: Message content
+            guild_id: Guild the message was sent in, None in DMs
+            channel_id: Channel (or thread) the message was sent in
+            parent_id: A thread's parent channel, whose rules also apply
+        """
+        resolved = self._resolve(guild_id, channel_id, parent_id)
+        if resolved is None:
+            return None  # No rules in scope: skip the regex stage entirely
+        matcher, rules = resolved
+        index = matcher.match_index(text)
+        while index is not None:
+            if not self.cooling_down(rules[index], channel_id):
+                return rules[index]
+            logger.debug("Auto-reply regex '%s' matched in channel %s but is cooling down", rules[index].pattern, channel_id)
+            index = matcher.match_index(text, index + 1)
+        return None
+
+    def cooling_down(self, rule: AutoReplyRule, channel_id: int) -> bool:
+        """
+        Whether `rule` fired in the channel less than its cooldown ago. When it
+        did not, the rule is recorded as firing now.
+        """
+        if rule.cooldown_seconds <= 0:
+            return False
+        now = time.monotonic()
+        key = (rule.pattern, channel_id)
+        last = self.cooldowns.get(key)
+        if last is not None and now - last < rule.cooldown_seconds:
+            return True
+        self.cooldowns[key] = now
+        if len(self.cooldowns) > COOLDOWN_SWEEP_SIZE:
+            for stale in [k for k, fired in self.cooldowns.items() if now - fired >= self._longest_cooldown]:
+                del self.cooldowns[stale]
+        return False
+
+
+def build_matcher(content: str) -> AutoReplyMatcher:
+    """
+    Matcher for the non-blank lines of autoreplyregex.txt.
+
+    Raises:
+        re.error: If any line is not a valid regex
+    """
+    return AutoReplyMatcher([line.strip() for line in content.splitlines() if line.strip()])
+
+
+def _parse_rule(entry: Any) -> AutoReplyRule:
+    if not isinstance(entry, dict) or not isinstance(entry.get("pattern"), str) or not entry["pattern"].strip():
+        raise ValueError(f"auto-reply rule needs a non-empty \"pattern\": {entry!r}")
+    unknown = set(entry) - {"pattern", "channels", "guilds", "cooldown_seconds"}
+    if unknown:
+        raise ValueError(f"unknown auto-reply rule key(s) {sorted(unknown)} in {entry!r}")
+    channels = entry.get("channels") or []
+    guilds = entry.get("guilds") or []
+    if not isinstance(channels, list) or not isinstance(guilds, list):
+        raise ValueError(f"auto-reply rule \"channels\" and \"guilds\" must be lists of IDs: {entry!r}")
+    cooldown = entry.get("cooldown_seconds") or 0
+    if not isinstance(cooldown, (int, float)) or cooldown < 0:
+        raise ValueError(f"auto-reply rule \"cooldown_seconds\" must be a non-negative number: {entry!r}")
+    return AutoReplyRule(entry["pattern"].strip(), channels, guilds, cooldown)
+
+
+def build_rules(regex_content: str, rules_content: str,
+                previous: Optional[AutoReplyRules] = None) -> AutoReplyRules:
+    """
+    Rule book from autoreplyregex.txt (global rules) and autoreplyrules.json
+    (scoped rules, which take priority).
+
+    Args:
+        regex_content: autoreplyregex.txt content
+        rules_content: autoreplyrules.json content, {"rules": [...]}; blank means no scoped rules
+        previous: Rule book being replaced, whose cooldowns carry over
+
+    Raises:
+        re.error: If any pattern is not a valid regex
+        ValueError: If autoreplyrules.json is not valid
+    """
+    document = json.loads(rules_content) if rules_content.strip() else {"rules": []}
+    if not isinstance(document, dict) or not isinstance(document.get("rules"), list):
+        raise ValueError('autoreplyrules.json must be an object with a "rules" list')
+    rules = [_parse_rule(entry) for entry in document["rules"]]
+    rules.extend(AutoReplyRule(line.strip()) for line in regex_content.splitlines() if line.strip())
+    return AutoReplyRules(rules, previous.cooldowns if previous is not None else None)
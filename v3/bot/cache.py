@@ -0,0 +1,351 @@
+"""
+Two-tier TTL cache for upstream lookups.
+
+Entries live in an in-memory LRU backed by a SQLite file, so they survive
+restarts. Each cache supports:
+- a fresh TTL, after which entries are served stale while a single background
+  refresh runs (stale-while-revalidate)
+- negative caching: errors on a cold miss are remembered for a short TTL and
+  re-raised as CachedError without another round trip
+- single-flight: concurrent misses for the same key share one fetch
+- per-entry TTLs chosen from the fetched value
+- hit / stale / miss / negative-hit counters and upstream round trips saved
+- optional zlib compression and a total disk size budget with LRU eviction,
+  for large values such as transcripts
+
+SQLite calls are short single-row statements on a local WAL-mode file and run
+inline. If the file cannot be opened the cache degrades to memory only.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+from bot.config import Config
+from bot.logger import logger
+
+
+class CachedError(Exception):
+    """Raised on a negative cache hit with the original upstream error message."""
+
+
+_connections: dict[str, sqlite3.Connection] = {}
+_caches: dict[str, "TieredCache"] = {}
+
+
+def _connect(db_path: str) -> Optional[sqlite3.Connection]:
+    if db_path in _connections:
+        return _connections[db_path]
+    try:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " is_error INTEGER NOT NULL DEFAULT 0,"
+            " size INTEGER NOT NULL DEFAULT 0,"
+            " accessed_at REAL NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        # Files created before size budgets existed lack the LRU bookkeeping columns
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(cache_entries)")}
+        for column, definition in (("size", "INTEGER NOT NULL DEFAULT 0"), ("accessed_at", "REAL NOT NULL DEFAULT 0")):
+            if column not in columns:
+                connection.execute(f"ALTER TABLE cache_entries ADD COLUMN {column} {definition}")
+    except sqlite3.Error as e:
+        logger.warning("Cache database %s unavailable, using memory only: %s", db_path, e)
+        connection = None
+    _connections[db_path] = connection
+    return connection
+
+
+def all_stats() -> dict[str, dict[str, int]]:
+    """Counters for every cache created in this process, keyed by cache name."""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+class TieredCache:
+    """In-memory LRU in front of a persistent SQLite store."""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        stale_ttl: float = 0,
+        negative_ttl: float = 0,
+        max_entries: Optional[int] = None,
+        db_path: Optional[str] = None,
+        persistent: bool = True,
+        compress: bool = False,
+        max_disk_bytes: Optional[int] = None,
+    ):
+        """
+        Args:
+            name: Namespace for disk entries and label for stats
+            ttl: Seconds an entry is fresh
+            stale_ttl: Extra seconds an expired entry may be served while refreshing
+            negative_ttl: Seconds an upstream error is remembered (0 disables)
+            max_entries: In-memory LRU bound (defaults to CACHE_MEMORY_MAX_ENTRIES)
+            db_path: SQLite file (defaults to CACHE_DIR/cache.sqlite3)
+            persistent: Set False for a memory-only cache
+            compress: zlib-compress values on disk
+            max_disk_bytes: Evict least-recently-used disk entries above this total size
+        """
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries or Config.CACHE_MEMORY_MAX_ENTRIES
+        self.compress = compress
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, tuple[Any, float, bool]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._refreshing: set[asyncio.Task] = set()
+        self._counters = {"hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0,
+                          "coalesced": 0, "fetches": 0, "errors": 0, "refreshes": 0}
+
+        self._db = None
+        if persistent and Config.CACHE_ENABLED:
+            self._db = _connect(db_path or os.path.join(Config.CACHE_DIR, "cache.sqlite3"))
+            self.prune()
+        _caches[name] = self
+
+    def stats(self) -> dict[str, int]:
+        """Counters plus lookups and upstream round trips saved."""
+        lookups = self._counters["hits"] + self._counters["stale_hits"] + self._counters["negative_hits"] + self._counters["misses"]
+        return {
+            **self._counters,
+            "lookups": lookups,
+            "saved_round_trips": lookups - self._counters["fetches"],
+            "memory_entries": len(self._memory),
+        }
+
+    @staticmethod
+    def make_key(key: Any) -> str:
+        return key if isinstance(key, str) else json.dumps(key, sort_keys=True, ensure_ascii=False)
+
+    def _remember(self, key: str, value: Any, expires_at: float, is_error: bool):
+        self._memory[key] = (value, expires_at, is_error)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _encode(self, value: Any) -> Any:
+        data = json.dumps(value, ensure_ascii=False)
+        return zlib.compress(data.encode("utf-8")) if self.compress else data
+
+    @staticmethod
+    def _decode(raw: Any) -> Any:
+        if isinstance(raw, bytes):
+            return json.loads(zlib.decompress(raw).decode("utf-8"))
+        return json.loads(raw)
+
+    def _touch(self, key: str):
+        # Disk LRU order only matters when there is a size budget to enforce
+        if self._db is None or self.max_disk_bytes is None:
+            return
+        try:
+            self._db.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (time.time(), self.name, key),
+            )
+        except sqlite3.Error as e:
+            logger.warning("Cache %s touch failed: %s", self.name, e)
+
+    def _enforce_budget(self):
+        if self._db is None or self.max_disk_bytes is None:
+            return
+        try:
+            total = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?", (self.name,)
+            ).fetchone()[0]
+            if total <= self.max_disk_bytes:
+                return
+            rows = self._db.execute(
+                "SELECT key, size FROM cache_entries WHERE namespace = ? ORDER BY accessed_at ASC", (self.name,)
+            ).fetchall()
+            for key, size in rows:
+                if total <= self.max_disk_bytes:
+                    break
+                self._db.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.name, key))
+                self._memory.pop(key, None)
+                total -= size
+                logger.debug("Cache %s evicted %s (%d bytes) to stay under budget", self.name, key, size)
+        except sqlite3.Error as e:
+            logger.warning("Cache %s eviction failed: %s", self.name, e)
+
+    def _load(self, key: str) -> Optional[tuple[Any, float, bool]]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self._touch(key)
+            return entry
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT value, expires_at, is_error FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.name, key),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Cache %s read failed: %s", self.name, e)
+            return None
+        if row is None:
+            return None
+        entry = (self._decode(row[0]), row[1], bool(row[2]))
+        self._remember(key, *entry)
+        self._touch(key)
+        return entry
+
+    def _store(self, key: str, value: Any, ttl: float, is_error: bool = False):
+        expires_at = time.time() + ttl
+        self._remember(key, value, expires_at, is_error)
+        if self._db is None:
+            return
+        try:
+            encoded = self._encode(value)
+            size = len(encoded) if isinstance(encoded, bytes) else len(encoded.encode("utf-8"))
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, is_error, size, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.name, key, encoded, expires_at, int(is_error), size, time.time()),
+            )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning("Cache %s write failed: %s", self.name, e)
+            return
+        self._enforce_budget()
+
+    def get(self, key: Any) -> Optional[Any]:
+        """
+        Return the fresh cached value for `key` without fetching, or None.
+
+        Used by callers that batch their own misses into one upstream request.
+        Expired, stale and negative entries count as misses.
+        """
+        if not Config.CACHE_ENABLED:
+            return None
+        entry = self._load(self.make_key(key))
+        if entry is not None and not entry[2] and time.time() < entry[1]:
+            self._counters["hits"] += 1
+            return entry[0]
+        self._counters["misses"] += 1
+        return None
+
+    def record_fetch(self):
+        """Count an upstream round trip made by a caller that batches misses from get()."""
+        self._counters["fetches"] += 1
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None):
+        """Store a fresh value for `key` directly, bypassing fetch. `ttl` overrides the cache default."""
+        if Config.CACHE_ENABLED:
+            self._store(self.make_key(key), value, self.ttl if ttl is None else ttl)
+
+    def prune(self):
+        """Delete disk entries that are past their stale window."""
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND expires_at + ? < ?",
+                (self.name, self.stale_ttl, time.time()),
+            )
+        except sqlite3.Error as e:
+            logger.warning("Cache %s prune failed: %s", self.name, e)
+
+    async def _fetch(self, key: str, fetch: Callable[[], Awaitable[Any]],
+                     ttl_for: Optional[Callable[[Any], float]] = None, remember_error: bool = True) -> Any:
+        """
+        Single-flight fetch: concurrent callers for one key share the result.
+
+        `remember_error` is False for background refreshes, so a failed refresh
+        keeps serving the stale value instead of replacing it with an error.
+        """
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._counters["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._counters["fetches"] += 1
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            # Waiters get an error instead of hanging on a fetch nobody will finish
+            future.set_exception(RuntimeError(f"{self.name} fetch was cancelled"))
+            future.exception()
+            raise
+        except Exception as e:
+            self._counters["errors"] += 1
+            if remember_error and self.negative_ttl > 0:
+                self._store(key, str(e), self.negative_ttl, is_error=True)
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody else awaited is not logged
+            future.exception()
+            raise
+        else:
+            self._store(key, value, ttl_for(value) if ttl_for else self.ttl)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]],
+                       ttl_for: Optional[Callable[[Any], float]] = None):
+        self._counters["refreshes"] += 1
+        try:
+            await self._fetch(key, fetch, ttl_for, remember_error=False)
+        except Exception as e:
+            logger.warning("Cache %s background refresh failed for %s: %s", self.name, key, e)
+
+    async def get_or_fetch(
+        self,
+        key: Any,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl_for: Optional[Callable[[Any], float]] = None,
+    ) -> Any:
+        """
+        Return a cached value for `key`, calling `fetch()` on a miss.
+
+        `ttl_for(value)` may choose a per-entry TTL for freshly fetched values,
+        e.g. a shorter one for empty results.
+
+        Raises:
+            CachedError: If a recent upstream error for this key is cached
+            Exception: Whatever `fetch()` raises on a miss
+        """
+        cache_key = self.make_key(key)
+        if not Config.CACHE_ENABLED:
+            return await fetch()
+
+        entry = self._load(cache_key)
+        now = time.time()
+        if entry is not None:
+            value, expires_at, is_error = entry
+            if now < expires_at:
+                if is_error:
+                    self._counters["negative_hits"] += 1
+                    raise CachedError(value)
+                self._counters["hits"] += 1
+                return value
+            if not is_error and now < expires_at + self.stale_ttl:
+                self._counters["stale_hits"] += 1
+                if cache_key not in self._inflight:
+                    task = asyncio.create_task(self._refresh(cache_key, fetch, ttl_for))
+                    self._refreshing.add(task)
+                    task.add_done_callback(self._refreshing.discard)
+                return value
+
+        self._counters["misses"] += 1
+        return await self._fetch(cache_key, fetch, ttl_for)
@@ -83,3 +83,10 @@ async def channel_check(interaction: discord.Interaction) -> bool:
 
     logger.info("Access denied for user %s in channel %s", interaction.user.name, interaction.channel_id)
     return False
+
+async def admin_check(interaction: discord.Interaction) -> bool:
+    """Only OVERRIDE_USERS may use admin commands."""
+    if interaction.user.id in Config.OVERRIDE_USERS:
+        return True
+    logger.warning("Admin command denied for user %s (id=%s)", interaction.user.name, interaction.user.id)
+    return False
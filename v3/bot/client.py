@@ -2,7 +2,7 @@ from bot.config import Config
 import logging
 from bot.logger import logger
 import discord
-import re
+from bot.auto_reply_matcher import AutoReplyRules, build_rules
 
 class DiscordClient(discord.Client):
     def __init__(self, *, intents: discord.Intents):
@@ -20,6 +20,10 @@ class DiscordClient(discord.Client):
     # Instead of specifying a guild to every command, we copy over our global commands instead.
     # By doing so, we don't have to wait up to an hour until they are shown to the end-user.
     async def setup_hook(self):
+        # Open the shared HTTP session before anything can make requests
+        from bot import http_client
+        await http_client.start_session()
+
         # Sync commands globally for user installs to work in DMs
         # DO NOT SYNC THE SAME COMMAND GLOBALLY AND COPIED TO A GUILD
         await self.tree.sync()
@@ -29,6 +33,20 @@ class DiscordClient(discord.Client):
         import bot.client as client_module
         github_prompts.start_prompt_refresh(client_module)
 
+        # Periodically write usage rollups and stored messages to SQLite
+        from bot import conversation_store, metering
+        metering.start_flush_task()
+        conversation_store.start_flush_task()
+
+    async def close(self):
+        from bot import conversation_store, github_prompts, http_client, metering, tool_runner
+        github_prompts.stop_prompt_refresh()
+        metering.stop_flush_task()
+        conversation_store.stop_flush_task()
+        await super().close()
+        await http_client.close_session()
+        tool_runner.shutdown()
+
 intents = discord.Intents.default()
 intents.message_content = True
 discord_client = DiscordClient(intents=intents)
@@ -37,9 +55,11 @@ PROMPT_FILES = {
     "forumsystemprompt.txt": "",
     "mainsystemprompt.txt": "",
     "autoreplyregex.txt": "",
+    "autoreplyrules.json": "",
 }
 
-AUTO_REPLY_COMPILED = []
+# Rebuilt by github_prompts as a whole and swapped in with one assignment
+AUTO_REPLY_RULES = AutoReplyRules([])
 
 @discord_client.event
 async def on_ready():
@@ -58,11 +78,10 @@ def create_client():
             logger.error("Failed to load %s: %s", filename, e)
             raise
 
-    """Compile regex patterns from autoreplyregex.txt content."""
-    global AUTO_REPLY_COMPILED
-    lines = [line.strip() for line in PROMPT_FILES["autoreplyregex.txt"].splitlines() if line.strip()]
-    AUTO_REPLY_COMPILED = [re.compile(pattern, re.IGNORECASE) for pattern in lines]
-    logger.debug("Compiled %d auto-reply regex patterns", len(AUTO_REPLY_COMPILED))
+    """Compile regex patterns from autoreplyregex.txt and autoreplyrules.json content."""
+    global AUTO_REPLY_RULES
+    AUTO_REPLY_RULES = build_rules(PROMPT_FILES["autoreplyregex.txt"], PROMPT_FILES["autoreplyrules.json"])
+    logger.debug("Compiled %d auto-reply regex patterns", len(AUTO_REPLY_RULES))
 
     commands.setup(discord_client)
     forums.setup(discord_client)
@@ -25,6 +25,7 @@ class Config:
     OPENAI_API_KEY:str = os.getenv("OPENAI_API_KEY", "not-needed")
     OPENAI_BASE_URL:str = os.getenv("OPENAI_BASE_URL", "http://localhost:1234/v1")
     OPENAI_MODEL_NAME:str = os.getenv("OPENAI_MODEL_NAME", "local-model")
+    OPENAI_REASONING_ONLY_RETRIES:int = int(os.getenv("OPENAI_REASONING_ONLY_RETRIES") or 2)
 
     # Exa Search Configuration (for local LLM tools)
     EXA_API_KEY:str = os.getenv("EXA_API_KEY") or ""
@@ -65,6 +66,12 @@ class Config:
     # Logging
     LOGGING_LEVEL:str = os.getenv("LOGGING_LEVEL") or "INFO"
 
+    # Tracing
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() in ("true", "1", "yes")
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER") or "none"
+    TRACE_FILE: str = os.getenv("TRACE_FILE") or "traces/traces.jsonl"
+    TRACE_OTLP_ENDPOINT: str = os.getenv("TRACE_OTLP_ENDPOINT") or "http://localhost:4318/v1/traces"
+
     # Image Processing
     IMAGE_MAX_DIMENSIONS: int = int(os.getenv("IMAGE_MAX_DIMENSIONS") or 800)
     IMAGE_MAX_FILE_SIZE_MB: int = int(os.getenv("IMAGE_MAX_FILE_SIZE_MB") or 20)
@@ -72,6 +79,79 @@ class Config:
     # YouTube Transcript
     YOUTUBE_TRANSCRIPT_MAX_CHARS: int = int(os.getenv("YOUTUBE_TRANSCRIPT_MAX_CHARS") or 4000)
 
+    # Shared HTTP Client
+    HTTP_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_TIMEOUT_SECONDS") or 30)
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS") or 10)
+    HTTP_POOL_LIMIT: int = int(os.getenv("HTTP_POOL_LIMIT") or 100)
+    HTTP_POOL_LIMIT_PER_HOST: int = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST") or 10)
+    HTTP_DNS_CACHE_TTL: int = int(os.getenv("HTTP_DNS_CACHE_TTL") or 300)
+    HTTP_KEEPALIVE_TIMEOUT: float = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT") or 30)
+
+    # Tool Execution
+    TOOL_EXECUTOR_MAX_WORKERS: int = int(os.getenv("TOOL_EXECUTOR_MAX_WORKERS") or 8)
+    TOOL_TIMEOUT_SECONDS: float = float(os.getenv("TOOL_TIMEOUT_SECONDS") or 60)
+    TOOL_TIMEOUTS: dict = json.loads(os.getenv("TOOL_TIMEOUTS") or "{}")
+    TOOL_MAX_CONCURRENCY: int = int(os.getenv("TOOL_MAX_CONCURRENCY") or 4)
+
+    # Caching
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+    CACHE_DIR: str = os.getenv("CACHE_DIR") or "cache"
+    CACHE_MEMORY_MAX_ENTRIES: int = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES") or 512)
+    THREEDMARK_CACHE_TTL_SECONDS: int = int(os.getenv("THREEDMARK_CACHE_TTL_SECONDS") or 86400)
+    THREEDMARK_CACHE_STALE_SECONDS: int = int(os.getenv("THREEDMARK_CACHE_STALE_SECONDS") or 604800)
+    THREEDMARK_CACHE_NEGATIVE_TTL_SECONDS: int = int(os.getenv("THREEDMARK_CACHE_NEGATIVE_TTL_SECONDS") or 300)
+    WOLFRAM_CACHE_TTL_SECONDS: int = int(os.getenv("WOLFRAM_CACHE_TTL_SECONDS") or 21600)
+    WOLFRAM_CACHE_NEGATIVE_TTL_SECONDS: int = int(os.getenv("WOLFRAM_CACHE_NEGATIVE_TTL_SECONDS") or 600)
+    WOLFRAM_CACHE_MAX_ENTRIES: int = int(os.getenv("WOLFRAM_CACHE_MAX_ENTRIES") or 1024)
+    YOUTUBE_CACHE_TTL_SECONDS: int = int(os.getenv("YOUTUBE_CACHE_TTL_SECONDS") or 2592000)
+    YOUTUBE_CACHE_NEGATIVE_TTL_SECONDS: int = int(os.getenv("YOUTUBE_CACHE_NEGATIVE_TTL_SECONDS") or 600)
+    YOUTUBE_CACHE_MEMORY_ENTRIES: int = int(os.getenv("YOUTUBE_CACHE_MEMORY_ENTRIES") or 32)
+    YOUTUBE_CACHE_MAX_MB: int = int(os.getenv("YOUTUBE_CACHE_MAX_MB") or 200)
+    EXA_SEARCH_CACHE_TTL_SECONDS: int = int(os.getenv("EXA_SEARCH_CACHE_TTL_SECONDS") or 3600)
+    EXA_EMPTY_CACHE_TTL_SECONDS: int = int(os.getenv("EXA_EMPTY_CACHE_TTL_SECONDS") or 300)
+    EXA_CONTENTS_CACHE_TTL_SECONDS: int = int(os.getenv("EXA_CONTENTS_CACHE_TTL_SECONDS") or 86400)
+    EXA_CACHE_NEGATIVE_TTL_SECONDS: int = int(os.getenv("EXA_CACHE_NEGATIVE_TTL_SECONDS") or 60)
+    FAQ_CACHE_ENABLED: bool = os.getenv("FAQ_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+    FAQ_CACHE_SIMILARITY: float = float(os.getenv("FAQ_CACHE_SIMILARITY") or 0.9)
+    FAQ_CACHE_TTL_SECONDS: int = int(os.getenv("FAQ_CACHE_TTL_SECONDS") or 86400)
+    FAQ_CACHE_MAX_ENTRIES: int = int(os.getenv("FAQ_CACHE_MAX_ENTRIES") or 500)
+    MESSAGE_CACHE_MAX_ENTRIES: int = int(os.getenv("MESSAGE_CACHE_MAX_ENTRIES") or 5000)
+    CONVERSATION_STORE_ENABLED: bool = os.getenv("CONVERSATION_STORE_ENABLED", "true").lower() in ("true", "1", "yes")
+    CONVERSATION_STORE_DB: str = os.getenv("CONVERSATION_STORE_DB") or ""
+    CONVERSATION_STORE_FLUSH_SECONDS: float = float(os.getenv("CONVERSATION_STORE_FLUSH_SECONDS") or 2)
+    CONVERSATION_STORE_RETENTION_DAYS: int = int(os.getenv("CONVERSATION_STORE_RETENTION_DAYS") or 30)
+
+    # LLM Scheduler
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY") or 4)
+    LLM_QUEUE_MAX_DEPTH: int = int(os.getenv("LLM_QUEUE_MAX_DEPTH") or 32)
+    LLM_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS") or 120)
+    LLM_ROUTE_WEIGHTS: dict = json.loads(os.getenv("LLM_ROUTE_WEIGHTS") or '{"mention": 8, "ask_denbot": 4, "forum": 2, "auto_reply": 1}')
+    LLM_COALESCE_ENABLED: bool = os.getenv("LLM_COALESCE_ENABLED", "true").lower() in ("true", "1", "yes")
+
+    # Agent Loop Limits
+    AGENT_MAX_TOOL_ROUNDS: int = int(os.getenv("AGENT_MAX_TOOL_ROUNDS") or 8)
+    AGENT_DEADLINE_SECONDS: float = float(os.getenv("AGENT_DEADLINE_SECONDS") or 300)
+    AGENT_MAX_TOKENS: int = int(os.getenv("AGENT_MAX_TOKENS") or 400000)
+    AGENT_MAX_COST_USD: float = float(os.getenv("AGENT_MAX_COST_USD") or 0.50)
+    ANTHROPIC_INPUT_COST_PER_MTOK: float = float(os.getenv("ANTHROPIC_INPUT_COST_PER_MTOK") or 3.0)
+    ANTHROPIC_OUTPUT_COST_PER_MTOK: float = float(os.getenv("ANTHROPIC_OUTPUT_COST_PER_MTOK") or 15.0)
+    OPENAI_INPUT_COST_PER_MTOK: float = float(os.getenv("OPENAI_INPUT_COST_PER_MTOK") or 0)
+    OPENAI_OUTPUT_COST_PER_MTOK: float = float(os.getenv("OPENAI_OUTPUT_COST_PER_MTOK") or 0)
+
+    # Context Budget
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET") or 24000)
+    CONTEXT_MIN_TURN_TOKENS: int = int(os.getenv("CONTEXT_MIN_TURN_TOKENS") or 200)
+    CONTEXT_CHARS_PER_TOKEN: float = float(os.getenv("CONTEXT_CHARS_PER_TOKEN") or 3.5)
+
+    # Streaming Replies
+    STREAM_RESPONSES: bool = os.getenv("STREAM_RESPONSES", "true").lower() in ("true", "1", "yes")
+    STREAM_EDIT_INTERVAL_SECONDS: float = float(os.getenv("STREAM_EDIT_INTERVAL_SECONDS") or 1.2)
+
+    # Usage Metering
+    METERING_ENABLED: bool = os.getenv("METERING_ENABLED", "true").lower() in ("true", "1", "yes")
+    METERING_DB: str = os.getenv("METERING_DB") or ""
+    METERING_FLUSH_SECONDS: float = float(os.getenv("METERING_FLUSH_SECONDS") or 60)
+
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = int(os.getenv("RATE_LIMIT_REQUESTS", "5"))
     RATE_LIMIT_WINDOW_HOURS: int = int(os.getenv("RATE_LIMIT_WINDOW_HOURS", "1"))
@@ -0,0 +1,214 @@
+"""
+Token-budgeted context building for LLM requests.
+
+Reply chains can carry long pasted logs, images and tool-heavy turns. Before a
+request is sent, the conversation is fitted to CONTEXT_TOKEN_BUDGET using a
+fast character-based estimate:
+1. oversized older turns are truncated (largest first) down to
+   CONTEXT_MIN_TURN_TOKENS, keeping their start and end
+2. if that is not enough, the oldest assistant/user pairs are dropped
+3. as a last resort the protected turns are truncated too
+
+The first user turn and the latest exchange are kept whenever possible. The
+estimator's characters-per-token ratio is calibrated against the input token
+counts the providers report, so the estimate tracks the model's tokenizer.
+"""
+
+import json
+import math
+from typing import Any, Optional
+from bot.config import Config
+from bot.logger import logger
+
+TRIM_MARKER = "\n[... {count} characters trimmed ...]\n"
+CALIBRATION_WEIGHT = 0.2
+MIN_CHARS_PER_TOKEN = 1.5
+MAX_CHARS_PER_TOKEN = 8.0
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenEstimator:
+    """Character-count token estimator with a self-calibrating ratio."""
+
+    def __init__(self, chars_per_token: float):
+        self.chars_per_token = chars_per_token
+        self.calibrations = 0
+
+    @staticmethod
+    def image_tokens() -> int:
+        # Anthropic bills roughly width * height / 750 for an image; images are resized to fit this box
+        return math.ceil(Config.IMAGE_MAX_DIMENSIONS * Config.IMAGE_MAX_DIMENSIONS / 750)
+
+    def text(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def content_size(self, content: Any) -> tuple[int, int]:
+        """(text characters, image count) of message content."""
+        if isinstance(content, str):
+            return len(content), 0
+        chars = 0
+        images = 0
+        for block in content or []:
+            block_type = block.get("type") if isinstance(block, dict) else getattr(block, "type", None)
+            if block_type == "image" or block_type == "image_url":
+                images += 1
+            elif isinstance(block, dict):
+                if block_type == "text":
+                    chars += len(block.get("text", ""))
+                elif block_type == "tool_result":
+                    nested_chars, nested_images = self.content_size(block.get("content", ""))
+                    chars += nested_chars
+                    images += nested_images
+                else:
+                    chars += len(json.dumps(block, default=str))
+            else:
+                chars += len(getattr(block, "text", None) or json.dumps(getattr(block, "input", None), default=str))
+        return chars, images
+
+    def message(self, message: dict) -> int:
+        chars, images = self.content_size(message.get("content"))
+        return math.ceil(chars / self.chars_per_token) + images * self.image_tokens() + MESSAGE_OVERHEAD_TOKENS
+
+    def messages(self, messages: list[dict]) -> int:
+        return sum(self.message(message) for message in messages)
+
+    def request(self, system_prompt: str, messages: list[dict], tools: Optional[list] = None) -> int:
+        """Estimate for a whole request: system prompt, conversation and tool definitions."""
+        total = self.text(system_prompt) + self.messages(messages)
+        if tools:
+            total += self.text(json.dumps(tools))
+        return total
+
+    def calibrate(self, estimated_tokens: int, actual_tokens: int, image_tokens: int = 0):
+        """
+        Move the ratio towards what the provider actually counted.
+
+        Image tokens are a fixed estimate, so they are removed from both sides
+        before comparing.
+        """
+        estimated_text = estimated_tokens - image_tokens
+        actual_text = actual_tokens - image_tokens
+        if estimated_text <= 0 or actual_text <= 0:
+            return
+        observed = self.chars_per_token * estimated_text / actual_text
+        observed = min(MAX_CHARS_PER_TOKEN, max(MIN_CHARS_PER_TOKEN, observed))
+        self.chars_per_token += (observed - self.chars_per_token) * CALIBRATION_WEIGHT
+        self.calibrations += 1
+        logger.debug("Token estimator calibrated: estimated %d, actual %d, now %.2f chars/token",
+                     estimated_tokens, actual_tokens, self.chars_per_token)
+
+
+ESTIMATOR = TokenEstimator(Config.CONTEXT_CHARS_PER_TOKEN)
+
+
+def count_images(messages: list[dict]) -> int:
+    return sum(ESTIMATOR.content_size(message.get("content"))[1] for message in messages)
+
+
+def _truncate_text(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return text[:head] + TRIM_MARKER.format(count=len(text) - head - tail) + (text[-tail:] if tail else "")
+
+
+def _truncate_message(message: dict, max_tokens: int) -> dict:
+    """Copy of `message` with its text cut to about max_tokens, keeping start and end."""
+    max_chars = int(max_tokens * ESTIMATOR.chars_per_token)
+    content = message.get("content")
+    if isinstance(content, str):
+        return {**message, "content": _truncate_text(content, max_chars)}
+    if not isinstance(content, list):
+        return message
+
+    blocks = []
+    text_blocks = [block for block in content if isinstance(block, dict) and block.get("type") == "text"]
+    per_block = max_chars // max(1, len(text_blocks))
+    for block in content:
+        if isinstance(block, dict) and block.get("type") == "text":
+            block = {**block, "text": _truncate_text(block.get("text", ""), per_block)}
+        elif isinstance(block, dict) and block.get("type") == "tool_result" and isinstance(block.get("content"), str):
+            block = {**block, "content": _truncate_text(block["content"], per_block or max_chars)}
+        blocks.append(block)
+    return {**message, "content": blocks}
+
+
+def _droppable_pairs(messages: list[dict], protected: set[int]) -> list[int]:
+    """Start indices of assistant/user pairs that can go without breaking role alternation."""
+    return [
+        index for index in range(len(messages) - 1)
+        if index not in protected and index + 1 not in protected
+        and messages[index]["role"] == "assistant" and messages[index + 1]["role"] == "user"
+    ]
+
+
+def fit_to_budget(messages: list[dict], system_prompt: str = "", budget: Optional[int] = None) -> list[dict]:
+    """
+    Return a copy of `messages` whose estimate, with the system prompt, fits the budget.
+
+    Args:
+        messages: Conversation in provider-neutral role/content form, oldest first
+        system_prompt: System prompt that will be sent with the conversation
+        budget: Input token budget (defaults to CONTEXT_TOKEN_BUDGET; 0 disables)
+
+    Returns:
+        The trimmed conversation; the input list is not modified
+    """
+    budget = Config.CONTEXT_TOKEN_BUDGET if budget is None else budget
+    if budget <= 0 or not messages:
+        return messages
+
+    available = budget - ESTIMATOR.text(system_prompt)
+    fitted = list(messages)
+    sizes = [ESTIMATOR.message(message) for message in fitted]
+    before = sum(sizes)
+    if before <= available:
+        return messages
+
+    # First user turn and the latest exchange
+    protected = {0, len(fitted) - 1}
+    if len(fitted) >= 2:
+        protected.add(len(fitted) - 2)
+    floor = Config.CONTEXT_MIN_TURN_TOKENS
+    truncated = 0
+    dropped = 0
+
+    def shrink(candidates: list[int]) -> bool:
+        nonlocal truncated
+        for index in sorted(candidates, key=lambda index: -sizes[index]):
+            excess = sum(sizes) - available
+            if excess <= 0:
+                return True
+            if sizes[index] <= floor:
+                continue
+            # Leave room for the trim marker and per-message overhead
+            target = max(floor, sizes[index] - excess - ESTIMATOR.text(TRIM_MARKER) - MESSAGE_OVERHEAD_TOKENS)
+            fitted[index] = _truncate_message(fitted[index], target)
+            sizes[index] = ESTIMATOR.message(fitted[index])
+            truncated += 1
+        return sum(sizes) <= available
+
+    done = shrink([index for index in range(len(fitted)) if index not in protected])
+
+    while not done:
+        pairs = _droppable_pairs(fitted, protected)
+        if not pairs:
+            break
+        start = pairs[0]
+        del fitted[start:start + 2]
+        del sizes[start:start + 2]
+        dropped += 2
+        protected = {0, len(fitted) - 1, len(fitted) - 2} if len(fitted) >= 2 else {0}
+        done = sum(sizes) <= available
+
+    if not done:
+        # The latest user turn is trimmed last
+        latest = len(fitted) - 1
+        done = shrink([index for index in range(len(fitted)) if index != latest]) or shrink([latest])
+
+    logger.info(
+        "Context budget: %d -> %d estimated tokens (budget %d, system %d); truncated %d turn(s), dropped %d turn(s)%s",
+        before, sum(sizes), budget, budget - available, truncated, dropped, "" if done else ", still over budget",
+    )
+    return fitted
@@ -0,0 +1,284 @@
+"""
+Local store of the Discord messages the bot reads and sends.
+
+Each message is kept by ID with its reply parent, author, role, content (bot
+mention removed) and attachment metadata in a WAL-mode SQLite file, so reply
+chains survive restarts and messages ageing out of discord.py's cache. Writes
+are queued and committed in batches every CONVERSATION_STORE_FLUSH_SECONDS
+(or sooner when a batch fills up); rows older than
+CONVERSATION_STORE_RETENTION_DAYS are pruned. load_chain() walks a whole
+reply chain with one recursive query. Edits and deletions reported by the
+gateway update or remove stored rows.
+
+All SQLite work runs on one worker thread, off the event loop and in
+submission order, so a query always sees the writes queued before it.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional
+import discord
+from bot.config import Config
+from bot.logger import logger
+
+BATCH_SIZE = 200
+PRUNE_INTERVAL_SECONDS = 3600
+COLUMNS = ("id", "parent_id", "channel_id", "guild_id", "author_id", "author_name",
+           "role", "content", "attachments", "created_at")
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="denbot-store")
+_db: Optional[sqlite3.Connection] = None
+_unavailable = False
+# (row, replace); replace=False rows never overwrite what is already stored
+_pending: list[tuple[tuple, bool]] = []
+_flush_task: Optional[asyncio.Task] = None
+_last_prune = 0.0
+_counters = {"recorded": 0, "flushes": 0, "chains": 0, "chain_hops": 0, "edited": 0, "deleted": 0}
+
+
+def stats() -> dict[str, int]:
+    return {**_counters, "pending": len(_pending)}
+
+
+def _connect() -> Optional[sqlite3.Connection]:
+    global _db, _unavailable
+    if _db is not None or _unavailable:
+        return _db
+    path = Config.CONVERSATION_STORE_DB or os.path.join(Config.CACHE_DIR, "conversations.sqlite3")
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY, parent_id INTEGER, channel_id INTEGER NOT NULL, guild_id INTEGER,"
+            " author_id INTEGER NOT NULL, author_name TEXT NOT NULL, role TEXT NOT NULL,"
+            " content TEXT NOT NULL, attachments TEXT, created_at REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS messages_created_at ON messages (created_at)")
+    except sqlite3.Error as e:
+        logger.warning("Conversation store %s unavailable, reply chains will use Discord only: %s", path, e)
+        _unavailable = True
+        return None
+    _db = connection
+    return _db
+
+
+def normalize_content(content: str, bot_user_id: int) -> str:
+    return content.replace(f"<@{bot_user_id}>", "").strip()
+
+
+def record(message: discord.Message, bot_user_id: int, replace: bool = True, content: Optional[str] = None):
+    """
+    Queue a message for storage.
+
+    Args:
+        message: Message read or sent by the bot
+        bot_user_id: The bot's user ID, which decides the message's role
+        replace: Overwrite a stored copy. Gateway create events pass False so a
+            streamed reply's first partial text cannot replace its final text.
+        content: The text the message finally shows, for send results whose
+            content may still be a streamed preview
+    """
+    if not Config.CONVERSATION_STORE_ENABLED:
+        return
+    reference = message.reference
+    attachments = [
+        {"filename": attachment.filename, "content_type": attachment.content_type,
+         "size": attachment.size, "url": attachment.url}
+        for attachment in message.attachments
+    ]
+    row = (
+        message.id,
+        reference.message_id if reference is not None else None,
+        message.channel.id,
+        message.guild.id if message.guild else None,
+        message.author.id,
+        message.author.display_name,
+        "assistant" if message.author.id == bot_user_id else "user",
+        normalize_content(message.content if content is None else content, bot_user_id),
+        json.dumps(attachments) if attachments else None,
+        message.created_at.timestamp(),
+    )
+    _pending.append((row, replace))
+    _counters["recorded"] += 1
+    if len(_pending) >= BATCH_SIZE:
+        _submit(_write, _take_batch())
+
+
+def update_content(message_id: int, content: str, bot_user_id: int):
+    """Replace the stored text of an edited message, if it is stored or queued."""
+    if not Config.CONVERSATION_STORE_ENABLED:
+        return
+    content = normalize_content(content, bot_user_id)
+    index = COLUMNS.index("content")
+    for position, (row, replace) in enumerate(_pending):
+        if row[0] == message_id:
+            _pending[position] = (row[:index] + (content,) + row[index + 1:], replace)
+    _submit(_execute, "UPDATE messages SET content = ? WHERE id = ?", [(content, message_id)])
+    _counters["edited"] += 1
+
+
+def delete(message_ids: Iterable[int]):
+    """Forget deleted messages, whether already stored or still queued."""
+    if not Config.CONVERSATION_STORE_ENABLED:
+        return
+    message_ids = set(message_ids)
+    _pending[:] = [(row, replace) for row, replace in _pending if row[0] not in message_ids]
+    _submit(_execute, "DELETE FROM messages WHERE id = ?", [(message_id,) for message_id in message_ids])
+    _counters["deleted"] += len(message_ids)
+
+
+def _take_batch() -> list[tuple[tuple, bool]]:
+    # Taken on the event loop, so record() never appends to a list being written
+    batch = list(_pending)
+    _pending.clear()
+    return batch
+
+
+def _submit(func: Callable, *args):
+    """Queue work for the store thread without waiting for it."""
+    _executor.submit(func, *args)
+
+
+async def _run(func: Callable, *args) -> Any:
+    """Run work on the store thread and wait for its result."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def _execute(statement: str, parameters: list[tuple]):
+    db = _connect()
+    if db is None or not parameters:
+        return
+    try:
+        db.executemany(statement, parameters)
+    except sqlite3.Error as e:
+        logger.warning("Conversation store update failed: %s", e)
+
+
+def flush() -> int:
+    """
+    Commit queued messages and wait for the store thread. Returns the number written.
+
+    Blocks the caller; the event loop only uses it at shutdown.
+    """
+    return _executor.submit(_write, _take_batch()).result()
+
+
+def _write(batch: list[tuple[tuple, bool]]) -> int:
+    """Commit a batch of queued messages in one transaction. Returns the number written."""
+    if not batch:
+        return 0
+    db = _connect()
+    if db is None:
+        return 0
+    placeholders = ", ".join("?" for _ in COLUMNS)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in COLUMNS[1:])
+    try:
+        db.execute("BEGIN")
+        # Keep-existing rows first, so a replacing row for the same ID always wins
+        db.executemany(f"INSERT OR IGNORE INTO messages ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                       [row for row, replace in batch if not replace])
+        db.executemany(f"INSERT INTO messages ({', '.join(COLUMNS)}) VALUES ({placeholders})"
+                       f" ON CONFLICT (id) DO UPDATE SET {updates}",
+                       [row for row, replace in batch if replace])
+        db.execute("COMMIT")
+    except sqlite3.Error as e:
+        logger.warning("Conversation store flush of %d message(s) failed: %s", len(batch), e)
+        try:
+            db.execute("ROLLBACK")
+        except sqlite3.Error:
+            pass
+        return 0
+    _counters["flushes"] += 1
+    return len(batch)
+
+
+def prune() -> int:
+    """Delete messages older than the retention period. Returns the number removed."""
+    db = _connect()
+    if db is None or Config.CONVERSATION_STORE_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = time.time() - Config.CONVERSATION_STORE_RETENTION_DAYS * 86400
+    try:
+        removed = db.execute("DELETE FROM messages WHERE created_at < ?", (cutoff,)).rowcount
+    except sqlite3.Error as e:
+        logger.warning("Conversation store prune failed: %s", e)
+        return 0
+    if removed:
+        logger.info("Pruned %d stored message(s) older than %d days", removed, Config.CONVERSATION_STORE_RETENTION_DAYS)
+    return removed
+
+
+async def load_chain(message_id: int, max_depth: int) -> list[dict[str, Any]]:
+    """
+    The stored message `message_id` and its ancestors, newest first.
+
+    Follows parent_id with one recursive query and stops at the first message
+    that is not stored, so the last row's parent_id tells the caller whether
+    (and where) the chain continues outside the store.
+    """
+    if not Config.CONVERSATION_STORE_ENABLED or max_depth <= 0:
+        return []
+    # Messages recorded for this very request may still be queued; the store
+    # thread writes them before it runs the query
+    _submit(_write, _take_batch())
+    return await _run(_query_chain, message_id, max_depth)
+
+
+def _query_chain(message_id: int, max_depth: int) -> list[dict[str, Any]]:
+    db = _connect()
+    if db is None:
+        return []
+    try:
+        cursor = db.execute(
+            "WITH RECURSIVE chain (id, parent_id, author_id, author_name, role, content, attachments, depth) AS ("
+            " SELECT id, parent_id, author_id, author_name, role, content, attachments, 1 FROM messages WHERE id = ?"
+            " UNION ALL"
+            " SELECT m.id, m.parent_id, m.author_id, m.author_name, m.role, m.content, m.attachments, chain.depth + 1"
+            " FROM messages m JOIN chain ON m.id = chain.parent_id WHERE chain.depth < ?"
+            ") SELECT id, parent_id, author_id, author_name, role, content, attachments FROM chain ORDER BY depth",
+            (message_id, max_depth),
+        )
+        names = [description[0] for description in cursor.description]
+        rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.warning("Conversation store chain query failed: %s", e)
+        return []
+    _counters["chains"] += 1
+    _counters["chain_hops"] += len(rows)
+    return rows
+
+
+async def _flush_loop():
+    global _last_prune
+    while True:
+        await asyncio.sleep(Config.CONVERSATION_STORE_FLUSH_SECONDS)
+        await _run(_write, _take_batch())
+        if time.monotonic() - _last_prune >= PRUNE_INTERVAL_SECONDS:
+            _last_prune = time.monotonic()
+            await _run(prune)
+
+
+def start_flush_task():
+    global _flush_task
+    if not Config.CONVERSATION_STORE_ENABLED:
+        return
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_loop())
+
+
+def stop_flush_task():
+    """Stop the periodic flush and write whatever is still queued."""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+    flush()
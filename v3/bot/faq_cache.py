@@ -0,0 +1,194 @@
+"""
+Similarity cache for FAQ-style replies.
+
+Regex auto-replies and forum posts answer the same few setup questions over
+and over. For those single-turn routes the question and its answer are kept
+in memory, indexed by a MinHash signature of the question's word shingles
+(single words and word pairs). A new question is compared against every
+signature at once with numpy; candidates are confirmed with the exact Jaccard
+similarity, which must reach FAQ_CACHE_SIMILARITY, and with an exact match of
+every word containing a digit, so "4070" never answers for "4090". On
+auto-replies the text the trigger regex matched is ignored, since every
+question on that rule shares it.
+
+Entries are tied to the route and to the exact system prompt they were
+answered under, and the whole cache is dropped when github_prompts swaps the
+main or forum prompt, so answers never outlive the instructions behind them.
+Answers are shared between users, so only requests the router sent without an
+author name (message_format.AUTHOR_AGNOSTIC_ROUTES) are cached.
+"""
+
+import hashlib
+import json
+import re
+import time
+import zlib
+from typing import Optional
+import numpy as np
+from bot.agent_loop import LIMIT_MESSAGE
+from bot.config import Config
+from bot.logger import logger
+from bot.message_format import AUTHOR_AGNOSTIC_ROUTES
+
+CACHEABLE_ROUTES = AUTHOR_AGNOSTIC_ROUTES
+PROMPT_FILES = frozenset({"mainsystemprompt.txt", "forumsystemprompt.txt"})
+NGRAM_SIZES = (1, 2)
+NUM_PERMUTATIONS = 64
+_MERSENNE_PRIME = (1 << 31) - 1
+_FAILURE_PREFIX = "Failed to generate text"
+_WORD = re.compile(r"\w+")
+
+_random = np.random.default_rng(0x5EED)
+_PERM_A = _random.integers(1, _MERSENNE_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _random.integers(0, _MERSENNE_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def shingles(text: str) -> frozenset[str]:
+    """Word n-grams (NGRAM_SIZES) of the lowercased text; punctuation is ignored."""
+    words = _WORD.findall(text.lower())
+    return frozenset(" ".join(words[i:i + size]) for size in NGRAM_SIZES for i in range(len(words) - size + 1))
+
+
+def model_tokens(text: str) -> frozenset[str]:
+    """Words containing a digit: model numbers, versions, sizes. These must match exactly."""
+    return frozenset(word for word in _WORD.findall(text.lower()) if any(char.isdigit() for char in word))
+
+
+def signature(shingle_set: frozenset[str]) -> np.ndarray:
+    """MinHash signature: the minimum of each permuted shingle hash."""
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingle_set),
+                         dtype=np.uint64, count=len(shingle_set))
+    permuted = (_PERM_A[:, None] * (hashes[None, :] & _MERSENNE_PRIME) + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+
+def prompt_fingerprint(system_prompt: str) -> str:
+    return hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("route", "prompt", "shingles", "models", "answer", "tokens", "cost", "expires_at")
+
+    def __init__(self, route: str, prompt: str, shingle_set: frozenset[str], models: frozenset[str], answer: str,
+                 tokens: int, cost: float, expires_at: float):
+        self.route = route
+        self.prompt = prompt
+        self.shingles = shingle_set
+        self.models = models
+        self.answer = answer
+        self.tokens = tokens
+        self.cost = cost
+        self.expires_at = expires_at
+
+
+class FAQCache:
+    """In-memory (question, answer) index with MinHash similarity lookup."""
+
+    def __init__(self, threshold: float, ttl: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: list[_Entry] = []
+        self._signatures = np.empty((0, NUM_PERMUTATIONS), dtype=np.uint64)
+        self._counters = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "invalidations": 0,
+                          "saved_tokens": 0, "saved_cost_usd": 0.0}
+
+    def stats(self) -> dict:
+        lookups = self._counters["lookups"]
+        return {**self._counters, "entries": len(self._entries),
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0}
+
+    def _prune(self):
+        now = time.time()
+        keep = [index for index, entry in enumerate(self._entries) if entry.expires_at > now]
+        keep = keep[-self.max_entries:] if self.max_entries > 0 else []
+        if len(keep) != len(self._entries):
+            self._entries = [self._entries[index] for index in keep]
+            self._signatures = self._signatures[keep]
+
+    def lookup(self, route: str, system_prompt: str, question: str) -> Optional[str]:
+        """Cached answer to a similar question on `route` under the same prompt, or None."""
+        self._counters["lookups"] += 1
+        query = shingles(question)
+        if not query or not self._entries:
+            self._counters["misses"] += 1
+            return None
+        models = model_tokens(question)
+
+        estimates = (self._signatures == signature(query)).mean(axis=1)
+        fingerprint = prompt_fingerprint(system_prompt)
+        now = time.time()
+        for index in np.argsort(-estimates):
+            if estimates[index] < self.threshold * 0.8:
+                break  # MinHash is an estimate; leave some slack before giving up
+            entry = self._entries[index]
+            if entry.route != route or entry.prompt != fingerprint or entry.expires_at <= now or entry.models != models:
+                continue
+            similarity = len(query & entry.shingles) / len(query | entry.shingles)
+            if similarity >= self.threshold:
+                self._counters["hits"] += 1
+                self._counters["saved_tokens"] += entry.tokens
+                self._counters["saved_cost_usd"] += entry.cost
+                logger.info("FAQ cache hit on route '%s' (similarity %.2f), saved about %d tokens",
+                            route, similarity, entry.tokens)
+                return entry.answer
+        self._counters["misses"] += 1
+        return None
+
+    def store(self, route: str, system_prompt: str, question: str, answer: str, tokens: int = 0, cost: float = 0.0):
+        """Remember an answer; failures and limit notices are not worth repeating."""
+        if not answer.strip() or answer.startswith(_FAILURE_PREFIX) or answer == LIMIT_MESSAGE:
+            return
+        query = shingles(question)
+        if not query:
+            return
+        self._entries.append(_Entry(route, prompt_fingerprint(system_prompt), query, model_tokens(question), answer,
+                                    tokens, cost, time.time() + self.ttl))
+        self._signatures = np.vstack([self._signatures, signature(query)])
+        self._counters["stores"] += 1
+        if len(self._entries) > self.max_entries or self._entries[0].expires_at <= time.time():
+            self._prune()
+
+    def invalidate(self, reason: str):
+        if self._entries:
+            logger.info("FAQ cache cleared (%d entries): %s", len(self._entries), reason)
+        self._entries = []
+        self._signatures = np.empty((0, NUM_PERMUTATIONS), dtype=np.uint64)
+        self._counters["invalidations"] += 1
+
+
+FAQ_CACHE = FAQCache(Config.FAQ_CACHE_SIMILARITY, Config.FAQ_CACHE_TTL_SECONDS, Config.FAQ_CACHE_MAX_ENTRIES)
+
+
+def question_text(route: str, messages: list[dict], trigger: Optional[str] = None) -> Optional[str]:
+    """
+    The question of a single-turn request on a cacheable route, or None if it should not be cached.
+
+    Args:
+        route: Request route
+        messages: Request messages, authors already stripped
+        trigger: Auto-reply regex that fired; the text it matched is left out
+    """
+    if not Config.FAQ_CACHE_ENABLED or route not in CACHEABLE_ROUTES or len(messages) != 1:
+        return None
+    content = messages[0].get("content")
+    if not isinstance(content, str):
+        return None
+    # Auto-reply turns arrive as {"message": ...} with the author stripped by the router
+    try:
+        decoded = json.loads(content)
+    except ValueError:
+        decoded = None
+    if isinstance(decoded, dict) and "message" in decoded:
+        if "user" in decoded:
+            return None  # An answer that may address this author must not go to others
+        content = str(decoded["message"])
+    if trigger:
+        content = re.sub(trigger, " ", content, flags=re.IGNORECASE)
+    # Nothing but the trigger: no question to compare
+    return content if _WORD.search(content) else None
+
+
+def stats() -> dict:
+    """Hit rate, saved tokens and estimated cost saved."""
+    return FAQ_CACHE.stats()
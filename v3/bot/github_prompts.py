@@ -1,7 +1,7 @@
 """GitHub prompt auto-refresh module.
 
 Periodically fetches prompt files from GitHub and updates PROMPT_FILES
-and AUTO_REPLY_COMPILED when changes are detected.
+and AUTO_REPLY_RULES when changes are detected.
 """
 
 import asyncio
@@ -11,6 +11,9 @@ import aiohttp
 from discord.ext import tasks
 from bot.config import Config
 from bot.logger import logger
+from bot import http_client
+from bot import faq_cache
+from bot.auto_reply_matcher import AUTO_REPLY_FILES, AutoReplyRules, build_rules
 
 
 # Module-level state
@@ -19,13 +22,16 @@ _update_lock = asyncio.Lock()
 _etags = {}  # filename -> ETag for conditional requests
 
 
-def _compile_regex_patterns(content: str) -> list:
-    """Compile regex patterns from autoreplyregex.txt content.
+def _compile_regex_patterns(regex_content: str, rules_content: str, previous: AutoReplyRules) -> AutoReplyRules:
+    """Compile regex patterns from autoreplyregex.txt and autoreplyrules.json content.
 
-    Replicates the logic from create_client().
+    Replicates the logic from create_client(), keeping the previous rules' cooldowns.
+
+    Raises:
+        re.error: If any pattern is not a valid regex
+        ValueError: If autoreplyrules.json is not valid
     """
-    lines = [line.strip() for line in content.splitlines() if line.strip()]
-    return [re.compile(pattern, re.IGNORECASE) for pattern in lines]
+    return build_rules(regex_content, rules_content, previous)
 
 
 async def _fetch_file_from_github(session: aiohttp.ClientSession, filename: str) -> tuple[Optional[str], bool]:
@@ -81,32 +87,45 @@ async def _check_and_update_prompts():
 
     logger.debug("Checking GitHub for prompt updates...")
 
-    async with aiohttp.ClientSession() as session:
-        updates = {}
-        regex_changed = False
-
-        # Fetch all prompt files
-        for filename in _client_module.PROMPT_FILES.keys():
-            content, changed = await _fetch_file_from_github(session, filename)
-            if changed and content is not None:
-                updates[filename] = content
-                if filename == "autoreplyregex.txt":
-                    regex_changed = True
-
-        # Apply updates under lock
-        if updates:
-            async with _update_lock:
-                for filename, content in updates.items():
-                    _client_module.PROMPT_FILES[filename] = content
-                    logger.info("Prompt file updated from GitHub: %s", filename)
-
-                # Recompile regex if autoreplyregex.txt changed
-                if regex_changed:
-                    _client_module.AUTO_REPLY_COMPILED = _compile_regex_patterns(
-                        updates["autoreplyregex.txt"]
+    session = http_client.get_session()
+    updates = {}
+    regex_changed = False
+
+    # Fetch all prompt files
+    for filename in _client_module.PROMPT_FILES.keys():
+        content, changed = await _fetch_file_from_github(session, filename)
+        if changed and content is not None:
+            updates[filename] = content
+            if filename in AUTO_REPLY_FILES:
+                regex_changed = True
+
+    # Apply updates under lock
+    if updates:
+        async with _update_lock:
+            for filename, content in updates.items():
+                _client_module.PROMPT_FILES[filename] = content
+                logger.info("Prompt file updated from GitHub: %s", filename)
+
+            # Cached FAQ answers were written under the old instructions
+            swapped = faq_cache.PROMPT_FILES.intersection(updates)
+            if swapped:
+                faq_cache.FAQ_CACHE.invalidate(f"updated {', '.join(sorted(swapped))}")
+
+            # Recompile regex if an auto-reply rule file changed. The new rules are
+            # built in full first, then swapped in with a single assignment
+            if regex_changed:
+                try:
+                    rules = _compile_regex_patterns(
+                        _client_module.PROMPT_FILES["autoreplyregex.txt"],
+                        _client_module.PROMPT_FILES["autoreplyrules.json"],
+                        _client_module.AUTO_REPLY_RULES,
                     )
-                    logger.info("Recompiled %d auto-reply regex patterns",
-                              len(_client_module.AUTO_REPLY_COMPILED))
+                except (re.error, ValueError) as e:
+                    logger.error("Invalid auto-reply rules from GitHub, keeping the previous %d pattern(s): %s",
+                                 len(_client_module.AUTO_REPLY_RULES), e)
+                else:
+                    _client_module.AUTO_REPLY_RULES = rules
+                    logger.info("Recompiled %d auto-reply regex patterns", len(rules))
 
 
 @tasks.loop(seconds=Config.PROMPT_POLL_INTERVAL)
@@ -1,6 +1,7 @@
 import logging
+from typing import Literal, Optional
 from bot.logger import logger
-from bot.checks import channel_check
+from bot.checks import admin_check, channel_check
 from bot.client import DiscordClient
 import discord
 from bot.llm_router import get_llm_response
@@ -8,16 +9,23 @@ import bot.client as bot_client
 from bot.config import Config
 from bot.checks import is_rate_limited
 from bot.message_format import format_user_message
+from bot.streaming import StreamingReply, streaming_enabled
+from bot import tracing
+from bot import metering
+from bot import conversation_store
+from bot import runtime_stats
+from bot.scheduler import BUSY_MESSAGE, SchedulerBusy
 
 def setup(discord_client: DiscordClient):
 
-    async def handle_ask_denbot(interaction: discord.Interaction, newUserMessage: discord.Message, additional_context: str = "") -> str:
+    async def handle_ask_denbot(interaction: discord.Interaction, newUserMessage: discord.Message, additional_context: str = "", stream: Optional[StreamingReply] = None) -> str:
         content = format_user_message(newUserMessage.author.display_name, newUserMessage.content)
         if additional_context:
             content = f"{content}\n\nAdditional instructions from {interaction.user.display_name}: {additional_context}"
         messages = [{"role": "user", "content": content}]
         system_prompt =  bot_client.PROMPT_FILES["mainsystemprompt.txt"]
-        return await get_llm_response(messages, system_prompt, discord_message=newUserMessage)
+        return await get_llm_response(messages, system_prompt, discord_message=newUserMessage, stream=stream,
+                                      route="ask_denbot", guild_id=interaction.guild_id)
 
     class AskFAQModal(discord.ui.Modal, title="Ask DenBot"):
         """Modal for Ask DenBot with optional additional context."""
@@ -37,17 +45,32 @@ def setup(discord_client: DiscordClient):
 
         async def on_submit(self, interaction: discord.Interaction):
             logger.info(f"""Ask DenBot modal submitted by user {interaction.user.name} with message: ({self.target_message.content}) and additional context: ({self.additional_context.value})""")
-            await interaction.response.defer(thinking=True)
+            with tracing.start_trace("discord.ask_denbot", user=interaction.user.name, channel=interaction.channel_id), \
+                    metering.start_request("ask_denbot", interaction.user.id, interaction.guild_id):
+                await interaction.response.defer(thinking=True)
 
-            reply = await handle_ask_denbot(
-                interaction,
-                self.target_message,
-                self.additional_context.value
-            )
+                # The first followup replaces the "thinking..." placeholder; wait=True returns it for edits
+                stream = StreamingReply(lambda content: interaction.followup.send(content, wait=True)) if streaming_enabled() else None
+                try:
+                    reply = await handle_ask_denbot(
+                        interaction,
+                        self.target_message,
+                        self.additional_context.value,
+                        stream
+                    )
+                except SchedulerBusy:
+                    reply = BUSY_MESSAGE
 
-            if self.is_last_request:
-                reply = reply + f"\n\n(You have reached your {Config.RATE_LIMIT_WINDOW_HOURS} hour limit)"
-            await interaction.followup.send(reply)
+                if self.is_last_request and reply != BUSY_MESSAGE:
+                    reply = reply + f"\n\n(You have reached your {Config.RATE_LIMIT_WINDOW_HOURS} hour limit)"
+                with tracing.span("discord.send", chars=len(reply), streamed=stream is not None):
+                    if stream is not None:
+                        sent = await stream.finish(reply)
+                        reply = stream.content
+                    else:
+                        sent = await interaction.followup.send(reply, wait=True)
+                if sent is not None:
+                    conversation_store.record(sent, sent.author.id, content=reply)
 
     @discord_client.tree.context_menu(name="Ask DenBot")
     @discord.app_commands.allowed_installs(guilds=True, users=True)
@@ -79,3 +102,62 @@ def setup(discord_client: DiscordClient):
                 await interaction.followup.send("Something went wrong. Please try again later.", ephemeral=True)
             else:
                 await interaction.response.send_message("Something went wrong. Please try again later.", ephemeral=True)
+
+    def format_usage_key(group_by: str, key) -> str:
+        if group_by == "user":
+            return f"<@{key}>" if key else "unknown user"
+        if group_by == "guild":
+            guild = discord_client.get_guild(key) if key else None
+            return guild.name if guild else (str(key) if key else "DMs")
+        return f"`{key or 'unknown'}`"
+
+    @discord_client.tree.command(name="usage", description="Show LLM token usage and estimated cost (admins only)")
+    @discord.app_commands.describe(group_by="How to group the usage", days="Number of days to include, today included")
+    @discord.app_commands.allowed_installs(guilds=True, users=True)
+    @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+    @discord.app_commands.check(admin_check)
+    async def usage(interaction: discord.Interaction, group_by: Literal["user", "guild", "route", "model"] = "user",
+                    days: discord.app_commands.Range[int, 1, 365] = 7):
+        logger.info("User %s requested usage by %s for %d day(s)", interaction.user.name, group_by, days)
+        rows = metering.usage_report(group_by, days)
+        if not rows:
+            await interaction.response.send_message(f"No usage recorded in the last {days} day(s).", ephemeral=True)
+            return
+        lines = [f"**Usage by {group_by}, last {days} day(s)**"]
+        for row in rows:
+            lines.append(
+                f"{format_usage_key(group_by, row['key'])}: {row['requests']} request(s), "
+                f"{row['input_tokens']:,} in / {row['output_tokens']:,} out, "
+                f"cache {row['cache_read_tokens']:,} read / {row['cache_write_tokens']:,} write, "
+                f"{row['tool_calls']} tool call(s), ${row['cost_usd']:.4f}"
+            )
+        await interaction.response.send_message("\n".join(lines)[:2000], ephemeral=True,
+                                                allowed_mentions=discord.AllowedMentions.none())
+
+    @usage.error
+    async def usage_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
+        if isinstance(error, discord.app_commands.CheckFailure):
+            await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+        else:
+            logger.error(f"Unexpected error in usage command: {error}", exc_info=True)
+            if interaction.response.is_done():
+                await interaction.followup.send("Something went wrong. Please try again later.", ephemeral=True)
+            else:
+                await interaction.response.send_message("Something went wrong. Please try again later.", ephemeral=True)
+
+    @discord_client.tree.command(name="stats", description="Show runtime counters since startup (admins only)")
+    @discord.app_commands.allowed_installs(guilds=True, users=True)
+    @discord.app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+    @discord.app_commands.check(admin_check)
+    async def stats(interaction: discord.Interaction):
+        logger.info("User %s requested runtime stats", interaction.user.name)
+        await interaction.response.send_message(runtime_stats.report()[:2000], ephemeral=True,
+                                                allowed_mentions=discord.AllowedMentions.none())
+
+    @stats.error
+    async def stats_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
+        if isinstance(error, discord.app_commands.CheckFailure):
+            await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+        else:
+            logger.error(f"Unexpected error in stats command: {error}", exc_info=True)
+            await interaction.response.send_message("Something went wrong. Please try again later.", ephemeral=True)
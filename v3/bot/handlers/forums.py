@@ -5,6 +5,10 @@ from bot.config import Config
 import asyncio
 from bot.llm_router import get_llm_response
 from bot.client import PROMPT_FILES
+from bot import tracing
+from bot import metering
+from bot import conversation_store
+from bot.scheduler import SchedulerBusy
 
 async def generate_forum_reply(thread: discord.Thread) -> str:
     """Generate a reply for forum posts using the configured LLM with tool support."""
@@ -15,7 +19,8 @@ async def generate_forum_reply(thread: discord.Thread) -> str:
 
     logger.debug("Fetched starter message for thread '%s'", thread.name)
 
-    return await get_llm_response(messages_history, PROMPT_FILES["forumsystemprompt.txt"])
+    return await get_llm_response(messages_history, PROMPT_FILES["forumsystemprompt.txt"],
+                                  route="forum", guild_id=thread.guild.id)
 
 def setup(discord_client: DiscordClient):
     @discord_client.event
@@ -61,10 +66,14 @@ def setup(discord_client: DiscordClient):
                 logger.debug("Generating forum reply for thread '%s' (author: %s)",
                             thread.name, starter_message.author.name)
 
-                reply = await generate_forum_reply(thread)
+                with tracing.start_trace("discord.forum_reply", thread=thread.name, channel=thread.parent_id), \
+                        metering.start_request("forum", starter_message.author.id, thread.guild.id):
+                    reply = await generate_forum_reply(thread)
 
-                logger.debug("Sending new reply to thread '%s'", thread.name)
-                await thread.send(reply)
+                    logger.debug("Sending new reply to thread '%s'", thread.name)
+                    with tracing.span("discord.send", chars=len(reply)):
+                        sent = await thread.send(reply)
+                    conversation_store.record(sent, sent.author.id)
 
                 logger.info("Forum reply sent to thread '%s' in %s", thread.name, thread.parent.name)
 
@@ -75,6 +84,8 @@ def setup(discord_client: DiscordClient):
                 logger.error("Forum reply failed: starter_message is None after fetch attempt for thread '%s'",
                             thread.name)
 
+        except SchedulerBusy as e:
+            logger.warning("Forum reply skipped for thread '%s': %s", thread.name, e)
         except discord.errors.Forbidden as e:
             logger.error("Permission denied sending reply to thread '%s': %s", thread.name, e)
         except discord.errors.HTTPException as e:
@@ -1,35 +1,78 @@
 from bot.client import DiscordClient
 import discord
+import time
+from typing import Optional
 from bot.config import Config
 from bot.logger import logger
 import bot.client as bot_client
 from bot.llm_router import get_llm_response
 from bot.checks import is_rate_limited
 from bot.message_format import format_user_message
+from bot.streaming import CURSOR, StreamingReply, streaming_enabled
+from bot import tracing
+from bot import metering
+from bot.scheduler import BUSY_MESSAGE, SchedulerBusy
+from bot import message_cache
+from bot import conversation_store
 
 async def gather_reply_chain(message: discord.Message, bot_user_id: int, max_depth: int = 20) -> list[dict]:
-    """Walk up the reply chain and return conversation list ordered oldest first."""
+    """
+    Walk up the reply chain and return conversation list ordered oldest first.
+
+    Hops are resolved from memory first, then from the conversation store
+    (one query covers every stored ancestor), and over REST only for messages
+    found in neither.
+    """
     chain = []
-    current_msg = message
     depth = 0
+    sources = {"resolved": 0, "client_cache": 0, "lru": 0, "store": 0, "rest": 0}
+    started = time.perf_counter()
 
-    while current_msg and depth < max_depth:
-        content = current_msg.content.replace(f"<@{bot_user_id}>", "").strip()
-
+    def add(author_id: int, author_name: str, content: str):
         if content:
-            role = "assistant" if current_msg.author.id == bot_user_id else "user"
-            formatted = format_user_message(current_msg.author.display_name, content) if role == "user" else content
+            role = "assistant" if author_id == bot_user_id else "user"
+            formatted = format_user_message(author_name, content) if role == "user" else content
             chain.append({"role": role, "content": formatted})
 
-        if current_msg.reference and current_msg.reference.message_id:
-            try:
-                current_msg = await current_msg.channel.fetch_message(current_msg.reference.message_id)
-                depth += 1
-            except discord.NotFound:
-                logger.warning("Referenced message %s not found in chain", current_msg.reference.message_id)
+    with tracing.span("discord.reply_chain") as chain_span:
+        current_msg: Optional[discord.Message] = message
+        add(message.author.id, message.author.display_name, conversation_store.normalize_content(message.content, bot_user_id))
+        next_id = message.reference.message_id if message.reference else None
+
+        # Up to max_depth messages in total, the triggering one included
+        while next_id and depth + 1 < max_depth:
+            found, source = message_cache.lookup(next_id, current_msg.reference if current_msg else None)
+            if source == "deleted":
+                logger.warning("Referenced message %s was deleted", next_id)
                 break
-        else:
-            break
+            if found is None:
+                rows = await conversation_store.load_chain(next_id, max_depth - 1 - depth)
+                if rows:
+                    for row in rows:
+                        add(row["author_id"], row["author_name"], row["content"])
+                    depth += len(rows)
+                    sources["store"] += len(rows)
+                    current_msg, next_id = None, rows[-1]["parent_id"]
+                    continue
+                found = await message_cache.fetch(message.channel, next_id)
+                source = "rest"
+                if found is None:
+                    logger.warning("Referenced message %s not found in chain", next_id)
+                    break
+
+            sources[source] += 1
+            depth += 1
+            conversation_store.record(found, bot_user_id)
+            add(found.author.id, found.author.display_name, conversation_store.normalize_content(found.content, bot_user_id))
+            current_msg = found
+            next_id = found.reference.message_id if found.reference else None
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if chain_span is not None:
+            chain_span.set(depth=depth, store_hops=sources["store"], rest_fetches=sources["rest"])
+    logger.info("Reply chain: %d hop(s) in %.1fms (resolved %d, client cache %d, lru %d, store %d, rest %d)",
+                depth, elapsed_ms, sources["resolved"], sources["client_cache"], sources["lru"],
+                sources["store"], sources["rest"])
 
     chain.reverse()
 
@@ -44,17 +87,37 @@ async def gather_reply_chain(message: discord.Message, bot_user_id: int, max_dep
     return merged
 
 
-async def send_llm_reply(message: discord.Message, messages: list[dict], system_prompt: str, notice: str = ""):
-    """Get LLM response and reply to the message."""
-    async with message.channel.typing():
-        reply = await get_llm_response(messages, system_prompt, channel=message.channel, discord_message=message)
+async def send_llm_reply(message: discord.Message, messages: list[dict], system_prompt: str, notice: str = "",
+                         route: str = "mention", trigger: Optional[str] = None):
+    """Get LLM response and reply to the message, streaming it in when enabled."""
+    stream = StreamingReply(message.reply) if streaming_enabled() else None
+    try:
+        async with message.channel.typing():
+            reply = await get_llm_response(messages, system_prompt, channel=message.channel, discord_message=message,
+                                           stream=stream, route=route, guild_id=message.guild.id if message.guild else None,
+                                           trigger=trigger)
+    except SchedulerBusy as e:
+        if not e.interactive:
+            logger.info("Skipping %s reply to %s: %s", e.route, message.author.name, e)
+            return
+        reply = BUSY_MESSAGE
     if notice:
         reply = reply + "\n\n" + notice
-    if len(reply) > 2000:
-        logger.warning("Response too long (%d chars), notifying user", len(reply))
-        await message.reply("The generated message was too long to send.")
-    else:
-        await message.reply(reply)
+    with tracing.span("discord.send", chars=len(reply), streamed=stream is not None):
+        if stream is not None:
+            sent = await stream.finish(reply)
+            reply = stream.content
+        elif len(reply) > 2000:
+            logger.warning("Response too long (%d chars), notifying user", len(reply))
+            reply = "The generated message was too long to send."
+            sent = await message.reply(reply)
+        else:
+            sent = await message.reply(reply)
+    if sent is not None:
+        # Users reply to the bot's answer next; keep it for that chain unless
+        # the gateway copy, which tracks later edits, is already kept
+        message_cache.remember(sent, replace=False)
+        conversation_store.record(sent, sent.author.id, content=reply)
 
 
 async def handle_regex_replies(message: discord.Message) -> bool:
@@ -62,12 +125,19 @@ async def handle_regex_replies(message: discord.Message) -> bool:
     if not Config.REGEX_REPLIES_ENABLED:
         return False
 
-    for pattern in bot_client.AUTO_REPLY_COMPILED:
-        if pattern.search(message.content):
-            logger.info("Auto-reply triggered: regex '%s' matched message from %s", pattern.pattern, message.author.name)
-            messages = [{"role": "user", "content": format_user_message(message.author.display_name, message.content)}]
-            await send_llm_reply(message, messages, bot_client.PROMPT_FILES["mainsystemprompt.txt"])
-            return True
+    rules = bot_client.AUTO_REPLY_RULES
+    guild_id = message.guild.id if message.guild else None
+    # Threads also get their parent channel's rules
+    parent_id = getattr(message.channel, "parent_id", None)
+    rule = rules.match(message.content, guild_id, message.channel.id, parent_id)
+    if rule is not None:
+        logger.info("Auto-reply triggered: regex '%s' matched message from %s", rule.pattern, message.author.name)
+        messages = [{"role": "user", "content": format_user_message(message.author.display_name, message.content)}]
+        with tracing.start_trace("discord.auto_reply", user=message.author.name, channel=message.channel.id), \
+                metering.start_request("auto_reply", message.author.id, message.guild.id if message.guild else None):
+            await send_llm_reply(message, messages, bot_client.PROMPT_FILES["mainsystemprompt.txt"], route="auto_reply",
+                                 trigger=rule.pattern)
+        return True
 
     return False
 
@@ -96,9 +166,36 @@ def has_permission(message: discord.Message) -> bool:
 
 
 def setup(discord_client: DiscordClient):
+    @discord_client.event
+    async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+        """Keep stored content in step with edits, including messages discord.py no longer caches."""
+        message_cache.forget([payload.message_id])
+        content = payload.data.get("content")
+        if content is None or not discord_client.user:
+            return
+        author_id = int(payload.data.get("author", {}).get("id", 0))
+        # Streamed previews are partial; send_llm_reply records the final text
+        if author_id == discord_client.user.id and content.endswith(CURSOR):
+            return
+        conversation_store.update_content(payload.message_id, content, discord_client.user.id)
+
+    @discord_client.event
+    async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+        message_cache.forget([payload.message_id])
+        conversation_store.delete([payload.message_id])
+
+    @discord_client.event
+    async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+        message_cache.forget(payload.message_ids)
+        conversation_store.delete(payload.message_ids)
+
     @discord_client.event
     async def on_message(message: discord.Message):
         """Handle messages that @mention the bot, with reply context if present."""
+        # Every message seen, the bot's own replies included, may be a later reply chain hop
+        message_cache.remember(message)
+        if discord_client.user:
+            conversation_store.record(message, discord_client.user.id, replace=False)
         if message.author.bot:
             return
 
@@ -113,23 +210,25 @@ def setup(discord_client: DiscordClient):
         if not has_permission(message):
             return
 
-        limited, reset_time, is_last_request = is_rate_limited(message.author.id)
-        if limited:
-            reset_str = f"<t:{int(reset_time.timestamp())}:R>"
-            await message.reply(f"You've reached the rate limit of {Config.RATE_LIMIT_REQUESTS} requests per {Config.RATE_LIMIT_WINDOW_HOURS} hours. Try again {reset_str}.")
-            return
+        with tracing.start_trace("discord.on_message", user=message.author.name, channel=message.channel.id), \
+                metering.start_request("mention", message.author.id, message.guild.id if message.guild else None):
+            limited, reset_time, is_last_request = is_rate_limited(message.author.id)
+            if limited:
+                reset_str = f"<t:{int(reset_time.timestamp())}:R>"
+                await message.reply(f"You've reached the rate limit of {Config.RATE_LIMIT_REQUESTS} requests per {Config.RATE_LIMIT_WINDOW_HOURS} hours. Try again {reset_str}.")
+                return
 
-        messages = await gather_reply_chain(message, discord_client.user.id)
+            messages = await gather_reply_chain(message, discord_client.user.id)
 
-        if messages and messages[0]["role"] != "user":
-            messages = messages[1:]
+            if messages and messages[0]["role"] != "user":
+                messages = messages[1:]
 
-        if not messages:
-            content = message.content.replace(f"<@{discord_client.user.id}>", "").strip()
-            messages = [{"role": "user", "content": format_user_message(message.author.display_name, content)}]
+            if not messages:
+                content = message.content.replace(f"<@{discord_client.user.id}>", "").strip()
+                messages = [{"role": "user", "content": format_user_message(message.author.display_name, content)}]
 
-        logger.info("User %s mentioned bot. Chain: %d messages", message.author.name, len(messages))
-        logger.debug("Conversation chain: %s", messages)
+            logger.info("User %s mentioned bot. Chain: %d messages", message.author.name, len(messages))
+            logger.debug("Conversation chain: %s", messages)
 
-        notice = f"(You have reached your {Config.RATE_LIMIT_WINDOW_HOURS} hour limit)" if is_last_request else ""
-        await send_llm_reply(message, messages, bot_client.PROMPT_FILES["mainsystemprompt.txt"], notice=notice)
+            notice = f"(You have reached your {Config.RATE_LIMIT_WINDOW_HOURS} hour limit)" if is_last_request else ""
+            await send_llm_reply(message, messages, bot_client.PROMPT_FILES["mainsystemprompt.txt"], notice=notice)
@@ -0,0 +1,59 @@
+"""Shared async HTTP client.
+
+A single pooled aiohttp session is created when the bot starts and closed on
+shutdown. Tools, image downloads and the GitHub prompt refresher all borrow it
+so no request blocks the event loop or pays for a fresh TLS handshake.
+"""
+
+from typing import Optional
+import aiohttp
+from bot.config import Config
+from bot.logger import logger
+
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def _build_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=Config.HTTP_POOL_LIMIT,
+        limit_per_host=Config.HTTP_POOL_LIMIT_PER_HOST,
+        ttl_dns_cache=Config.HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=Config.HTTP_KEEPALIVE_TIMEOUT,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=Config.HTTP_TIMEOUT_SECONDS,
+        connect=Config.HTTP_CONNECT_TIMEOUT_SECONDS,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def start_session() -> aiohttp.ClientSession:
+    """Create the shared session. Safe to call more than once."""
+    global _session
+    if _session is None or _session.closed:
+        _session = _build_session()
+        logger.info("HTTP session started (pool limit %d, %d per host)",
+                    Config.HTTP_POOL_LIMIT, Config.HTTP_POOL_LIMIT_PER_HOST)
+    return _session
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the shared session, creating it lazily if startup was skipped.
+
+    Must be called from inside the running event loop.
+    """
+    global _session
+    if _session is None or _session.closed:
+        logger.debug("HTTP session not started yet, creating it lazily")
+        _session = _build_session()
+    return _session
+
+
+async def close_session():
+    """Close the shared session and release pooled connections."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("HTTP session closed")
+    _session = None
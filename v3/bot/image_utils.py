@@ -9,6 +9,7 @@ import aiohttp
 from PIL import Image
 from bot.logger import logger
 from bot.config import Config
+from bot import http_client
 import discord
 
 
@@ -53,11 +54,10 @@ async def download_attachment(attachment: discord.Attachment) -> bytes:
     if attachment.size > max_bytes:
         raise ValueError(f"Image file size ({attachment.size / 1024 / 1024:.2f}MB) exceeds limit ({Config.IMAGE_MAX_FILE_SIZE_MB}MB)")
 
-    # Download the image
-    async with aiohttp.ClientSession() as session:
-        async with session.get(attachment.url) as response:
-            response.raise_for_status()
-            return await response.read()
+    # Download the image over the shared session
+    async with http_client.get_session().get(attachment.url) as response:
+        response.raise_for_status()
+        return await response.read()
 
 
 def resize_image(image_bytes: bytes, max_dimensions: int) -> bytes:
@@ -7,13 +7,25 @@ from bot.prompt_rendering import render_system_prompt
 from typing import Optional
 import discord
 from bot.memory import hindsight
+from bot.streaming import StreamingReply
+from bot.context_budget import fit_to_budget
+from bot import tracing
+from bot import metering
+from bot.scheduler import INTERACTIVE_ROUTES, QUEUED_MESSAGE, SCHEDULER
+from bot import single_flight
+from bot.faq_cache import FAQ_CACHE, question_text
+from bot.message_format import AUTHOR_AGNOSTIC_ROUTES, without_author
 
 
 async def get_llm_response(
     messages: list,
     system_prompt: str,
     channel: Optional[discord.abc.Messageable] = None,
-    discord_message: Optional[discord.Message] = None
+    discord_message: Optional[discord.Message] = None,
+    stream: Optional[StreamingReply] = None,
+    route: str = "mention",
+    guild_id: Optional[int] = None,
+    trigger: Optional[str] = None
 ) -> str:
     """
     Route LLM requests to the appropriate provider based on LLM_PROVIDER config.
@@ -23,16 +35,90 @@ async def get_llm_response(
         system_prompt: The system prompt to use
         channel: Optional Discord channel for typing indicators
         discord_message: Optional Discord message for processing attachments (images)
+        stream: Optional StreamingReply to show the reply progressively; the
+            caller still finishes it with the returned text
+        route: mention, ask_denbot, forum or auto_reply; drives scheduling
+            weights, the busy policy, coalescing and the FAQ cache
+        guild_id: Guild the request came from, None in DMs; the scheduler's fairness flow
+        trigger: Auto-reply regex that fired, ignored when comparing FAQ questions
 
     Returns:
         The response text from the LLM
 
     Raises:
         ValueError: If LLM_PROVIDER is not recognized
+        SchedulerBusy: If the scheduler turned the request away
     """
     provider = Config.LLM_PROVIDER.lower()
-    logger.debug(f"Routing LLM request to provider: {provider}")
+    # Metering only supplies token counts for FAQ entries; it may be disabled
+    request = metering.current_request()
+    # Attachments become image blocks later, so such requests are never identical
+    has_attachments = bool(discord_message is not None and discord_message.attachments)
+    coalesce = Config.LLM_COALESCE_ENABLED and not has_attachments
+    question = None
+    if route in AUTHOR_AGNOSTIC_ROUTES:
+        anonymous = [
+            {**message, "content": without_author(message.get("content"))} if message.get("role") == "user" else message
+            for message in messages
+        ]
+        question = None if has_attachments else question_text(route, anonymous, trigger)
+        if coalesce or question is not None:
+            # The reply may be handed to other users, so it must not address this one
+            messages = anonymous
+    # FAQ answers are tied to the prompt file as written, not to today's rendering of it
+    prompt_source = system_prompt
     system_prompt = render_system_prompt(system_prompt)
+    queued_at: Optional[int] = None
+
+    async def on_queued(position: int):
+        nonlocal queued_at
+        queued_at = position
+        if stream is not None and route in INTERACTIVE_ROUTES:
+            stream.push(QUEUED_MESSAGE.format(position=position))
+
+    with tracing.span("llm.get_response", provider=provider, messages=len(messages), route=route) as response_span:
+        if question is not None:
+            cached = FAQ_CACHE.lookup(route, prompt_source, question)
+            if response_span is not None:
+                response_span.set(faq_cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+
+        async def call() -> str:
+            async with SCHEDULER.slot(route, guild_id, on_queued):
+                if queued_at is not None:
+                    if stream is not None:
+                        stream.reset()  # The queued notice is replaced by the first streamed text
+                    if response_span is not None:
+                        response_span.set(queue_position=queued_at)
+                return await _get_llm_response(provider, messages, system_prompt, channel, discord_message, stream)
+
+        if not coalesce:
+            reply, coalesced = await call(), False
+        else:
+            model = Config.MODEL_NAME if provider == "anthropic" else Config.OPENAI_MODEL_NAME
+            key = single_flight.request_key(provider, model, route, system_prompt, messages)
+            reply, coalesced = await single_flight.run(key, call)
+            if response_span is not None:
+                response_span.set(coalesced=coalesced)
+
+        # A coalesced reply was already stored by the request that produced it
+        if question is not None and not coalesced:
+            counters = request.counters if request else {}
+            tokens = sum(counters.get(name, 0) for name in ("input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens"))
+            FAQ_CACHE.store(route, prompt_source, question, reply, tokens, counters.get("cost_usd", 0.0))
+        return reply
+
+
+async def _get_llm_response(
+    provider: str,
+    messages: list,
+    system_prompt: str,
+    channel: Optional[discord.abc.Messageable],
+    discord_message: Optional[discord.Message],
+    stream: Optional[StreamingReply]
+) -> str:
+    logger.debug(f"Routing LLM request to provider: {provider}")
 
     for message in messages:
         if message.get("content") == "":
@@ -58,10 +144,11 @@ async def get_llm_response(
 
                 # Process each image attachment
                 for attachment in image_attachments:
-                    image_block = await process_discord_attachment(
-                        attachment,
-                        Config.IMAGE_MAX_DIMENSIONS
-                    )
+                    with tracing.span("image.process", filename=attachment.filename, bytes=attachment.size):
+                        image_block = await process_discord_attachment(
+                            attachment,
+                            Config.IMAGE_MAX_DIMENSIONS
+                        )
                     if image_block:
                         content_blocks.append(image_block)
                         logger.debug(f"Added image: {attachment.filename}")
@@ -73,21 +160,25 @@ async def get_llm_response(
 
     if Config.HINDSIGHT_ENABLED and Config.HINDSIGHT_RECALL_ENABLED:
         recall_query = hindsight.get_recall_query(messages)
-        recalled_memories = await hindsight.recall(
-            recall_query,
-            Config.HINDSIGHT_RECALL_MAX_TOKENS,
-        )
+        with tracing.span("hindsight.recall"):
+            recalled_memories = await hindsight.recall(
+                recall_query,
+                Config.HINDSIGHT_RECALL_MAX_TOKENS,
+            )
         memory_prompt = hindsight.build_memory_prompt(recalled_memories)
         if memory_prompt:
             system_prompt = f"{system_prompt}\n\n{memory_prompt}"
 
+    # Memory keeps the full conversation; only the request is trimmed
+    llm_messages = fit_to_budget(messages, system_prompt)
+
     if provider == "anthropic":
         from claude.response import generate_claude_response
-        reply = await generate_claude_response(messages, system_prompt, channel)
+        reply = await generate_claude_response(llm_messages, system_prompt, channel, stream)
 
     elif provider == "openai":
         from local_llm.response import generate_openai_response
-        reply = await generate_openai_response(messages, system_prompt, channel)
+        reply = await generate_openai_response(llm_messages, system_prompt, channel, stream)
 
     else:
         error_msg = f"Unknown LLM_PROVIDER: {Config.LLM_PROVIDER}. Must be 'anthropic' or 'openai'"
@@ -101,7 +192,6 @@ async def get_llm_response(
         )
         metadata = hindsight.build_discord_context(discord_message)
         context = "Discord bot conversation turn"
-        import asyncio
-        asyncio.create_task(hindsight.retain(retain_content, context, metadata))
+        tracing.create_task(hindsight.retain(retain_content, context, metadata), "hindsight.retain")
 
     return reply
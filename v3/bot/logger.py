@@ -15,10 +15,13 @@ def setup_logger():
         # Console handler
         handler = logging.StreamHandler()
         handler.setLevel(Config.LOGGING_LEVEL)
+        # Imported here because bot.tracing itself logs through this logger
+        from bot.tracing import TraceIdFilter
+        handler.addFilter(TraceIdFilter())
 
         # Formatter
         formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+            '%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
         )
         handler.setFormatter(formatter)
 
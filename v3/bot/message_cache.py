@@ -0,0 +1,98 @@
+"""
+Recently seen Discord messages, for rebuilding reply chains without REST calls.
+
+Every message the bot sees (including its own replies) is kept in an LRU
+keyed by message ID. Entries are dropped when the gateway reports a message
+deleted or edited (a kept copy may have left discord.py's cache, which is
+the only place edits are applied in place). lookup() finds the message a
+reply points to in memory, in this order:
+1. reference.resolved, which Discord sends along with the replying message
+2. discord.py's own message cache
+3. this LRU
+fetch() is the REST fallback for true misses.
+"""
+
+from collections import OrderedDict
+from typing import Iterable, Optional
+import discord
+from bot.config import Config
+
+_messages: OrderedDict[int, discord.Message] = OrderedDict()
+_counters = {"resolved": 0, "client_cache": 0, "lru": 0, "rest": 0}
+
+
+def stats() -> dict[str, int]:
+    """Where referenced messages were found since startup."""
+    return {**_counters, "entries": len(_messages)}
+
+
+def remember(message: discord.Message, replace: bool = True):
+    """
+    Keep a message in the LRU.
+
+    Args:
+        message: Message to keep
+        replace: Overwrite a kept copy. The gateway's copy is updated in place
+            on edits, so send results, which are not, should pass False.
+    """
+    if replace or message.id not in _messages:
+        _messages[message.id] = message
+    _messages.move_to_end(message.id)
+    while len(_messages) > Config.MESSAGE_CACHE_MAX_ENTRIES:
+        _messages.popitem(last=False)
+
+
+def forget(message_ids: Iterable[int]):
+    """Drop deleted (or edited but no longer live) messages so lookups cannot return them."""
+    for message_id in message_ids:
+        _messages.pop(message_id, None)
+
+
+def get(message_id: int) -> Optional[discord.Message]:
+    message = _messages.get(message_id)
+    if message is not None:
+        _messages.move_to_end(message_id)
+    return message
+
+
+def lookup(message_id: int, reference: Optional[discord.MessageReference] = None) -> tuple[Optional[discord.Message], str]:
+    """
+    Find a message in memory: the reference's resolved message, discord.py's cache, then this LRU.
+
+    Returns:
+        Tuple of (message, source) with source resolved, client_cache or lru;
+        (None, "deleted") if Discord reported it deleted, or (None, "missing")
+        if it is not in memory
+    """
+    found: Optional[discord.Message] = None
+    source = "missing"
+    if reference is not None and reference.message_id == message_id:
+        if isinstance(reference.resolved, discord.DeletedReferencedMessage):
+            return None, "deleted"
+        if isinstance(reference.resolved, discord.Message):
+            found, source = reference.resolved, "resolved"
+        elif reference.cached_message is not None:
+            found, source = reference.cached_message, "client_cache"
+    if found is None:
+        found = get(message_id)
+        source = "lru" if found is not None else "missing"
+    if found is not None:
+        _counters[source] += 1
+        remember(found)
+    return found, source
+
+
+async def fetch(channel: discord.abc.Messageable, message_id: int) -> Optional[discord.Message]:
+    """
+    Fetch a message over REST, for true misses only. None if it was deleted.
+
+    Raises:
+        discord.HTTPException: If the fetch fails for a reason other than NotFound
+    """
+    try:
+        found = await channel.fetch_message(message_id)
+    except discord.NotFound:
+        return None
+    _counters["rest"] += 1
+    remember(found)
+    return found
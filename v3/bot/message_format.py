@@ -1,6 +1,24 @@
 import json
+from typing import Any
+
+# Routes whose replies may be shared between users (request coalescing, FAQ
+# answers), so the model is never told who asked
+AUTHOR_AGNOSTIC_ROUTES = frozenset({"auto_reply", "forum"})
 
 
 def format_user_message(username: str, message: str) -> str:
     """Format Discord user input as JSON for the LLM."""
     return json.dumps({"user": username, "message": message}, ensure_ascii=False)
+
+
+def without_author(content: Any) -> Any:
+    """User message content with the author name removed. Content not made by format_user_message is returned as is."""
+    if not isinstance(content, str):
+        return content
+    try:
+        decoded = json.loads(content)
+    except ValueError:
+        return content
+    if isinstance(decoded, dict) and "message" in decoded and "user" in decoded:
+        return json.dumps({"message": decoded["message"]}, ensure_ascii=False)
+    return content
@@ -0,0 +1,204 @@
+"""
+Token usage and cost metering.
+
+Each LLM request runs inside start_request(), which records who asked
+(user, guild) and through which route (mention, auto_reply, forum, ask).
+Providers report every API call's usage and the tool runner counts tool
+calls; when the request ends its totals are rolled up in memory per
+day/user/guild/route/model. A background task flushes the rollups to a
+local SQLite file every METERING_FLUSH_SECONDS, and usage_report() answers
+admin queries over the flushed data.
+"""
+
+import asyncio
+import contextvars
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterator, Optional
+from bot.agent_loop import estimate_cost
+from bot.config import Config
+from bot.logger import logger
+
+COUNTERS = ("requests", "input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens", "tool_calls", "cost_usd")
+GROUP_COLUMNS = {"user": "user_id", "guild": "guild_id", "route": "route", "model": "model"}
+
+
+class RequestUsage:
+    """Usage accumulated by one request."""
+
+    def __init__(self, route: str, user_id: Optional[int], guild_id: Optional[int]):
+        self.route = route
+        self.user_id = user_id or 0
+        self.guild_id = guild_id or 0
+        self.model = ""
+        self.calls = 0
+        self.counters = {name: 0 for name in COUNTERS}
+
+
+_current: contextvars.ContextVar[Optional[RequestUsage]] = contextvars.ContextVar("metering_request", default=None)
+# (day, user_id, guild_id, route, model) -> counters not yet flushed
+_pending: dict[tuple, dict[str, float]] = {}
+_flush_task: Optional[asyncio.Task] = None
+_db: Optional[sqlite3.Connection] = None
+
+
+@contextmanager
+def start_request(route: str, user_id: Optional[int] = None, guild_id: Optional[int] = None) -> Iterator[RequestUsage]:
+    """Meter everything inside the block as one request on `route`. A no-op when metering is disabled."""
+    usage = RequestUsage(route, user_id, guild_id)
+    if not Config.METERING_ENABLED:
+        yield usage
+        return
+    token = _current.set(usage)
+    try:
+        yield usage
+    finally:
+        _current.reset(token)
+        _roll_up(usage)
+
+
+def current_request() -> Optional[RequestUsage]:
+    """The request being metered in this context, if any."""
+    return _current.get()
+
+
+def record_call(provider: str, model: str, input_tokens: int = 0, output_tokens: int = 0,
+                cache_write_tokens: int = 0, cache_read_tokens: int = 0):
+    """Add one LLM API call to the current request. A no-op outside start_request()."""
+    usage = _current.get()
+    if usage is None:
+        return
+    usage.model = model
+    usage.calls += 1
+    usage.counters["input_tokens"] += input_tokens
+    usage.counters["output_tokens"] += output_tokens
+    usage.counters["cache_write_tokens"] += cache_write_tokens
+    usage.counters["cache_read_tokens"] += cache_read_tokens
+    usage.counters["cost_usd"] += estimate_cost(provider, input_tokens, output_tokens, cache_write_tokens, cache_read_tokens)
+
+
+def record_tool_call():
+    usage = _current.get()
+    if usage is not None:
+        usage.counters["tool_calls"] += 1
+
+
+def _roll_up(usage: RequestUsage):
+    if not usage.calls:
+        return
+    day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    key = (day, usage.user_id, usage.guild_id, usage.route, usage.model)
+    totals = _pending.setdefault(key, {name: 0 for name in COUNTERS})
+    usage.counters["requests"] = 1
+    for name, value in usage.counters.items():
+        totals[name] += value
+    logger.debug("Metered %s request: %s", usage.route, usage.counters)
+
+
+def _connect() -> Optional[sqlite3.Connection]:
+    global _db
+    if _db is not None:
+        return _db
+    path = Config.METERING_DB or os.path.join(Config.CACHE_DIR, "metering.sqlite3")
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS usage_daily ("
+            " day TEXT NOT NULL, user_id INTEGER NOT NULL, guild_id INTEGER NOT NULL,"
+            " route TEXT NOT NULL, model TEXT NOT NULL,"
+            + "".join(f" {name} {'REAL' if name == 'cost_usd' else 'INTEGER'} NOT NULL DEFAULT 0," for name in COUNTERS)
+            + " PRIMARY KEY (day, user_id, guild_id, route, model))"
+        )
+    except sqlite3.Error as e:
+        logger.warning("Metering database %s unavailable: %s", path, e)
+        return None
+    _db = connection
+    return _db
+
+
+def flush() -> int:
+    """Write pending rollups to SQLite. Returns the number of rows upserted."""
+    if not _pending:
+        return 0
+    db = _connect()
+    if db is None:
+        return 0
+    rows = list(_pending.items())
+    _pending.clear()
+    assignments = ", ".join(f"{name} = {name} + excluded.{name}" for name in COUNTERS)
+    try:
+        db.execute("BEGIN")
+        db.executemany(
+            f"INSERT INTO usage_daily (day, user_id, guild_id, route, model, {', '.join(COUNTERS)})"
+            f" VALUES (?, ?, ?, ?, ?, {', '.join('?' for _ in COUNTERS)})"
+            f" ON CONFLICT (day, user_id, guild_id, route, model) DO UPDATE SET {assignments}",
+            [(*key, *(totals[name] for name in COUNTERS)) for key, totals in rows],
+        )
+        db.execute("COMMIT")
+    except sqlite3.Error as e:
+        logger.warning("Metering flush failed, keeping %d rollup(s) for the next attempt: %s", len(rows), e)
+        try:
+            db.execute("ROLLBACK")
+        except sqlite3.Error:
+            pass
+        for key, totals in rows:
+            merged = _pending.setdefault(key, {name: 0 for name in COUNTERS})
+            for name in COUNTERS:
+                merged[name] += totals[name]
+        return 0
+    logger.debug("Flushed %d metering rollup(s)", len(rows))
+    return len(rows)
+
+
+def usage_report(group_by: str, days: int = 7, limit: int = 10) -> list[dict[str, Any]]:
+    """
+    Top usage over the last `days` days (including today), grouped by user, guild, route or model.
+
+    Pending rollups are flushed first so the report is current.
+    """
+    column = GROUP_COLUMNS[group_by]
+    flush()
+    db = _connect()
+    if db is None:
+        return []
+    since = (datetime.now(timezone.utc) - timedelta(days=max(1, days) - 1)).strftime("%Y-%m-%d")
+    sums = ", ".join(f"SUM({name}) AS {name}" for name in COUNTERS)
+    cursor = db.execute(
+        f"SELECT {column} AS key, {sums} FROM usage_daily WHERE day >= ?"
+        f" GROUP BY {column} ORDER BY cost_usd DESC, input_tokens DESC LIMIT ?",
+        (since, limit),
+    )
+    names = [description[0] for description in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(Config.METERING_FLUSH_SECONDS)
+        started = time.monotonic()
+        flush()
+        logger.debug("Metering flush took %.3fs", time.monotonic() - started)
+
+
+def start_flush_task():
+    global _flush_task
+    if not Config.METERING_ENABLED:
+        return
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_loop())
+
+
+def stop_flush_task():
+    """Stop the periodic flush and write whatever is still pending."""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+    flush()
@@ -0,0 +1,59 @@
+"""
+Runtime counters from the request pipeline, for the /stats command.
+
+Each section formats one module's stats(); all counters reset on restart.
+"""
+
+from bot import agent_loop, faq_cache, scheduler, single_flight, tool_runner
+
+
+def _scheduler_lines() -> list[str]:
+    stats = scheduler.stats()
+    lines = [f"**LLM scheduler**: {stats['active']} active, {stats['queued']} queued "
+             f"(deepest queue {stats['max_depth_seen']})"]
+    for route, values in sorted(stats["routes"].items()):
+        admitted = values["admitted"]
+        average_wait = values["wait_seconds"] / admitted if admitted else 0.0
+        lines.append(
+            f"`{route}`: {admitted:.0f} admitted, {values['queued']:.0f} queued, "
+            f"wait avg {average_wait:.1f}s / max {values['max_wait_seconds']:.1f}s, "
+            f"{values['rejected']:.0f} rejected, {values['displaced']:.0f} displaced, {values['timed_out']:.0f} timed out"
+        )
+    return lines
+
+
+def _single_flight_lines() -> list[str]:
+    stats = single_flight.stats()
+    return [f"**Request coalescing**: {stats['leaders']} upstream call(s), {stats['coalesced']} coalesced, "
+            f"{stats['errors']} failed, {stats['in_flight']} in flight"]
+
+
+def _faq_cache_lines() -> list[str]:
+    stats = faq_cache.stats()
+    return [f"**FAQ cache**: {stats['hits']}/{stats['lookups']} hits ({stats['hit_rate']:.0%}), "
+            f"{stats['entries']} entries, {stats['stores']} stored, {stats['invalidations']} clears, "
+            f"saved ~{stats['saved_tokens']:,} tokens / ${stats['saved_cost_usd']:.4f}"]
+
+
+def _tool_lines() -> list[str]:
+    lines = ["**Tools**"]
+    for name, values in sorted(tool_runner.get_stats().items()):
+        calls = values["calls"]
+        lines.append(
+            f"`{name}`: {calls:.0f} calls, {values['timeouts']:.0f} timed out, "
+            f"queued avg {values['queued_seconds'] / calls:.2f}s, ran avg {values['exec_seconds'] / calls:.2f}s"
+        )
+    return lines if len(lines) > 1 else ["**Tools**: no calls yet"]
+
+
+def _agent_loop_lines() -> list[str]:
+    counts = agent_loop.stats()
+    return ["**Agent loop limits hit**: " + ", ".join(f"{count} {limit.replace('_', ' ')}" for limit, count in counts.items())]
+
+
+SECTIONS = (_scheduler_lines, _single_flight_lines, _faq_cache_lines, _tool_lines, _agent_loop_lines)
+
+
+def report() -> str:
+    """All sections as Discord markdown, one line per counter group."""
+    return "\n".join(line for section in SECTIONS for line in section())
@@ -0,0 +1,217 @@
+"""
+Global scheduler for LLM requests.
+
+At most LLM_MAX_CONCURRENCY requests talk to the provider at once; the rest
+wait in a weighted fair queue. Each (guild, route) pair is a flow, and flows
+are served by self-clocked fair queuing: a request's finish tag is
+max(virtual time, its flow's last tag) + 1 / route weight, and the lowest tag
+goes next. A burst in one guild or on one route therefore cannot starve the
+others, and higher-weight routes (mentions by default) get proportionally
+more of the slots.
+
+When the queue is full, a new request displaces the queued request with the
+latest finish tag on a lower-weight route; if there is none it is rejected.
+Queued requests that wait longer than LLM_QUEUE_TIMEOUT_SECONDS are dropped.
+Both surface as SchedulerBusy so handlers can tell the user the bot is busy.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from bot.config import Config
+from bot.logger import logger
+
+QUEUED_MESSAGE = "⏳ Lots of questions right now, you're #{position} in the queue. I'll answer here shortly."
+BUSY_MESSAGE = "Sorry, I'm too busy to answer right now. Please try again in a few minutes."
+# Routes where a person is waiting on the reply; the others run in the background
+INTERACTIVE_ROUTES = frozenset({"mention", "ask_denbot"})
+
+
+class SchedulerBusy(Exception):
+    """The request was not admitted: the queue was full, it was displaced, or it waited too long."""
+
+    def __init__(self, route: str, reason: str):
+        super().__init__(f"LLM scheduler busy ({reason}) for route '{route}'")
+        self.route = route
+        self.reason = reason
+
+    @property
+    def interactive(self) -> bool:
+        """Whether someone is waiting and should be told."""
+        return self.route in INTERACTIVE_ROUTES
+
+
+class _Waiter:
+    __slots__ = ("route", "guild_id", "weight", "tag", "future", "enqueued", "cancelled")
+
+    def __init__(self, route: str, guild_id: int, weight: float, tag: float):
+        self.route = route
+        self.guild_id = guild_id
+        self.weight = weight
+        self.tag = tag
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+        self.cancelled = False
+
+
+class LLMScheduler:
+    """Concurrency cap plus weighted fair queuing across guilds and routes."""
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float, weights: dict[str, float]):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.weights = weights
+        self.active = 0
+        self._queue: list[tuple[float, int, _Waiter]] = []
+        self._queued = 0
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._flow_tags: dict[tuple[int, str], float] = {}
+        self._stats: dict[str, dict[str, float]] = {}
+        self.max_depth_seen = 0
+
+    def _route_stats(self, route: str) -> dict[str, float]:
+        return self._stats.setdefault(route, {
+            "admitted": 0, "queued": 0, "rejected": 0, "displaced": 0, "timed_out": 0,
+            "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+        })
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self._queued,
+            "max_depth_seen": self.max_depth_seen,
+            "routes": {route: dict(values) for route, values in self._stats.items()},
+        }
+
+    def weight(self, route: str) -> float:
+        return max(0.01, float(self.weights.get(route, 1)))
+
+    def _admit(self, waiter_route: str, waited: float):
+        self.active += 1
+        stats = self._route_stats(waiter_route)
+        stats["admitted"] += 1
+        stats["wait_seconds"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+
+    def _position(self, waiter: _Waiter) -> int:
+        return 1 + sum(1 for tag, _, other in self._queue if not other.cancelled and tag < waiter.tag)
+
+    def _displace(self, weight: float) -> bool:
+        """Drop the queued request with the latest tag on a lower-weight route, if any."""
+        candidates = [entry for entry in self._queue if not entry[2].cancelled and entry[2].weight < weight]
+        if not candidates:
+            return False
+        _, _, victim = max(candidates, key=lambda entry: entry[0])
+        victim.cancelled = True
+        self._queued -= 1
+        self._route_stats(victim.route)["displaced"] += 1
+        victim.future.set_exception(SchedulerBusy(victim.route, "displaced"))
+        logger.warning("LLM queue full: displaced a queued '%s' request from guild %s", victim.route, victim.guild_id)
+        return True
+
+    def _dispatch(self):
+        while self.active < self.max_concurrency and self._queue:
+            _, _, waiter = heapq.heappop(self._queue)
+            if waiter.cancelled:
+                continue
+            self._queued -= 1
+            self._virtual_time = waiter.tag
+            self._admit(waiter.route, time.monotonic() - waiter.enqueued)
+            waiter.future.set_result(None)
+        if not self._queue:
+            # Idle queue: old tags carry no fairness information any more
+            self._flow_tags.clear()
+            self._virtual_time = 0.0
+
+    def _release(self):
+        self.active -= 1
+        self._dispatch()
+
+    async def _acquire(self, route: str, guild_id: int, on_queued: Optional[Callable[[int], Awaitable]]):
+        if self.active < self.max_concurrency and not self._queued:
+            self._admit(route, 0.0)
+            return
+
+        weight = self.weight(route)
+        stats = self._route_stats(route)
+        if self._queued >= self.max_queue and not self._displace(weight):
+            stats["rejected"] += 1
+            logger.warning("LLM queue full (%d queued): rejected '%s' request from guild %s", self._queued, route, guild_id)
+            raise SchedulerBusy(route, "queue_full")
+
+        flow = (guild_id, route)
+        tag = max(self._virtual_time, self._flow_tags.get(flow, 0.0)) + 1 / weight
+        self._flow_tags[flow] = tag
+        waiter = _Waiter(route, guild_id, weight, tag)
+        heapq.heappush(self._queue, (tag, next(self._sequence), waiter))
+        self._queued += 1
+        self.max_depth_seen = max(self.max_depth_seen, self._queued)
+        stats["queued"] += 1
+        position = self._position(waiter)
+        logger.info("LLM request queued: route '%s', guild %s, position %d of %d, %d active",
+                    route, guild_id, position, self._queued, self.active)
+        try:
+            if on_queued is not None:
+                try:
+                    await on_queued(position)
+                except Exception as e:
+                    logger.warning("Queued notification failed: %s", e)
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                # Admitted (or displaced) just as the timeout fired
+                waiter.future.result()
+                return
+            waiter.cancelled = True
+            self._queued -= 1
+            stats["timed_out"] += 1
+            logger.warning("LLM request on route '%s' timed out after %.0fs in the queue", route, self.queue_timeout)
+            raise SchedulerBusy(route, "timeout")
+        except asyncio.CancelledError:
+            if not waiter.future.done():
+                waiter.cancelled = True
+                self._queued -= 1
+            elif waiter.future.exception() is None:
+                self._release()  # Admitted, but the caller went away
+            raise
+
+    @asynccontextmanager
+    async def slot(self, route: str, guild_id: Optional[int] = None,
+                   on_queued: Optional[Callable[[int], Awaitable]] = None) -> AsyncIterator[None]:
+        """
+        Hold one of the provider slots for the duration of the block.
+
+        Args:
+            route: mention, ask_denbot, forum or auto_reply; picks the weight
+            guild_id: Guild the request came from (None for DMs)
+            on_queued: Awaited with the queue position if the request has to wait
+
+        Raises:
+            SchedulerBusy: If the request is rejected, displaced or times out
+        """
+        if self.max_concurrency <= 0:
+            yield
+            return
+        await self._acquire(route, guild_id or 0, on_queued)
+        try:
+            yield
+        finally:
+            self._release()
+
+
+SCHEDULER = LLMScheduler(
+    Config.LLM_MAX_CONCURRENCY,
+    Config.LLM_QUEUE_MAX_DEPTH,
+    Config.LLM_QUEUE_TIMEOUT_SECONDS,
+    Config.LLM_ROUTE_WEIGHTS,
+)
+
+
+def stats() -> dict:
+    """Active and queued requests, plus per-route admission, rejection and wait-time counters."""
+    return SCHEDULER.stats()
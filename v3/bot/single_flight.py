@@ -0,0 +1,82 @@
+"""
+Single-flight coalescing of identical LLM requests.
+
+Spam, cross-posts and users repeating "not working" often produce the same
+request within seconds. Requests are keyed by a hash of the provider, model,
+route, rendered system prompt and normalized conversation; while one is in
+flight, identical requests wait for its reply instead of making their own
+upstream call. Nothing is cached: once the leader finishes, the next request
+with that key goes upstream again.
+
+Normalization collapses whitespace. On message_format.AUTHOR_AGNOSTIC_ROUTES
+the router strips author names from the request before it is keyed and sent,
+so the same auto-reply trigger from different users is shared without the
+reply addressing the first author; other routes keep the name in both.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable
+from bot.logger import logger
+
+_inflight: dict[str, asyncio.Future] = {}
+_counters = {"leaders": 0, "coalesced": 0, "errors": 0}
+
+
+def stats() -> dict[str, int]:
+    """Upstream calls made (leaders) and requests served from another's call (coalesced)."""
+    return {**_counters, "in_flight": len(_inflight)}
+
+
+def _normalize_content(content: Any) -> Any:
+    if not isinstance(content, str):
+        return content
+    return " ".join(content.split())
+
+
+def request_key(provider: str, model: str, route: str, system_prompt: str, messages: list[dict]) -> str:
+    """Hash identifying requests that would get the same reply, over the messages exactly as sent."""
+    normalized = [[message.get("role"), _normalize_content(message.get("content"))] for message in messages]
+    payload = json.dumps([provider, model, route, system_prompt, normalized], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def run(key: str, call: Callable[[], Awaitable[str]]) -> tuple[str, bool]:
+    """
+    Await `call()`, or the in-flight call with the same key.
+
+    Returns:
+        Tuple of (reply, coalesced) where coalesced is True if another
+        request's call supplied the reply
+
+    Raises:
+        Whatever the leading call raised
+    """
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        _counters["coalesced"] += 1
+        logger.info("Coalesced identical LLM request %s with the one in flight", key[:12])
+        return await asyncio.shield(inflight), True
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    _counters["leaders"] += 1
+    try:
+        reply = await call()
+    except asyncio.CancelledError:
+        # Waiters get an error instead of hanging on a call nobody will finish
+        future.set_exception(RuntimeError("The identical request this one was waiting on was cancelled"))
+        future.exception()
+        raise
+    except Exception as e:
+        _counters["errors"] += 1
+        future.set_exception(e)
+        # Mark retrieved so an exception nobody else awaited is not logged
+        future.exception()
+        raise
+    else:
+        future.set_result(reply)
+        return reply, False
+    finally:
+        _inflight.pop(key, None)
@@ -0,0 +1,131 @@
+"""
+Progressive Discord replies for streamed LLM output.
+
+A StreamingReply posts the first message as soon as text arrives and then
+folds later deltas into debounced message edits, so at most one edit is in
+flight and edits are spaced by STREAM_EDIT_INTERVAL_SECONDS. That keeps a
+reply well inside Discord's per-channel edit rate limit no matter how fast
+tokens arrive. finish() always writes the complete final text.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+import discord
+from bot.config import Config
+from bot.logger import logger
+
+DISCORD_MESSAGE_LIMIT = 2000
+TOO_LONG_MESSAGE = "The generated message was too long to send."
+CURSOR = " ▌"
+
+
+def streaming_enabled() -> bool:
+    """Whether replies should be streamed for the configured provider."""
+    return Config.STREAM_RESPONSES and Config.LLM_PROVIDER.lower() in ("anthropic", "openai")
+
+
+class StreamingReply:
+    """A Discord message that grows as streamed text arrives."""
+
+    def __init__(self, send: Callable[[str], Awaitable[discord.Message]], edit_interval: Optional[float] = None):
+        """
+        Args:
+            send: Posts the first message and returns it (e.g. message.reply)
+            edit_interval: Minimum seconds between edits (defaults to STREAM_EDIT_INTERVAL_SECONDS)
+        """
+        self._send = send
+        self.edit_interval = edit_interval if edit_interval is not None else Config.STREAM_EDIT_INTERVAL_SECONDS
+        self.message: Optional[discord.Message] = None
+        self._text = ""
+        self._shown = ""
+        self._last_edit = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._finished = False
+
+    def _preview(self) -> str:
+        text = self._text.strip()
+        if len(text) + len(CURSOR) > DISCORD_MESSAGE_LIMIT:
+            # The final text decides whether the reply is too long; keep showing the start
+            text = text[:DISCORD_MESSAGE_LIMIT - len(CURSOR) - 1] + "…"
+        return text + CURSOR
+
+    @property
+    def content(self) -> str:
+        """The text the message shows now; the final reply once finish() returned."""
+        return self._shown
+
+    def push(self, delta: str):
+        """Append streamed text. Never waits on Discord; edits happen in a background task."""
+        if self._finished or not delta:
+            return
+        self._text += delta
+        if self._text.strip() and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def reset(self):
+        """
+        Drop text streamed so far in this round, e.g. when a tool_use block starts.
+
+        The visible message is left as is until the next round's text replaces it.
+        """
+        self._text = ""
+
+    async def _flush_loop(self):
+        # The first message goes out immediately, later edits are spaced by edit_interval
+        while not self._finished and self._text.strip() and self._preview() != self._shown:
+            if self._last_edit:
+                delay = self._last_edit + self.edit_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self._flush()
+
+    async def _flush(self):
+        async with self._lock:
+            content = self._preview()
+            if self._finished or not self._text.strip() or content == self._shown:
+                return
+            try:
+                if self.message is None:
+                    self.message = await self._send(content)
+                else:
+                    # edit() returns the updated message; the old object keeps the old content
+                    self.message = await self.message.edit(content=content)
+                self._shown = content
+            except discord.HTTPException as e:
+                # Back off; the loop retries with the latest text
+                logger.warning("Streaming edit failed (%s), backing off", e)
+                self.edit_interval = min(self.edit_interval * 2, 10)
+            self._last_edit = time.monotonic()
+
+    async def finish(self, text: str) -> Optional[discord.Message]:
+        """
+        Write the complete reply, posting it if nothing was streamed yet.
+
+        Replies over Discord's length limit are replaced with a notice, as
+        non-streamed replies are.
+
+        Returns:
+            The message as it finally appears, or None
+        """
+        self._finished = True
+        if self._flush_task is not None and not self._flush_task.done():
+            if self._lock.locked():
+                # A send or edit is in flight; cancelling it could post a duplicate message
+                await asyncio.gather(self._flush_task, return_exceptions=True)
+            else:
+                self._flush_task.cancel()
+        self._flush_task = None
+        async with self._lock:
+            if len(text) > DISCORD_MESSAGE_LIMIT:
+                logger.warning("Response too long (%d chars), notifying user", len(text))
+                text = TOO_LONG_MESSAGE
+            if not text.strip():
+                text = " "
+            if self.message is None:
+                self.message = await self._send(text)
+            elif text != self._shown:
+                self.message = await self.message.edit(content=text)
+            self._shown = text
+            return self.message
@@ -0,0 +1,146 @@
+"""Tool execution with executor offload and per-tool deadlines.
+
+Coroutine tools are awaited directly. Synchronous tools (SDK-backed web
+research, Exa, YouTube transcripts) run on a bounded, dedicated thread pool so
+they never stall the event loop. At most TOOL_MAX_CONCURRENCY calls run at
+once across all requests. Every call gets a deadline that also covers waiting
+for one of those slots; when it expires the model receives a structured
+timeout result instead of waiting forever.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from bot.config import Config
+from bot.logger import logger
+from bot import tracing
+from bot import metering
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=Config.TOOL_EXECUTOR_MAX_WORKERS,
+    thread_name_prefix="denbot-tool",
+)
+
+# tool_name -> {"calls", "timeouts", "queued_seconds", "exec_seconds"}
+_stats: dict[str, dict[str, float]] = {}
+# Shared by every request and both providers; created on first use
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_tool_timeout(tool_name: str) -> float:
+    """Deadline in seconds for a tool, honouring per-tool overrides."""
+    return float(Config.TOOL_TIMEOUTS.get(tool_name, Config.TOOL_TIMEOUT_SECONDS))
+
+
+def _tool_slots() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max(1, Config.TOOL_MAX_CONCURRENCY))
+    return _semaphore
+
+
+def get_stats() -> dict[str, dict[str, float]]:
+    """Return a copy of the per-tool timing counters."""
+    return {name: dict(values) for name, values in _stats.items()}
+
+
+def _record(tool_name: str, queued: float, executed: float, timed_out: bool):
+    stats = _stats.setdefault(tool_name, {"calls": 0, "timeouts": 0, "queued_seconds": 0.0, "exec_seconds": 0.0})
+    stats["calls"] += 1
+    stats["timeouts"] += int(timed_out)
+    stats["queued_seconds"] += queued
+    stats["exec_seconds"] += executed
+
+
+def timeout_result(tool_name: str, timeout: float) -> str:
+    """Structured result returned to the model when a tool misses its deadline."""
+    return json.dumps({
+        "error": "timeout",
+        "tool": tool_name,
+        "timeout_seconds": timeout,
+        "message": f"Tool '{tool_name}' did not finish within {timeout:g} seconds. Answer without it or try a simpler request.",
+    })
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a synchronous callable on the tool thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    # Executor threads do not inherit contextvars; carry the trace over explicitly
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def run_tool(tool_name: str, tool_function: Callable[[Any], Any], tool_input: Any) -> Any:
+    """
+    Execute a tool function under its deadline.
+
+    The call first waits for a shared tool slot; that wait and any wait for a
+    pool thread count as queued time and run under the same deadline.
+    Synchronous functions are submitted to the tool thread pool. A thread that
+    misses its deadline cannot be interrupted; it keeps its worker until it
+    returns, but the caller moves on immediately.
+
+    Args:
+        tool_name: Name used for deadlines, logging and metrics
+        tool_function: The tool implementation from claude.tools
+        tool_input: Input dict passed to the tool
+
+    Returns:
+        The tool result, or a JSON timeout result if the deadline expired
+    """
+    timeout = get_tool_timeout(tool_name)
+    submitted = time.monotonic()
+    started = None
+
+    def timed_call():
+        nonlocal started
+        started = time.monotonic()
+        return tool_function(tool_input)
+
+    async def call():
+        nonlocal started
+        async with _tool_slots():
+            if inspect.iscoroutinefunction(tool_function):
+                started = time.monotonic()
+                return await tool_function(tool_input)
+            return await run_blocking(timed_call)
+
+    timed_out = False
+    with tracing.span(f"tool.{tool_name}", timeout_seconds=timeout) as tool_span:
+        try:
+            return await asyncio.wait_for(call(), timeout=timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            logger.warning("Tool '%s' timed out after %.1fs", tool_name, timeout)
+            return timeout_result(tool_name, timeout)
+        finally:
+            finished = time.monotonic()
+            queued = (started if started is not None else finished) - submitted
+            executed = finished - started if started is not None else 0.0
+            _record(tool_name, queued, executed, timed_out)
+            metering.record_tool_call()
+            if tool_span is not None:
+                tool_span.set(queued_seconds=round(queued, 3), timed_out=timed_out)
+            logger.debug("Tool '%s' queued %.3fs, executed %.3fs", tool_name, queued, executed)
+
+
+async def gather_limited(awaitables) -> list[Any]:
+    """
+    Await several tool calls concurrently. run_tool holds each call to the
+    shared TOOL_MAX_CONCURRENCY limit within its own deadline.
+
+    Results come back in the same order as the input. A failing call yields its
+    exception in place of a result and never cancels its siblings.
+    """
+    return await asyncio.gather(*awaitables, return_exceptions=True)
+
+
+def shutdown():
+    """Stop accepting new work; running threads are left to finish."""
+    _executor.shutdown(wait=False, cancel_futures=True)
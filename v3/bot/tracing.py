@@ -0,0 +1,245 @@
+"""
+Lightweight per-request tracing.
+
+A trace is started for each Discord event that leads to an LLM reply. The
+active trace and span live in contextvars, so they follow the request through
+awaits, asyncio tasks and (via run_blocking) tool threads without being passed
+around. Spans record wall-clock timings and a few attributes; when the last
+span of a trace closes, the trace is exported as OTLP/JSON:
+- TRACE_EXPORTER=file appends one ExportTraceServiceRequest per line to TRACE_FILE
+- TRACE_EXPORTER=otlp posts it to an OTLP/HTTP collector at TRACE_OTLP_ENDPOINT
+
+Every log line written while a trace is active carries its trace ID.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import secrets
+import time
+from contextlib import contextmanager
+from typing import Any, Coroutine, Iterator, Optional
+from bot.config import Config
+from bot.logger import logger
+
+SERVICE_NAME = "denbot"
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+_background: set[asyncio.Task] = set()
+
+
+class Span:
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attributes: dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        """Attach attributes, e.g. token counts once a call returns."""
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_otlp(self) -> dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items() if value is not None],
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error else {"code": STATUS_OK},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: list[Span] = []
+        self.open_spans = 0
+
+    def summary(self) -> str:
+        return ", ".join(f"{span.name}={span.duration_ms:.0f}ms" for span in self.spans)
+
+
+def _otlp_attribute(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def current_trace_id() -> str:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else "-"
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds the active trace ID to every log record as %(trace_id)s."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id()
+        return True
+
+
+def _open(name: str, attributes: dict[str, Any]) -> Optional[Span]:
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    span = Span(trace, name, _current_span.get(), attributes)
+    trace.spans.append(span)
+    trace.open_spans += 1
+    return span
+
+
+def _close(span: Span, error: Optional[BaseException] = None):
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    span.trace.open_spans -= 1
+    if span.trace.open_spans == 0:
+        _finish(span.trace)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Time a block as a child of the current span. A no-op outside a trace.
+
+    Yields:
+        The Span (to add attributes) or None when no trace is active
+    """
+    opened = _open(name, attributes)
+    if opened is None:
+        yield None
+        return
+    token = _current_span.set(opened)
+    try:
+        yield opened
+    except BaseException as e:
+        _close(opened, e)
+        raise
+    else:
+        _close(opened)
+    finally:
+        _current_span.reset(token)
+
+
+@contextmanager
+def start_trace(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Start a new trace with `name` as its root span. Nested calls just open a span."""
+    if not Config.TRACING_ENABLED or _current_trace.get() is not None:
+        with span(name, **attributes) as opened:
+            yield opened
+        return
+    token = _current_trace.set(Trace())
+    try:
+        with span(name, **attributes) as root:
+            yield root
+    finally:
+        _current_trace.reset(token)
+
+
+def create_task(coro: Coroutine, name: str, **attributes) -> asyncio.Task:
+    """
+    Run `coro` in the background inside a span opened now.
+
+    The trace is not exported until the task finishes, so fire-and-forget
+    work such as memory retention still shows up in it.
+    """
+    opened = _open(name, attributes)
+
+    async def runner():
+        if opened is None:
+            return await coro
+        token = _current_span.set(opened)
+        try:
+            result = await coro
+        except BaseException as e:
+            _close(opened, e)
+            raise
+        else:
+            _close(opened)
+            return result
+        finally:
+            _current_span.reset(token)
+
+    task = asyncio.create_task(runner())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+def to_otlp(trace: Trace) -> dict[str, Any]:
+    """The trace as an OTLP/JSON ExportTraceServiceRequest."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "bot.tracing"},
+                "spans": [span.to_otlp() for span in trace.spans],
+            }],
+        }]
+    }
+
+
+def _write_file(payload: str):
+    directory = os.path.dirname(Config.TRACE_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(Config.TRACE_FILE, "a", encoding="utf-8") as file:
+        file.write(payload + "\n")
+
+
+async def _export(trace: Trace):
+    payload = json.dumps(to_otlp(trace), separators=(",", ":"))
+    exporter = Config.TRACE_EXPORTER.lower()
+    try:
+        if exporter == "file":
+            await asyncio.get_running_loop().run_in_executor(None, _write_file, payload)
+        elif exporter == "otlp":
+            from bot import http_client
+            async with http_client.get_session().post(
+                Config.TRACE_OTLP_ENDPOINT, data=payload, headers={"Content-Type": "application/json"}
+            ) as response:
+                if response.status >= 400:
+                    logger.warning("Trace export to %s failed with HTTP %d", Config.TRACE_OTLP_ENDPOINT, response.status)
+    except Exception as e:
+        logger.warning("Trace export failed: %s", e)
+
+
+def _finish(trace: Trace):
+    root = trace.spans[0]
+    logger.debug("Trace %s finished in %.0fms: %s", trace.trace_id, root.duration_ms, trace.summary())
+    if Config.TRACE_EXPORTER.lower() in ("file", "otlp"):
+        try:
+            task = asyncio.get_running_loop().create_task(_export(trace))
+        except RuntimeError:
+            return
+        _background.add(task)
+        task.add_done_callback(_background.discard)
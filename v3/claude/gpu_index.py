@@ -0,0 +1,286 @@
+"""
+Prebuilt in-memory GPU name index for threedmark_gpu_performance_lookup.
+
+The GPU list is parsed once and every name is pre-normalized, pre-tokenized and
+has its VRAM size and tie-break flags extracted up front. A token inverted index
+prunes candidates before any fuzzy scoring, and the surviving candidates for a
+whole batch of queries are scored with one rapidfuzz cdist call plus vectorized
+tie-break rules. Matching reproduces
+process.extractOne(query, names, scorer=custom_fuzzy_scorer) exactly, including
+thefuzz's default preprocessing and rapidfuzz's first-best/early-exit scan.
+
+The index can be saved as a compact gzip artifact:
+    python -m claude.gpu_index
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from typing import Any, Optional
+import numpy as np
+from rapidfuzz import fuzz as rapid_fuzz
+from rapidfuzz import process
+from thefuzz import utils
+from bot.logger import logger
+
+GPU_LIST_PATH = "claude/gpu_id_list.json"
+INDEX_PATH = "claude/gpu_index.json.gz"
+INDEX_VERSION = 1
+
+VRAM_PATTERN = re.compile(r'\b(\d+)\s*gb\b')
+VRAM_PATTERN_IGNORECASE = re.compile(r'\b(\d+)\s*gb\b', re.IGNORECASE)
+GEFORCE_EXCLUDES = ['(', ')', 'notebook', 'mobile', 'ti', 'super']
+
+# A query/name pair with no shared tokens can only round up to a base score of
+# 100 when their combined length reaches this many characters.
+DISJOINT_SAFE_LENGTH = 200
+
+
+def _ascii_process(text: str) -> str:
+    """The preprocessing thefuzz's fuzz.token_set_ratio applies to both inputs."""
+    return utils.full_process(text, force_ascii=True)
+
+
+class QueryFeatures:
+    """Query-side values that custom_fuzzy_scorer recomputes for every choice."""
+
+    def __init__(self, raw_query: str):
+        # extractOne runs thefuzz's default processor on the query first
+        processed = utils.full_process(raw_query)
+        vram_match = VRAM_PATTERN.search(processed.lower())
+        self.vram: Optional[str] = vram_match.group(1) if vram_match else None
+        self.clean = VRAM_PATTERN_IGNORECASE.sub('', processed).strip()
+        self.clean_lower = self.clean.lower()
+        self.word_count = len(self.clean.split())
+        self.ascii_clean = _ascii_process(self.clean)
+        self.tokens = set(self.ascii_clean.split())
+
+
+class GpuIndex:
+    """Pre-normalized GPU names plus a token -> position inverted index."""
+
+    def __init__(self, entries: list[dict[str, Any]]):
+        self.names: list[str] = [gpu.get("name") for gpu in entries]
+        # Duplicate names resolve to the last id, matching the original dict build
+        self.name_to_id: dict[str, Any] = {gpu.get("name"): gpu.get("id") for gpu in entries}
+
+        self.processed: list[str] = []
+        self.ascii_processed: list[str] = []
+        self.word_counts: list[int] = []
+        self.clean_geforce: list[bool] = []
+        self.parenthetical: list[bool] = []
+        self.vram: list[Optional[str]] = []
+        self.inverted: dict[str, list[int]] = {}
+
+        for position, name in enumerate(self.names):
+            choice = utils.full_process(name)
+            choice_lower = choice.lower()
+            vram_match = VRAM_PATTERN.search(choice_lower)
+
+            self.processed.append(choice)
+            self.ascii_processed.append(_ascii_process(choice))
+            self.word_counts.append(len(choice.split()))
+            self.clean_geforce.append('geforce' in choice_lower and not any(x in choice_lower for x in GEFORCE_EXCLUDES))
+            self.parenthetical.append('(' in choice_lower or ')' in choice_lower)
+            self.vram.append(vram_match.group(1) if vram_match else None)
+            for token in set(self.ascii_processed[-1].split()):
+                self.inverted.setdefault(token, []).append(position)
+
+        self._build_arrays()
+
+    def _build_arrays(self):
+        """Per-candidate feature arrays for the vectorized tie-break rules."""
+        self.max_name_length = max((len(choice) for choice in self.processed), default=0)
+        self.all_positions = np.arange(len(self.names))
+        self._word_counts = np.array(self.word_counts, dtype=np.int64)
+        self._clean_geforce = np.array(self.clean_geforce, dtype=bool)
+        self._parenthetical = np.array(self.parenthetical, dtype=bool)
+        self._vram = np.array([vram or "" for vram in self.vram], dtype=object)
+
+    def score_matrix(self, queries: list[QueryFeatures], positions: np.ndarray) -> np.ndarray:
+        """
+        Score every query against the candidates at `positions` in one batch.
+
+        Base token_set_ratio scores come from a single rapidfuzz cdist call; the
+        custom_fuzzy_scorer tie-break rules are then applied as array operations,
+        in the same order, so every value is bit-identical to the scalar scorer.
+
+        Returns:
+            Array of shape (len(queries), len(positions))
+        """
+        choices = [self.ascii_processed[position] for position in positions]
+        base = process.cdist([query.ascii_clean for query in queries], choices,
+                             scorer=rapid_fuzz.token_set_ratio, dtype=np.float64)
+        # thefuzz rounds to an int; np.round also rounds half to even
+        base = np.round(base)
+        scores = base.copy()
+
+        for row, query in enumerate(queries):
+            hits = np.flatnonzero(base[row] == 100)
+            if not hits.size:
+                continue
+            columns = positions[hits]
+            word_counts = self._word_counts[columns]
+            substring = np.fromiter((query.clean_lower in self.processed[column].lower() for column in columns),
+                                    dtype=bool, count=len(columns))
+
+            exact = 100 - (word_counts - 4) * 0.5
+            exact = np.where(self._clean_geforce[columns], exact + 0.1,
+                             np.where(self._parenthetical[columns], exact - 0.1, exact))
+            if query.vram:
+                choice_vram = self._vram[columns]
+                has_vram = choice_vram != ""
+                exact = np.where(has_vram & (choice_vram != query.vram), exact - 5,
+                                 np.where(has_vram & (choice_vram == query.vram), exact + 2, exact))
+
+            loose = np.maximum(0, 100 - (word_counts - query.word_count))
+            scores[row, hits] = np.where(substring, exact, loose)
+
+        return scores
+
+    @staticmethod
+    def _pick(row: np.ndarray) -> Optional[int]:
+        # rapidfuzz extractOne semantics: first strictly-best wins, stop at exactly 100
+        exact_hits = np.flatnonzero(row == 100)
+        window = row[:exact_hits[0] + 1] if exact_hits.size else row
+        if not window.size:
+            return None
+        best = int(np.argmax(window))
+        return best if window[best] >= 0 else None
+
+    def candidates(self, query: QueryFeatures) -> set[int]:
+        """Positions sharing at least one token with the query."""
+        positions = set()
+        for token in query.tokens:
+            positions.update(self.inverted.get(token, ()))
+        return positions
+
+    def _can_prune(self, query: QueryFeatures) -> bool:
+        return bool(query.tokens) and len(query.clean) + self.max_name_length < DISJOINT_SAFE_LENGTH
+
+    def best_matches(self, raw_queries: list[str]) -> list[Optional[tuple[str, float, Any]]]:
+        """
+        Find the best GPU for each free-text query using batched scoring.
+
+        Queries are first scored together against the union of their candidate
+        sets. Names without a shared token score at most 99, so a pruned winner
+        above that is guaranteed to be the full-scan winner. Any query without
+        such a winner is rescored against every name in a second batch.
+
+        Returns:
+            One (gpu_name, score, gpu_id) tuple per query, or None if nothing matched
+        """
+        queries = [QueryFeatures(query) if query is not None else None for query in raw_queries]
+        winners: list[Optional[tuple[int, float]]] = [None] * len(queries)
+
+        prunable = [row for row, query in enumerate(queries) if query is not None and self._can_prune(query)]
+        union = set()
+        for row in prunable:
+            union |= self.candidates(queries[row])
+        if union:
+            positions = np.array(sorted(union), dtype=np.int64)
+            scores = self.score_matrix([queries[row] for row in prunable], positions)
+            for offset, row in enumerate(prunable):
+                best = self._pick(scores[offset])
+                if best is not None and scores[offset, best] > 99:
+                    winners[row] = (int(positions[best]), float(scores[offset, best]))
+
+        fallback = [row for row, query in enumerate(queries) if query is not None and winners[row] is None]
+        if fallback:
+            scores = self.score_matrix([queries[row] for row in fallback], self.all_positions)
+            for offset, row in enumerate(fallback):
+                best = self._pick(scores[offset])
+                if best is not None:
+                    winners[row] = (best, float(scores[offset, best]))
+
+        results = []
+        for winner in winners:
+            if winner is None:
+                results.append(None)
+                continue
+            name = self.names[winner[0]]
+            results.append((name, winner[1], self.name_to_id[name]))
+        return results
+
+    def best_match(self, raw_query: str) -> Optional[tuple[str, float, Any]]:
+        """
+        Find the best GPU for a free-text query.
+
+        Returns:
+            Tuple of (gpu_name, score, gpu_id), or None if nothing matched
+        """
+        return self.best_matches([raw_query])[0]
+
+    def to_payload(self, source_digest: str = "") -> dict[str, Any]:
+        return {
+            "version": INDEX_VERSION,
+            "source_sha256": source_digest,
+            "ids": [self.name_to_id[name] for name in self.names],
+            "names": self.names,
+            "processed": self.processed,
+            "ascii_processed": self.ascii_processed,
+            "word_counts": self.word_counts,
+            "clean_geforce": self.clean_geforce,
+            "parenthetical": self.parenthetical,
+            "vram": self.vram,
+            "inverted": self.inverted,
+        }
+
+    @classmethod
+    def from_payload(cls, payload: dict[str, Any]) -> "GpuIndex":
+        """Restore an index from a saved artifact without re-normalizing names."""
+        index = cls.__new__(cls)
+        index.names = payload["names"]
+        index.name_to_id = {name: gpu_id for name, gpu_id in zip(payload["names"], payload["ids"])}
+        index.processed = payload["processed"]
+        index.ascii_processed = payload["ascii_processed"]
+        index.word_counts = payload["word_counts"]
+        index.clean_geforce = payload["clean_geforce"]
+        index.parenthetical = payload["parenthetical"]
+        index.vram = payload["vram"]
+        index.inverted = payload["inverted"]
+        index._build_arrays()
+        return index
+
+    def save(self, path: str = INDEX_PATH, source_digest: str = ""):
+        """Write the index as a compact gzip JSON artifact."""
+        with gzip.open(path, "wt", encoding="utf-8") as file:
+            json.dump(self.to_payload(source_digest), file, separators=(",", ":"))
+
+
+def _source_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def load_index(source_path: str = GPU_LIST_PATH, index_path: str = INDEX_PATH) -> GpuIndex:
+    """Load the prebuilt artifact if it matches the source list, else build from source."""
+    with open(source_path, "rb") as file:
+        source = file.read()
+    digest = _source_digest(source)
+
+    if os.path.exists(index_path):
+        try:
+            with gzip.open(index_path, "rt", encoding="utf-8") as file:
+                payload = json.load(file)
+            if payload.get("version") == INDEX_VERSION and payload.get("source_sha256") == digest:
+                index = GpuIndex.from_payload(payload)
+                logger.info("Loaded prebuilt GPU index with %d entries", len(index.names))
+                return index
+            logger.info("Prebuilt GPU index is stale, rebuilding from %s", source_path)
+        except Exception as e:
+            logger.warning("Failed to load prebuilt GPU index: %s", e)
+
+    index = GpuIndex(json.loads(source))
+    logger.info("Built GPU index with %d entries (%d tokens)", len(index.names), len(index.inverted))
+    return index
+
+
+GPU_INDEX = load_index()
+
+
+if __name__ == "__main__":
+    with open(GPU_LIST_PATH, "rb") as source_file:
+        source_bytes = source_file.read()
+    GpuIndex(json.loads(source_bytes)).save(INDEX_PATH, _source_digest(source_bytes))
+    print(f"Wrote {INDEX_PATH}")
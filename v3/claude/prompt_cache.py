@@ -0,0 +1,118 @@
+"""
+Prompt caching plan for the Claude tool loop.
+
+Anthropic caches the request prefix up to each cache_control breakpoint (at
+most four per request). The tool loop re-sends the same tools, system prompt
+and a conversation that only grows, so breakpoints go on:
+- the last tool definition (caches the whole tools array)
+- the system prompt
+- the last block of the newest conversation turn, so the next iteration
+  reads everything sent so far from cache
+- the previous iteration's turn, which guarantees a read of the prefix
+  written last time even when new tool results add many blocks
+
+Usage from every call is accumulated so each request can report how much
+of its input was served from cache.
+"""
+
+from typing import Any, Optional
+from bot.logger import logger
+
+EPHEMERAL = {"type": "ephemeral"}
+MAX_BREAKPOINTS = 4
+
+_totals = {"calls": 0, "input_tokens": 0, "cache_creation_input_tokens": 0,
+           "cache_read_input_tokens": 0, "output_tokens": 0}
+
+
+def cached_tools(tools: list[dict]) -> list[dict]:
+    """Copy of `tools` with a breakpoint after the last definition."""
+    if not tools:
+        return tools
+    return tools[:-1] + [{**tools[-1], "cache_control": EPHEMERAL}]
+
+
+def cached_system(system_prompt: str) -> list[dict]:
+    return [{"type": "text", "text": system_prompt, "cache_control": EPHEMERAL}]
+
+
+def _as_block(block: Any) -> dict:
+    if isinstance(block, dict):
+        return dict(block)
+    # SDK content blocks from a previous response
+    return block.model_dump(exclude_none=True)
+
+
+def _mark(message: dict) -> dict:
+    content = message["content"]
+    if isinstance(content, str):
+        if not content.strip():
+            # Whitespace-only text blocks are rejected; leave this turn unmarked
+            return message
+        blocks = [{"type": "text", "text": content}]
+    else:
+        blocks = list(content)
+    if not blocks:
+        return message
+    blocks[-1] = {**_as_block(blocks[-1]), "cache_control": EPHEMERAL}
+    return {**message, "content": blocks}
+
+
+class CachePlanner:
+    """Places conversation breakpoints for one request's tool loop."""
+
+    # Tools and system prompt use two of the four breakpoints
+    CONVERSATION_BREAKPOINTS = MAX_BREAKPOINTS - 2
+
+    def __init__(self):
+        self._previous: Optional[int] = None
+        self.usage = {key: 0 for key in _totals}
+
+    def plan(self, conversation: list[dict]) -> list[dict]:
+        """
+        Return a copy of `conversation` with breakpoints on the newest turn and
+        the turn marked by the previous call. The input is not modified.
+        """
+        if not conversation:
+            return conversation
+        positions = [len(conversation) - 1]
+        if self._previous is not None and self._previous < positions[0]:
+            positions.append(self._previous)
+        self._previous = positions[0]
+
+        planned = list(conversation)
+        for position in positions[:self.CONVERSATION_BREAKPOINTS]:
+            planned[position] = _mark(planned[position])
+        return planned
+
+    def record(self, usage: Any):
+        """Add one API call's usage to this request and the process totals."""
+        if usage is None:
+            return
+        self.usage["calls"] += 1
+        _totals["calls"] += 1
+        for key in ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "output_tokens"):
+            value = getattr(usage, key, None) or 0
+            self.usage[key] += value
+            _totals[key] += value
+
+    def hit_ratio(self) -> float:
+        return hit_ratio(self.usage)
+
+    def log(self):
+        logger.info(
+            "Prompt cache: %d call(s), %d read, %d written, %d uncached input tokens (hit ratio %.0f%%)",
+            self.usage["calls"], self.usage["cache_read_input_tokens"], self.usage["cache_creation_input_tokens"],
+            self.usage["input_tokens"], self.hit_ratio() * 100,
+        )
+
+
+def hit_ratio(usage: dict) -> float:
+    """Share of input tokens served from cache."""
+    total = usage["input_tokens"] + usage["cache_creation_input_tokens"] + usage["cache_read_input_tokens"]
+    return usage["cache_read_input_tokens"] / total if total else 0.0
+
+
+def stats() -> dict[str, Any]:
+    """Process-wide prompt cache usage since startup."""
+    return {**_totals, "hit_ratio": hit_ratio(_totals)}
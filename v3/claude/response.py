@@ -4,8 +4,14 @@ from typing import Optional
 from bot.config import Config
 from anthropic import AsyncAnthropic
 from claude import tools
+from bot import tool_runner
+from bot.streaming import StreamingReply
+from claude.prompt_cache import CachePlanner, cached_system, cached_tools
+from bot.context_budget import ESTIMATOR, count_images
+from bot.agent_loop import FINALIZE_PROMPT, LIMIT_MESSAGE, LoopController
+from bot import tracing
+from bot import metering
 import json
-import inspect
 
 claudeClient = AsyncAnthropic(
     api_key = Config.ANTHROPIC_API_KEY
@@ -15,6 +21,7 @@ try:
     with open("claude/tools.json") as file:
         TOOLS = json.load(file)
     logger.info("Loaded tools.json with %d tool definitions", len(TOOLS))
+    CACHED_TOOLS = cached_tools(TOOLS)
 except Exception as e:
     logger.error("Failed to load tools.json: %s", e)
     raise
@@ -33,9 +40,7 @@ async def execute_tool(tool_name, tool_input):
         
         if hasattr(tools, tool_name):
             tool_function = getattr(tools, tool_name)
-            result = tool_function(tool_input)
-            if inspect.isawaitable(result):
-                result = await result
+            result = await tool_runner.run_tool(tool_name, tool_function, tool_input)
             result_str = str(result)
             logger.info("Tool '%s' returned result (%d chars)", tool_name, len(result_str))
             logger.debug("Full tool result for '%s': %s", tool_name, result_str)
@@ -48,10 +53,40 @@ async def execute_tool(tool_name, tool_input):
         return f"Error calling tool '{tool_name}': {e}"
 
 
+async def _create_message(request: dict, stream: Optional[StreamingReply]):
+    """
+    Call the Messages API, streaming text deltas into `stream` when given.
+
+    Text streamed before a tool_use block is dropped from the Discord message
+    so that only the final round's answer is shown.
+    """
+    if stream is None:
+        return await claudeClient.messages.create(**request)
+
+    async with claudeClient.messages.stream(**request) as message_stream:
+        async for event in message_stream:
+            if event.type == "text":
+                stream.push(event.text)
+            elif event.type == "content_block_start" and event.content_block.type == "tool_use":
+                logger.debug("tool_use block started mid-stream, discarding streamed text")
+                stream.reset()
+        return await message_stream.get_final_message()
+
+
+def _with_finalize_prompt(conversation: list) -> list:
+    """Copy of the conversation with the finalize instruction added to the last user turn."""
+    last = conversation[-1]
+    content = last["content"]
+    blocks = [{"type": "text", "text": content}] if isinstance(content, str) else list(content)
+    blocks.append({"type": "text", "text": FINALIZE_PROMPT})
+    return conversation[:-1] + [{**last, "content": blocks}]
+
+
 async def generate_claude_response(
     messages: list,
     system_prompt: str,
-    channel: Optional[discord.abc.Messageable] = None
+    channel: Optional[discord.abc.Messageable] = None,
+    stream: Optional[StreamingReply] = None
 ) -> str:
     """
     Generic function to generate a response from Claude with tool support.
@@ -59,44 +94,80 @@ async def generate_claude_response(
     Args:
         messages: List of message dicts with 'role' and 'content' keys
         system_prompt: The system prompt to use
+        stream: Optional StreamingReply that receives text as it is generated
 
     Returns:
         Tuple of (response_text, status_message)
     """
     conversation: list = messages.copy()
+    cache_planner = CachePlanner()
+    estimated_input = ESTIMATOR.request(system_prompt, conversation, TOOLS)
+    controller = LoopController("anthropic")
     try:
         while True:
             logger.debug("Calling Claude API: model=%s, conversation_length=%d", Config.MODEL_NAME, len(conversation))
 
-            claudeResponse = await claudeClient.messages.create(
-                    model=Config.MODEL_NAME,
-                    max_tokens=Config.MAX_TOKENS,
-                    system=[{"type": "text",
-                            "text": system_prompt,
-                            "cache_control": {"type": "ephemeral"}}],
-                    messages=conversation,
-                    tools=TOOLS
-                )
+            request = dict(
+                model=Config.MODEL_NAME,
+                max_tokens=Config.MAX_TOKENS,
+                system=cached_system(system_prompt),
+                messages=cache_planner.plan(conversation),
+                tools=CACHED_TOOLS
+            )
+            if controller.should_finalize():
+                # Tools stay defined (the history has tool blocks) but the model may not call them
+                request["messages"] = cache_planner.plan(_with_finalize_prompt(conversation))
+                request["tool_choice"] = {"type": "none"}
 
-            if claudeResponse.stop_reason == "tool_use":
+            with tracing.span("llm.call", model=Config.MODEL_NAME, round=controller.rounds,
+                              finalize=controller.finalizing, streamed=stream is not None) as call_span:
+                claudeResponse = await _create_message(request, stream)
+                usage = getattr(claudeResponse, "usage", None)
+                if call_span is not None and usage is not None:
+                    call_span.set(input_tokens=usage.input_tokens, output_tokens=usage.output_tokens,
+                                  stop_reason=claudeResponse.stop_reason)
+            cache_planner.record(usage)
+            if usage is not None:
+                cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+                cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+                controller.record(usage.input_tokens, usage.output_tokens, cache_write, cache_read)
+                metering.record_call("anthropic", Config.MODEL_NAME, usage.input_tokens, usage.output_tokens,
+                                     cache_write, cache_read)
+            if cache_planner.usage["calls"] == 1:
+                actual_input = (cache_planner.usage["input_tokens"] + cache_planner.usage["cache_creation_input_tokens"]
+                                + cache_planner.usage["cache_read_input_tokens"])
+                ESTIMATOR.calibrate(estimated_input, actual_input, count_images(conversation) * ESTIMATOR.image_tokens())
+
+            if claudeResponse.stop_reason == "tool_use" and not controller.finalizing:
                 logger.info("Detected tool call(s)")
 
                 conversation.append({"role": "assistant", "content": claudeResponse.content})
 
-                tool_content = []
+                tool_uses = []
                 for content in claudeResponse.content:
                     logger.debug(f"Found content: {content.type}")
                     if content.type != "tool_use":
                         logger.debug(f"not tool, skipping")
                         continue
                     logger.info(f"Found tool: {content.name} with input: {content.input}")
+                    tool_uses.append(content)
 
-                    tool_result = await execute_tool(content.name, content.input)
+                # Run every tool call of this turn concurrently; results keep tool_use order
+                tool_results = await tool_runner.gather_limited(
+                    execute_tool(content.name, content.input) for content in tool_uses
+                )
+
+                tool_content = []
+                for content, tool_result in zip(tool_uses, tool_results):
+                    if isinstance(tool_result, BaseException):
+                        logger.error(f"Error calling tool '{content.name}': {tool_result}")
+                        tool_result = f"Error calling tool '{content.name}': {tool_result}"
                     tool_content.append({"type": "tool_result",
                                          "tool_use_id": content.id,
                                          "content": tool_result})
 
                 conversation.append({"role": "user", "content": tool_content})
+                controller.tool_round_done()
 
             else:
                 # No tool calls, return final response
@@ -104,7 +175,11 @@ async def generate_claude_response(
                 for content in claudeResponse.content:
                     if content.type == "text":
                         final_text = content.text
+                if controller.finalizing and not final_text.strip():
+                    final_text = LIMIT_MESSAGE
                 logger.info(f"Generated: \n{final_text}")
+                logger.info("Claude request finished: %s", controller.summary())
+                cache_planner.log()
                 return final_text
     except Exception as e:
         logger.error(f"Error in generate_claude_response: {e}", exc_info=True)
@@ -1,16 +1,22 @@
-import requests
 import os
 import logging
 from thefuzz import fuzz
-import json
-from thefuzz import process
 from anthropic import Anthropic
 from typing import Any
 from datetime import datetime
 import re
+import asyncio
+import unicodedata
+from urllib.parse import quote
+import aiohttp
 from bot.logger import logger
 from bot.config import Config
 from bot.memory import hindsight
+from bot import http_client
+from bot import tool_runner
+from bot.cache import CachedError, TieredCache
+from claude.gpu_index import GPU_INDEX
+from claude.transcript_excerpt import excerpt_transcript
 from youtube_transcript_api import YouTubeTranscriptApi
 
 try:
@@ -18,12 +24,31 @@ try:
 except ImportError:
     Exa = None
 
+_exa_client = None
+
 def _get_exa_client():
-    if Exa is None:
-        return None
-    if not Config.EXA_API_KEY:
+    """Return the shared Exa client, creating it on first use."""
+    global _exa_client
+    if Exa is None or not Config.EXA_API_KEY:
         return None
-    return Exa(api_key=Config.EXA_API_KEY)
+    if _exa_client is None:
+        _exa_client = Exa(api_key=Config.EXA_API_KEY)
+    return _exa_client
+
+def _exa_unavailable_message():
+    if Exa is None:
+        return "Error: exa-py is not installed."
+    return "Error: EXA_API_KEY is not configured."
+
+_exa_search_cache = TieredCache(
+    "exa_search",
+    ttl=Config.EXA_SEARCH_CACHE_TTL_SECONDS,
+    negative_ttl=Config.EXA_CACHE_NEGATIVE_TTL_SECONDS,
+)
+_exa_contents_cache = TieredCache(
+    "exa_contents",
+    ttl=Config.EXA_CONTENTS_CACHE_TTL_SECONDS,
+)
 
 def _format_exa_result(result, include_text=False):
     lines = []
@@ -50,9 +75,15 @@ def _format_exa_result(result, include_text=False):
 
     return "\n".join(lines)
 
-def exa_web_search(input):
+def _exa_search_ttl(formatted_results):
+    # Empty result sets are often transient, so retry them sooner
+    return Config.EXA_SEARCH_CACHE_TTL_SECONDS if formatted_results else Config.EXA_EMPTY_CACHE_TTL_SECONDS
+
+async def exa_web_search(input):
     """
     Performs web search using Exa for local LLM tool calls.
+
+    Formatted results are cached by (query, num_results, highlight size).
     """
     try:
         search_query = input.get("search_query")
@@ -61,40 +92,92 @@ def exa_web_search(input):
 
         client = _get_exa_client()
         if client is None:
-            if Exa is None:
-                return "Error: exa-py is not installed."
-            return "Error: EXA_API_KEY is not configured."
-
-        logger.info(f"Performing Exa web search for query: {search_query}")
-        response = client.search(
-            search_query,
-            type="auto",
-            num_results=Config.EXA_SEARCH_NUM_RESULTS,
-            contents={
-                "highlights": {
-                    "query": search_query,
-                    "max_characters": Config.EXA_SEARCH_HIGHLIGHT_MAX_CHARS,
+            return _exa_unavailable_message()
+
+        num_results = Config.EXA_SEARCH_NUM_RESULTS
+        highlight_chars = Config.EXA_SEARCH_HIGHLIGHT_MAX_CHARS
+
+        async def fetch():
+            logger.info(f"Performing Exa web search for query: {search_query}")
+            response = await tool_runner.run_blocking(
+                client.search,
+                search_query,
+                type="auto",
+                num_results=num_results,
+                contents={
+                    "highlights": {
+                        "query": search_query,
+                        "max_characters": highlight_chars,
+                    }
                 }
-            }
-        )
+            )
+            results = getattr(response, "results", None) or []
+            return [_format_exa_result(result) for result in results]
 
-        results = getattr(response, "results", None) or []
-        if not results:
+        formatted_results = await _exa_search_cache.get_or_fetch(
+            (search_query.strip(), num_results, highlight_chars), fetch, ttl_for=_exa_search_ttl
+        )
+        if not formatted_results:
             return "No results found for the search query."
 
-        formatted_results = [
-            f"Result {index}:\n{_format_exa_result(result)}"
-            for index, result in enumerate(results, start=1)
-        ]
-        return "\n\n".join(formatted_results)
+        return "\n\n".join(
+            f"Result {index}:\n{formatted}"
+            for index, formatted in enumerate(formatted_results, start=1)
+        )
 
+    except CachedError as e:
+        return f"Error performing Exa web search: {str(e)}"
     except Exception as e:
         logger.error(f"Error performing Exa web search: {e}")
         return f"Error performing Exa web search: {str(e)}"
 
-def exa_get_contents(input):
+def _exa_contents_key(url):
+    return (url, Config.EXA_CONTENT_MAX_CHARS, Config.EXA_SEARCH_HIGHLIGHT_MAX_CHARS)
+
+async def _fetch_exa_contents(client, urls):
+    """
+    Fetch and cache contents for URLs not already cached, in one upstream request.
+
+    Returns:
+        dict mapping each requested URL Exa returned content for to its formatted result
+    """
+    logger.info(f"Fetching Exa contents for {len(urls)} URL(s)")
+    _exa_contents_cache.record_fetch()
+    response = await tool_runner.run_blocking(
+        client.get_contents,
+        urls,
+        text={"max_characters": Config.EXA_CONTENT_MAX_CHARS},
+        highlights={"max_characters": Config.EXA_SEARCH_HIGHLIGHT_MAX_CHARS}
+    )
+
+    # Exa may normalize URLs or drop failed ones, so match on url/id before falling back to order
+    results = getattr(response, "results", None) or []
+    by_url = {}
+    for result in results:
+        for attribute in ("url", "id"):
+            value = getattr(result, attribute, None)
+            if isinstance(value, str):
+                by_url.setdefault(value.rstrip("/"), result)
+    if len(results) == len(urls):
+        for url, result in zip(urls, results):
+            by_url.setdefault(url.rstrip("/"), result)
+
+    fetched = {}
+    for url in urls:
+        result = by_url.get(url.rstrip("/"))
+        if result is None:
+            continue
+        fetched[url] = _format_exa_result(result, include_text=True)
+        _exa_contents_cache.set(_exa_contents_key(url), fetched[url])
+    return fetched
+
+async def exa_get_contents(input):
     """
     Fetches content for one or more URLs using Exa for local LLM tool calls.
+
+    Repeated URLs are collapsed, cached URLs are served locally, and only the
+    remainder is sent upstream in a single batch. Results keep the order in
+    which the URLs were first given.
     """
     try:
         urls = input.get("urls")
@@ -104,41 +187,76 @@ def exa_get_contents(input):
         if not urls or not isinstance(urls, list):
             return "Error: urls must be a URL string or a list of URL strings."
 
-        clean_urls = [url for url in urls if isinstance(url, str) and url.strip()]
+        clean_urls = list(dict.fromkeys(url.strip() for url in urls if isinstance(url, str) and url.strip()))
         if not clean_urls:
             return "Error: no valid URLs provided."
 
         client = _get_exa_client()
         if client is None:
-            if Exa is None:
-                return "Error: exa-py is not installed."
-            return "Error: EXA_API_KEY is not configured."
-
-        logger.info(f"Fetching Exa contents for {len(clean_urls)} URL(s)")
-        response = client.get_contents(
-            clean_urls,
-            text={"max_characters": Config.EXA_CONTENT_MAX_CHARS},
-            highlights={"max_characters": Config.EXA_SEARCH_HIGHLIGHT_MAX_CHARS}
-        )
-
-        results = getattr(response, "results", None) or []
-        if not results:
+            return _exa_unavailable_message()
+
+        contents = {}
+        for url in clean_urls:
+            cached = _exa_contents_cache.get(_exa_contents_key(url))
+            if cached is not None:
+                contents[url] = cached
+        missing = [url for url in clean_urls if url not in contents]
+        if missing:
+            contents.update(await _fetch_exa_contents(client, missing))
+        logger.debug(f"Exa contents: {len(clean_urls) - len(missing)} cached, {len(missing)} fetched")
+
+        formatted_results = [contents[url] for url in clean_urls if url in contents]
+        if not formatted_results:
             return "No content found for the provided URL(s)."
 
-        formatted_results = [
-            f"URL Content {index}:\n{_format_exa_result(result, include_text=True)}"
-            for index, result in enumerate(results, start=1)
-        ]
-        return "\n\n".join(formatted_results)
+        return "\n\n".join(
+            f"URL Content {index}:\n{formatted}"
+            for index, formatted in enumerate(formatted_results, start=1)
+        )
 
     except Exception as e:
         logger.error(f"Error fetching Exa contents: {e}")
         return f"Error fetching Exa contents: {str(e)}"
 
-def youtube_context(input):
+_youtube_cache = TieredCache(
+    "youtube",
+    ttl=Config.YOUTUBE_CACHE_TTL_SECONDS,
+    negative_ttl=Config.YOUTUBE_CACHE_NEGATIVE_TTL_SECONDS,
+    max_entries=Config.YOUTUBE_CACHE_MEMORY_ENTRIES,
+    compress=True,
+    max_disk_bytes=Config.YOUTUBE_CACHE_MAX_MB * 1024 * 1024,
+)
+
+async def _fetch_youtube_title(video_id):
+    """Fetch a video title via YouTube oEmbed (no API key required). Returns None on failure."""
+    try:
+        oembed_url = "https://www.youtube.com/oembed"
+        oembed_params = {"url": f"https://www.youtube.com/watch?v={video_id}", "format": "json"}
+        async with http_client.get_session().get(oembed_url, params=oembed_params, timeout=aiohttp.ClientTimeout(total=5)) as oembed_response:
+            if not oembed_response.ok:
+                return None
+            title = (await oembed_response.json()).get("title")
+        logger.info(f"Found video title: {title}")
+        return title
+    except Exception as e:
+        logger.warning(f"Could not fetch video title: {e}")
+        return None
+
+async def _fetch_youtube_video(video_id):
+    """Fetch the title and the full raw transcript fragments for caching."""
+    logger.info(f"Fetching YouTube transcript for video ID: {video_id}")
+    ytt_api = YouTubeTranscriptApi()
+    title, fetched = await asyncio.gather(
+        _fetch_youtube_title(video_id),
+        tool_runner.run_blocking(ytt_api.fetch, video_id)
+    )
+    return {"title": title, "fragments": fetched.to_raw_data()}
+
+async def youtube_context(input):
     """
     Fetches the title and transcript of a YouTube video.
-    Returns the video title plus the beginning and end of the transcript.
+    Returns the video title plus the transcript, excerpted around the user's
+    question when it is too long.
     """
     try:
         url = input.get("url", "")
@@ -152,31 +270,24 @@ def youtube_context(input):
             return "Could not extract video ID from URL."
 
         video_id = match.group(1)
-        logger.info(f"Fetching YouTube transcript for video ID: {video_id}")
-
-        # Fetch video title via YouTube oEmbed (no API key required)
-        title = "YouTube Video"
-        try:
-            oembed_url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
-            oembed_response = requests.get(oembed_url, timeout=5)
-            if oembed_response.ok:
-                title = oembed_response.json().get("title", title)
-            logger.info(f"Found video title: {title}")
-        except Exception as e:
-            logger.warning(f"Could not fetch video title: {e}")
-
-        # Fetch transcript
-        ytt_api = YouTubeTranscriptApi()
-        fetched = ytt_api.fetch(video_id).to_raw_data()
-        transcript = " ".join(fragment.get("text", "") for fragment in fetched)
-
-        # Apply configurable char limit: half from start, half from end
-        max_chars = Config.YOUTUBE_TRANSCRIPT_MAX_CHARS
-        if len(transcript) > max_chars:
-            half = max_chars // 2
-            transcript = f"{transcript[:half]} [...] {transcript[-half:]}"
-
-        return f"Title: {title}\n\nTranscript:\n{transcript}"
+        video = await _youtube_cache.get_or_fetch(video_id, lambda: _fetch_youtube_video(video_id))
+
+        # A title lookup that failed when the transcript was cached is retried on later reads
+        title = video.get("title")
+        if title is None:
+            title = await _fetch_youtube_title(video_id)
+            if title is not None:
+                _youtube_cache.set(video_id, {**video, "title": title})
+
+        # Excerpt on read so changing the limit never invalidates the cache: the
+        # segments most relevant to the question, or half from start and half from end
+        transcript = excerpt_transcript(
+            video["fragments"],
+            input.get("question", ""),
+            Config.YOUTUBE_TRANSCRIPT_MAX_CHARS
+        )
+
+        return f"Title: {title or 'YouTube Video'}\n\nTranscript:\n{transcript}"
 
     except Exception as e:
         logger.error(f"Error fetching YouTube transcript: {e}")
@@ -236,21 +347,59 @@ def website_summary(input):
         logger.error(f"Error fetching website summary: {e}")
         return f"Error fetching website summary: {str(e)}"
 
-def wolfram(search_query):
-    query_string = search_query.get("search_query")
-
-    url = f"https://www.wolframalpha.com/api/v1/llm-api?"
-    url += f"input={query_string}"
-    url += f"&appid={Config.WOLFRAM_APPID}"
-    url += f"&maxchars={Config.WOLFRAM_MAX_CHARS}"
-    logger.debug(f"Using url to query wolfram: {url}")
+class WolframError(Exception):
+    """Non-200 Wolfram response; the body still explains the problem to the model."""
+
+_wolfram_cache = TieredCache(
+    "wolfram",
+    ttl=Config.WOLFRAM_CACHE_TTL_SECONDS,
+    negative_ttl=Config.WOLFRAM_CACHE_NEGATIVE_TTL_SECONDS,
+    max_entries=Config.WOLFRAM_CACHE_MAX_ENTRIES,
+)
+
+_QUOTE_FOLD = str.maketrans({"\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"'})
+
+def normalize_wolfram_query(query: str) -> str:
+    """Fold case, whitespace and sentence punctuation so equivalent queries share a cache entry."""
+    text = unicodedata.normalize("NFKC", query).casefold().translate(_QUOTE_FOLD)
+    text = re.sub(r'\s*([,;:])\s*', r'\1 ', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    # Trailing sentence punctuation and wrapping quotes never change the answer
+    text = text.rstrip("?!. ").strip().strip('"\'').strip()
+    return text
+
+async def _fetch_wolfram(query_string):
+    url = "https://www.wolframalpha.com/api/v1/llm-api"
+    params = {
+        "input": query_string,
+        "appid": Config.WOLFRAM_APPID,
+        "maxchars": Config.WOLFRAM_MAX_CHARS,
+    }
+    logger.debug(f"Querying wolfram with input: {query_string}")
 
     headers = {
         "Accept": "text/html,application/xhtml+xml,application/xml"
     }
-    response = requests.get(url, headers=headers)
-    logger.debug(f"response from wolfram: {response.text}")
-    return response.text
+    async with http_client.get_session().get(url, params=params, headers=headers) as response:
+        response_text = await response.text()
+    logger.debug(f"response from wolfram: {response_text}")
+    if response.status != 200:
+        raise WolframError(response_text)
+    return response_text
+
+async def wolfram(search_query):
+    query_string = search_query.get("search_query")
+    if not query_string:
+        return "Error: search_query is required."
+
+    try:
+        return await _wolfram_cache.get_or_fetch(
+            (normalize_wolfram_query(query_string), Config.WOLFRAM_MAX_CHARS),
+            lambda: _fetch_wolfram(query_string)
+        )
+    except (WolframError, CachedError) as e:
+        # Wolfram explains unanswerable queries in the body; pass that on as before
+        return str(e)
 
 async def hindsight_retain(input):
     content = input.get("content", "")
@@ -308,37 +457,79 @@ def custom_fuzzy_scorer(query, choice):
             return max(0, base_score - (choice_tokens - query_tokens))
     return base_score
 
-def threedmark_gpu_performance_lookup(input):
-    try:
-        headers = {
-            "Accept": "application/json, text/javascript, */*; q=0.01"
-        }
+# Splits "4070 vs 7800 XT, 3080 12GB" into separate GPU queries
+GPU_QUERY_SEPARATOR = re.compile(r'\s*(?:,|;|\bvs\b\.?|\bversus\b)\s*', re.IGNORECASE)
 
-        with open("claude/gpu_id_list.json", "r") as file:
-            gpu_id_list = json.load(file)
+THREEDMARK_TEST = "spy P"
+THREEDMARK_SCORE_TYPE = "graphicsScore"
 
-        name_to_id = {gpu.get("name"): gpu.get("id") for gpu in gpu_id_list}
-        gpu_name_list = [gpu.get("name") for gpu in gpu_id_list]
+_threedmark_cache = TieredCache(
+    "threedmark_median",
+    ttl=Config.THREEDMARK_CACHE_TTL_SECONDS,
+    stale_ttl=Config.THREEDMARK_CACHE_STALE_SECONDS,
+    negative_ttl=Config.THREEDMARK_CACHE_NEGATIVE_TTL_SECONDS,
+)
 
-        best_match = process.extractOne(input.get("gpu_model"), gpu_name_list, scorer=custom_fuzzy_scorer)
+async def _fetch_threedmark_median(gpu_name, gpu_id):
+    headers = {
+        "Accept": "application/json, text/javascript, */*; q=0.01"
+    }
 
-        if best_match is None:
-            return "Error: GPU model not found in database"
+    gpu_performance_query = f"https://www.3dmark.com/proxycon/ajax/medianscore?test={quote(THREEDMARK_TEST)}&gpuId={gpu_id}&country=&scoreType={THREEDMARK_SCORE_TYPE}"
+    async with http_client.get_session().get(gpu_performance_query, headers=headers) as reponse_perf:
+        reponse_perf.raise_for_status()
+        json_data_perf = await reponse_perf.json(content_type=None)
+    logger.info(f"Got response back for {gpu_name} from 3dmark: {json_data_perf}")
 
-        gpu_name, score = best_match[0], best_match[1]
-        gpu_id = name_to_id[gpu_name]
+    median = json_data_perf.get("median")
+    if median is None:
+        raise ValueError(f"3dmark returned no median score for {gpu_name}")
+    return median
 
-        gpu_performance_query = f"https://www.3dmark.com/proxycon/ajax/medianscore?test=spy%20P&gpuId={gpu_id}&country=&scoreType=graphicsScore"
-        reponse_perf = requests.get(gpu_performance_query, headers=headers)
-        json_data_perf = reponse_perf.json()
-        logger.info(f"Got response back for {gpu_name} from 3dmark: {json_data_perf}")
-        gpu_performance = round(json_data_perf.get("median"))
+async def _threedmark_median_score(gpu_name, gpu_id):
+    try:
+        median = await _threedmark_cache.get_or_fetch(
+            (THREEDMARK_TEST, gpu_id, THREEDMARK_SCORE_TYPE),
+            lambda: _fetch_threedmark_median(gpu_name, gpu_id)
+        )
+        gpu_performance = round(median)
+        logger.debug(f"3dmark cache stats: {_threedmark_cache.stats()}")
 
         return f"{gpu_name} median performance score is: {gpu_performance}"
     except Exception as e:
         logger.error(f"Error getting gpu performance: {e}")
         return f"Error getting gpu performance: {e}"
 
+async def threedmark_gpu_performance_lookup(input):
+    try:
+        gpu_models = [model for model in GPU_QUERY_SEPARATOR.split(input.get("gpu_model") or "") if model.strip()]
+        if not gpu_models:
+            return "Error: GPU model not found in database"
+
+        # All GPUs are matched in one batched scoring pass, identical to
+        # process.extractOne(..., scorer=custom_fuzzy_scorer) per model
+        best_matches = GPU_INDEX.best_matches(gpu_models)
+
+        lines = []
+        lookups = {}
+        for index, (gpu_model, best_match) in enumerate(zip(gpu_models, best_matches)):
+            if best_match is None:
+                lines.append("Error: GPU model not found in database")
+                continue
+            gpu_name, score, gpu_id = best_match
+            logger.debug(f"Matched GPU query '{gpu_model}' to {gpu_name} (score {score})")
+            lines.append("")
+            lookups[index] = _threedmark_median_score(gpu_name, gpu_id)
+
+        # Fetch all median scores concurrently
+        for index, line in zip(lookups, await asyncio.gather(*lookups.values())):
+            lines[index] = line
+
+        return "\n".join(lines)
+    except Exception as e:
+        logger.error(f"Error getting gpu performance: {e}")
+        return f"Error getting gpu performance: {e}"
+
 def web_research(input):
     """
     Performs web research using Claude API with web search tool enabled.
@@ -0,0 +1,180 @@
+"""
+Relevance-ranked excerpting for long YouTube transcripts.
+
+The raw transcript fragments are merged into timestamped segments, scored
+against the user's question with BM25, and the best segments (plus their
+neighbours, while budget remains) are packed into the character budget in time
+order. Falls back to the head/tail cut when there is no question or nothing
+in the transcript matches it.
+"""
+import math
+import re
+from collections import Counter
+
+SEGMENT_TARGET_CHARS = 400
+GAP_MARKER = " [...] "
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a an and are as at be but by do does did for from has have how i if in is it its
+me my of on or so that the their them then there these they this to was what when
+where which who why will with you your video about can just like
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def build_segments(fragments: list[dict], target_chars: int = SEGMENT_TARGET_CHARS) -> list[tuple[float, str]]:
+    """Merge consecutive transcript fragments into (start_seconds, text) segments of about target_chars."""
+    segments = []
+    start = None
+    parts = []
+    length = 0
+    for fragment in fragments:
+        text = (fragment.get("text") or "").strip()
+        if not text:
+            continue
+        if start is None:
+            start = float(fragment.get("start") or 0)
+        parts.append(text)
+        length += len(text) + 1
+        if length >= target_chars:
+            segments.append((start, " ".join(parts)))
+            start, parts, length = None, [], 0
+    if parts:
+        segments.append((start, " ".join(parts)))
+    return segments
+
+
+def bm25_scores(query_tokens: list[str], documents: list[str]) -> list[float]:
+    """Okapi BM25 score of every document for the query.
+
+    Only query terms are counted, with one compiled whole-word pattern run on
+    documents that contain a term at all, so no document is ever fully
+    tokenized. Document length is its word count.
+    """
+    query_terms = sorted(set(query_tokens), key=len, reverse=True)
+    if not documents or not query_terms:
+        return [0.0] * len(documents)
+    term_pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, query_terms)) + r")\b")
+
+    lengths = []
+    term_counts = []
+    document_frequency = Counter()
+    for document in documents:
+        lowered = document.lower()
+        lengths.append(lowered.count(" ") + 1)
+        # Plain substring checks are far cheaper than the regex and skip most segments
+        if not any(term in lowered for term in query_terms):
+            term_counts.append(Counter())
+            continue
+        counts = Counter(term_pattern.findall(lowered))
+        term_counts.append(counts)
+        document_frequency.update(counts.keys())
+    average_length = sum(lengths) / len(documents)
+
+    idf = {
+        term: math.log(1 + (len(documents) - frequency + 0.5) / (frequency + 0.5))
+        for term, frequency in document_frequency.items()
+    }
+
+    scores = []
+    for counts, length in zip(term_counts, lengths):
+        score = 0.0
+        if counts:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+            for term, frequency in counts.items():
+                score += idf[term] * frequency * (BM25_K1 + 1) / (frequency + norm)
+        scores.append(score)
+    return scores
+
+
+def head_tail_excerpt(transcript: str, max_chars: int) -> str:
+    """Half of the budget from the start, half from the end."""
+    if len(transcript) <= max_chars:
+        return transcript
+    half = max_chars // 2
+    return f"{transcript[:half]} [...] {transcript[-half:]}"
+
+
+def excerpt_transcript(fragments: list[dict], question: str, max_chars: int) -> str:
+    """
+    Build a transcript excerpt that fits in max_chars.
+
+    Args:
+        fragments: Raw transcript fragments with 'text' and 'start' keys
+        question: What the user asked about the video (may be empty)
+        max_chars: Character budget for the excerpt
+
+    Returns:
+        The full transcript if it fits, otherwise the most relevant timestamped
+        segments in time order, or a head/tail cut when nothing is relevant
+    """
+    transcript = " ".join(fragment.get("text", "") for fragment in fragments)
+    if len(transcript) <= max_chars:
+        return transcript
+
+    query_tokens = tokenize(question or "")
+    segments = build_segments(fragments)
+    if not query_tokens or not segments:
+        return head_tail_excerpt(transcript, max_chars)
+
+    scores = bm25_scores(query_tokens, [text for _, text in segments])
+    ranked = sorted((index for index, score in enumerate(scores) if score > 0), key=lambda index: -scores[index])
+    if not ranked:
+        return head_tail_excerpt(transcript, max_chars)
+
+    def cost(index: int) -> int:
+        start, text = segments[index]
+        return len(format_timestamp(start)) + len(text) + 3 + len(GAP_MARKER)
+
+    chosen = set()
+    used = 0
+    for index in ranked:
+        if used + cost(index) <= max_chars:
+            chosen.add(index)
+            used += cost(index)
+
+    # Spend leftover budget on context around the best matches, nearest first
+    anchors = [index for index in ranked if index in chosen]
+    distance = 1
+    while anchors and distance < len(segments):
+        added = False
+        for anchor in anchors:
+            for index in (anchor + distance, anchor - distance):
+                if 0 <= index < len(segments) and index not in chosen and used + cost(index) <= max_chars:
+                    chosen.add(index)
+                    used += cost(index)
+                    added = True
+        if not added:
+            break
+        distance += 1
+
+    if not chosen:
+        # Even the best segment is over budget; trim it rather than send nothing
+        start, text = segments[ranked[0]]
+        prefix = f"[{format_timestamp(start)}] "
+        return prefix + text[:max(0, max_chars - len(prefix))]
+
+    parts = []
+    previous = None
+    for index in sorted(chosen):
+        if previous is not None and index != previous + 1:
+            parts.append(GAP_MARKER.strip())
+        start, text = segments[index]
+        parts.append(f"[{format_timestamp(start)}] {text}")
+        previous = index
+    return "\n".join(parts)
@@ -4,8 +4,15 @@ from typing import Optional, Any
 from bot.config import Config
 from openai import AsyncOpenAI
 from claude import tools
+from bot import tool_runner
+from bot.streaming import StreamingReply
+from bot.context_budget import ESTIMATOR, count_images
+from bot.agent_loop import FINALIZE_PROMPT, LIMIT_MESSAGE, LoopController
+from bot import tracing
+from bot import metering
 import json
-import inspect
+
+REASONING_ONLY_MESSAGE = "Sorry, I couldn't put together an answer to that. Please try again."
 
 # Initialize OpenAI-compatible client
 openaiClient = AsyncOpenAI(
@@ -40,9 +47,7 @@ async def execute_tool(tool_name, tool_input):
 
         if hasattr(tools, tool_name):
             tool_function = getattr(tools, tool_name)
-            result = tool_function(tool_input)
-            if inspect.isawaitable(result):
-                result = await result
+            result = await tool_runner.run_tool(tool_name, tool_function, tool_input)
             result_str = str(result)
             logger.info("Tool '%s' returned result (%d chars)", tool_name, len(result_str))
             logger.debug("Full tool result for '%s': %s", tool_name, result_str)
@@ -55,10 +60,122 @@ async def execute_tool(tool_name, tool_input):
         return f"Error calling tool '{tool_name}': {e}"
 
 
+def parse_tool_arguments(raw_arguments: Optional[str]) -> tuple[dict, Optional[str]]:
+    """
+    Decode a tool call's JSON arguments.
+
+    Returns:
+        Tuple of (arguments, error). On failure arguments is empty and error is a
+        message the model can act on to retry the call.
+    """
+    if not raw_arguments or not raw_arguments.strip():
+        return {}, None
+    try:
+        arguments = json.loads(raw_arguments)
+    except json.JSONDecodeError as e:
+        return {}, f"Error: tool arguments were not valid JSON ({e.msg} at position {e.pos}). Retry the call with a valid JSON object."
+    if not isinstance(arguments, dict):
+        return {}, "Error: tool arguments must be a JSON object. Retry the call with a valid JSON object."
+    return arguments, None
+
+
+async def _as_result(value: Any) -> Any:
+    return value
+
+
+def _tool_call_dicts(tool_calls) -> list[dict[str, Any]]:
+    return [
+        {
+            "id": tc.id,
+            "name": tc.function.name,  # type: ignore[union-attr]
+            "arguments": tc.function.arguments  # type: ignore[union-attr]
+        }
+        for tc in tool_calls or []
+    ]
+
+
+async def _complete(request: dict) -> tuple[str, str, list[dict[str, Any]], Any]:
+    """
+    Non-streamed completion.
+
+    Returns:
+        Tuple of (content, reasoning, tool_calls, usage) with tool calls as
+        id/name/arguments dicts; usage is None if the server sent none
+    """
+    response = await openaiClient.chat.completions.create(**request)
+    message = response.choices[0].message
+    reasoning = getattr(message, "reasoning_content", None) or ""
+    return message.content or "", reasoning, _tool_call_dicts(message.tool_calls), response.usage
+
+
+async def _stream_complete(request: dict, stream: StreamingReply) -> tuple[str, str, list[dict[str, Any]], Any]:
+    """
+    Streamed completion that pushes content deltas to `stream`.
+
+    Tool calls arrive as fragments keyed by index: the id and name come once,
+    the JSON arguments are split across many chunks and are concatenated here.
+    Once a tool call starts, this round's text is dropped from the Discord
+    message, as in the Claude path. Usage is requested with include_usage
+    and arrives in a final chunk without choices.
+
+    Returns:
+        Same shape as _complete()
+    """
+    content_parts: list[str] = []
+    reasoning_parts: list[str] = []
+    calls: dict[int, dict[str, Any]] = {}
+    last_index = 0
+    usage = None
+
+    chunks = await openaiClient.chat.completions.create(**request, stream=True, stream_options={"include_usage": True})
+    async for chunk in chunks:
+        if chunk.usage:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta is None:
+            continue
+
+        reasoning = getattr(delta, "reasoning_content", None)
+        if reasoning:
+            reasoning_parts.append(reasoning)
+
+        if delta.content:
+            content_parts.append(delta.content)
+            if not calls:
+                stream.push(delta.content)
+
+        for tool_call in delta.tool_calls or []:
+            if not calls:
+                logger.debug("Tool call started mid-stream, discarding streamed text")
+                stream.reset()
+            # Some servers omit the index; a new id then marks a new call
+            if tool_call.index is not None:
+                last_index = tool_call.index
+            elif tool_call.id and last_index in calls:
+                last_index = max(calls) + 1
+            entry = calls.setdefault(last_index, {"id": None, "name": "", "arguments": ""})
+            if tool_call.id:
+                entry["id"] = tool_call.id
+            function = tool_call.function
+            if function is not None:
+                if function.name and not entry["name"]:
+                    entry["name"] = function.name
+                if function.arguments:
+                    entry["arguments"] += function.arguments
+
+    tool_calls = [calls[index] for index in sorted(calls)]
+    for position, entry in enumerate(tool_calls):
+        entry["id"] = entry["id"] or f"call_{position}"
+    return "".join(content_parts), "".join(reasoning_parts), tool_calls, usage
+
+
 async def generate_openai_response(
     messages: list,
     system_prompt: str,
-    channel: Optional[discord.abc.Messageable] = None
+    channel: Optional[discord.abc.Messageable] = None,
+    stream: Optional[StreamingReply] = None
 ) -> str:
     """
     Generic function to generate a response from OpenAI-compatible LLM with tool support.
@@ -67,79 +184,127 @@ async def generate_openai_response(
         messages: List of message dicts with 'role' and 'content' keys
         system_prompt: The system prompt to use
         channel: Optional Discord channel (for future typing indicators)
+        stream: Optional StreamingReply that receives text as it is generated
 
     Returns:
         The response text from the LLM
     """
     # Prepend system message to conversation (OpenAI format)
     conversation: list[dict[str, Any]] = [{"role": "system", "content": system_prompt}] + messages.copy()
+    reasoning_retries = 0
+    estimated_input: Optional[int] = ESTIMATOR.request(system_prompt, messages, TOOLS)
+    controller = LoopController("openai")
 
     try:
         while True:
             logger.debug("Calling OpenAI API: model=%s, conversation_length=%d",
                         Config.OPENAI_MODEL_NAME, len(conversation))
 
-            response = await openaiClient.chat.completions.create(
+            request = dict(
                 model=Config.OPENAI_MODEL_NAME,
                 max_tokens=Config.MAX_TOKENS,
-                messages=conversation,  # type: ignore[arg-type]
-                tools=TOOLS,  # type: ignore[arg-type]
+                messages=conversation,
+                tools=TOOLS,
                 extra_body={"thinking": {"type": "disabled"}}
             )
+            if controller.should_finalize():
+                # Not every local server supports tool_choice, so drop the tools outright
+                del request["tools"]
+                request["messages"] = conversation + [{"role": "user", "content": FINALIZE_PROMPT}]
 
-            message = response.choices[0].message
-            finish_reason = response.choices[0].finish_reason
+            with tracing.span("llm.call", model=Config.OPENAI_MODEL_NAME, round=controller.rounds,
+                              finalize=controller.finalizing, streamed=stream is not None) as call_span:
+                if stream is not None:
+                    content, reasoning, tool_calls, usage = await _stream_complete(request, stream)
+                else:
+                    content, reasoning, tool_calls, usage = await _complete(request)
+                if call_span is not None and usage is not None:
+                    call_span.set(input_tokens=usage.prompt_tokens, output_tokens=usage.completion_tokens,
+                                  tool_calls=len(tool_calls))
+            if usage is not None:
+                input_tokens, output_tokens = usage.prompt_tokens or 0, usage.completion_tokens or 0
+                if estimated_input is not None and usage.prompt_tokens:
+                    ESTIMATOR.calibrate(estimated_input, usage.prompt_tokens, count_images(messages) * ESTIMATOR.image_tokens())
+                    estimated_input = None  # Only the first call's conversation matches the estimate
+            else:
+                # Some servers send no usage even when asked; meter an estimate rather than nothing
+                input_tokens = ESTIMATOR.request("", request["messages"], request.get("tools"))
+                output_tokens = ESTIMATOR.text(content + reasoning + "".join(tc["arguments"] or "" for tc in tool_calls))
+                logger.debug("No usage from the server, estimated %d input / %d output tokens", input_tokens, output_tokens)
+            controller.record(input_tokens, output_tokens)
+            metering.record_call("openai", Config.OPENAI_MODEL_NAME, input_tokens, output_tokens)
 
-            if message.tool_calls:
-                logger.info("Detected tool call(s): %d tools", len(message.tool_calls))
+            if tool_calls and not controller.finalizing:
+                logger.info("Detected tool call(s): %d tools", len(tool_calls))
 
                 # Add assistant message with tool calls to conversation
                 assistant_msg = {
                     "role": "assistant",
-                    "content": message.content or "",
+                    "content": content,
                     "tool_calls": [
                         {
-                            "id": tc.id,
+                            "id": tc["id"],
                             "type": "function",
                             "function": {
-                                "name": tc.function.name,  # type: ignore[union-attr]
-                                "arguments": tc.function.arguments  # type: ignore[union-attr]
+                                "name": tc["name"],
+                                "arguments": tc["arguments"]
                             }
                         }
-                        for tc in message.tool_calls
+                        for tc in tool_calls
                     ]
                 }
                 conversation.append(assistant_msg)
 
-                # Execute each tool and collect results
-                for tool_call in message.tool_calls:
-                    tool_name = tool_call.function.name  # type: ignore[union-attr]
-                    tool_args = json.loads(tool_call.function.arguments)  # type: ignore[union-attr]
+                # Decode arguments up front; malformed JSON goes back to the model as a tool error
+                pending = []
+                for tool_call in tool_calls:
+                    tool_name = tool_call["name"]
+                    tool_args, parse_error = parse_tool_arguments(tool_call["arguments"])
+                    if parse_error:
+                        logger.warning(f"Malformed arguments for tool {tool_name}: {parse_error}")
+                        pending.append(_as_result(parse_error))
+                    else:
+                        logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
+                        pending.append(execute_tool(tool_name, tool_args))
 
-                    logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
+                # Execute all tool calls of this turn concurrently; results keep call order
+                tool_results = await tool_runner.gather_limited(pending)
 
-                    tool_result = await execute_tool(tool_name, tool_args)
+                for tool_call, tool_result in zip(tool_calls, tool_results):
+                    tool_name = tool_call["name"]
+                    if isinstance(tool_result, BaseException):
+                        logger.error(f"Error calling tool '{tool_name}': {tool_result}")
+                        tool_result = f"Error calling tool '{tool_name}': {tool_result}"
 
                     # Add tool result to conversation (OpenAI format)
                     conversation.append({
                         "role": "tool",
-                        "tool_call_id": tool_call.id,
+                        "tool_call_id": tool_call["id"],
                         "name": tool_name,
                         "content": str(tool_result)
                     })
+                controller.tool_round_done()
 
             else:
-                reasoning = getattr(message, "reasoning_content", None)
-                final_text = message.content or ""
+                final_text = content
                 if reasoning:
                     logger.info(f"Reasoning: \n{reasoning}")
                 else:
                     logger.info(f"No reasoning was used")
                 if not final_text and reasoning:
-                    logger.info("Model returned reasoning-only response, rerunning generation")
-                    continue  # loop again with the same conversation state
+                    if reasoning_retries < Config.OPENAI_REASONING_ONLY_RETRIES and not controller.finalizing:
+                        reasoning_retries += 1
+                        logger.info("Model returned reasoning-only response, rerunning generation (%d/%d)",
+                                    reasoning_retries, Config.OPENAI_REASONING_ONLY_RETRIES)
+                        continue  # loop again with the same conversation state
+                    # Out of retries. The reasoning is logged above but never posted to users
+                    logger.warning("Model kept returning reasoning-only responses, replying with a failure notice")
+                    final_text = REASONING_ONLY_MESSAGE
+                if controller.finalizing and not final_text.strip():
+                    final_text = LIMIT_MESSAGE
 
                 logger.info(f"Generated: \n{final_text}")
+                logger.info("OpenAI request finished: %s", controller.summary())
                 return final_text
 
     except Exception as e:
@@ -0,0 +1,10 @@
+"""Run from the v3 directory: python -m pytest tests"""
+
+import os
+import sys
+
+V3_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if V3_DIR not in sys.path:
+    sys.path.insert(0, V3_DIR)
+# Modules open prompts/ and local_llm/tools.json relative to v3
+os.chdir(V3_DIR)
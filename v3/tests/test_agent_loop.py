@@ -0,0 +1,20 @@
+import logging
+
+from bot import agent_loop, runtime_stats
+from bot.agent_loop import LoopController
+from bot.config import Config
+
+
+def test_limit_is_counted_logged_and_reported(monkeypatch, caplog):
+    monkeypatch.setattr(Config, "AGENT_MAX_TOOL_ROUNDS", 1)
+    monkeypatch.setattr(agent_loop, "_limit_counts", dict.fromkeys(agent_loop._limit_counts, 0))
+    controller = LoopController("anthropic")
+    assert not controller.should_finalize()
+    controller.tool_round_done()
+    with caplog.at_level(logging.WARNING, logger=agent_loop.logger.name):
+        assert controller.should_finalize()
+        # Only the first check after the limit triggers the finalize call
+        assert not controller.should_finalize()
+    assert agent_loop.stats()["tool_rounds"] == 1
+    assert "limit 'tool_rounds' hit" in caplog.text
+    assert "**Agent loop limits hit**: 1 tool rounds, 0 deadline, 0 tokens, 0 cost" in runtime_stats.report()
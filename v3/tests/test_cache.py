@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+import pytest
+
+from bot.cache import CachedError, TieredCache
+from bot.config import Config
+
+
+def _cache(name: str) -> TieredCache:
+    return TieredCache(name, ttl=60, stale_ttl=600, negative_ttl=60, persistent=False)
+
+
+async def _fail():
+    raise RuntimeError("upstream down")
+
+
+def _expire(cache: TieredCache, key: str):
+    value, _, is_error = cache._memory[key]
+    cache._memory[key] = (value, time.time() - 1, is_error)
+
+
+def test_failed_refresh_keeps_stale_value(monkeypatch):
+    monkeypatch.setattr(Config, "CACHE_ENABLED", True)
+    cache = _cache("test_failed_refresh")
+
+    async def ok():
+        return "good"
+
+    async def run():
+        assert await cache.get_or_fetch("key", ok) == "good"
+        _expire(cache, "key")
+        # Stale hit starts a background refresh, which fails
+        assert await cache.get_or_fetch("key", _fail) == "good"
+        await asyncio.gather(*cache._refreshing)
+        assert await cache.get_or_fetch("key", _fail) == "good"
+        await asyncio.gather(*cache._refreshing)
+
+    asyncio.run(run())
+    assert cache.stats()["errors"] == 2
+    assert cache.stats()["negative_hits"] == 0
+
+
+def test_cold_miss_error_is_remembered(monkeypatch):
+    monkeypatch.setattr(Config, "CACHE_ENABLED", True)
+    cache = _cache("test_cold_miss_error")
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cache.get_or_fetch("key", _fail)
+        with pytest.raises(CachedError):
+            await cache.get_or_fetch("key", _fail)
+
+    asyncio.run(run())
+    assert cache.stats()["negative_hits"] == 1
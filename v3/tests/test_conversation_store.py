@@ -0,0 +1,65 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from bot import conversation_store
+from bot.config import Config
+
+BOT_USER_ID = 1
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch, tmp_path):
+    conversation_store.flush()
+    monkeypatch.setattr(Config, "CONVERSATION_STORE_ENABLED", True)
+    monkeypatch.setattr(Config, "CONVERSATION_STORE_DB", os.path.join(tmp_path, "conversations.sqlite3"))
+    monkeypatch.setattr(conversation_store, "_db", None)
+    monkeypatch.setattr(conversation_store, "_unavailable", False)
+    yield
+    conversation_store.flush()
+
+
+def _message(message_id: int, parent_id, content: str):
+    return SimpleNamespace(
+        id=message_id,
+        reference=SimpleNamespace(message_id=parent_id) if parent_id else None,
+        channel=SimpleNamespace(id=10),
+        guild=SimpleNamespace(id=20),
+        author=SimpleNamespace(id=2, display_name="user2"),
+        content=content,
+        attachments=[],
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+def _chain(message_id: int) -> list[str]:
+    return [row["content"] for row in asyncio.run(conversation_store.load_chain(message_id, 10))]
+
+
+def test_load_chain_sees_queued_messages():
+    conversation_store.record(_message(100, None, "first"), BOT_USER_ID)
+    conversation_store.record(_message(101, 100, "second"), BOT_USER_ID)
+    assert _chain(101) == ["second", "first"]
+
+
+def test_edit_updates_stored_and_queued_rows():
+    conversation_store.record(_message(100, None, "before"), BOT_USER_ID)
+    conversation_store.flush()
+    conversation_store.record(_message(101, 100, "queued before"), BOT_USER_ID, replace=False)
+    conversation_store.update_content(100, f"<@{BOT_USER_ID}> after", BOT_USER_ID)
+    conversation_store.update_content(101, "queued after", BOT_USER_ID)
+    assert _chain(101) == ["queued after", "after"]
+
+
+def test_delete_removes_stored_and_queued_rows():
+    conversation_store.record(_message(100, None, "root"), BOT_USER_ID)
+    conversation_store.record(_message(101, 100, "middle"), BOT_USER_ID)
+    conversation_store.flush()
+    conversation_store.record(_message(102, 101, "queued"), BOT_USER_ID)
+    conversation_store.delete({101, 102})
+    assert _chain(102) == []
+    assert _chain(101) == []
+    assert _chain(100) == ["root"]
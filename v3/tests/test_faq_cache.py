@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from bot import runtime_stats
+from bot.config import Config
+from bot.faq_cache import FAQCache, question_text
+
+PROMPT = "system prompt"
+
+
+def _cache() -> FAQCache:
+    return FAQCache(threshold=Config.FAQ_CACHE_SIMILARITY, ttl=3600, max_entries=100)
+
+
+def _turn(text: str) -> list[dict]:
+    return [{"role": "user", "content": json.dumps({"message": text})}]
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("my 4070 is not working", "my 4090 is not working"),
+    ("how do I set up my mic in discord", "how do I set up my monitor in discord"),
+    ("how do I update my gpu driver on windows 11", "how do I update my cpu cooler on windows 11"),
+    ("is the rtx 3080 good for 1440p gaming", "is the rtx 3080 good for 4k gaming"),
+])
+def test_near_miss_questions_do_not_share_answers(stored, asked):
+    cache = _cache()
+    cache.store("forum", PROMPT, stored, "answer about the first question")
+    assert cache.lookup("forum", PROMPT, asked) is None
+
+
+def test_same_question_reworded_only_in_case_and_punctuation_hits():
+    cache = _cache()
+    cache.store("forum", PROMPT, "How do I update my GPU driver on Windows 11?", "answer")
+    assert cache.lookup("forum", PROMPT, "how do i update my gpu driver on windows 11") == "answer"
+
+
+def test_auto_reply_trigger_text_is_ignored(monkeypatch):
+    monkeypatch.setattr(Config, "FAQ_CACHE_ENABLED", True)
+    # The shared trigger phrase must not make different questions look alike
+    first = question_text("auto_reply", _turn("my 4070 is not working"), r"not working")
+    second = question_text("auto_reply", _turn("my 4090 is not working"), r"not working")
+    assert "not working" not in first
+    cache = _cache()
+    cache.store("auto_reply", PROMPT, first, "answer about the 4070")
+    assert cache.lookup("auto_reply", PROMPT, second) is None
+    # A different trigger around the same question still finds the answer
+    third = question_text("auto_reply", _turn("someone help me, how do I update bios"), r"someone help me")
+    fourth = question_text("auto_reply", _turn("i need help: how do I update bios"), r"i need help")
+    cache.store("auto_reply", PROMPT, third, "bios answer")
+    assert cache.lookup("auto_reply", PROMPT, fourth) == "bios answer"
+
+
+def test_trigger_only_message_is_not_cached(monkeypatch):
+    monkeypatch.setattr(Config, "FAQ_CACHE_ENABLED", True)
+    assert question_text("auto_reply", _turn("Not working!"), r"not working") is None
+
+
+def test_default_similarity_is_strict():
+    assert Config.FAQ_CACHE_SIMILARITY >= 0.9
+
+
+def test_stats_report_hit_rate():
+    cache = _cache()
+    cache.store("forum", PROMPT, "how do I reset my bios", "answer")
+    cache.lookup("forum", PROMPT, "how do I reset my bios")
+    cache.lookup("forum", PROMPT, "how do I flash my bios")
+    assert cache.stats()["hit_rate"] == 0.5
+    assert "**FAQ cache**" in runtime_stats.report()
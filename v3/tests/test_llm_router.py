@@ -0,0 +1,55 @@
+import asyncio
+
+from bot import llm_router, metering, scheduler
+from bot.config import Config
+
+
+def _stub_provider(monkeypatch, seen: list):
+    async def fake_response(provider, messages, system_prompt, channel, discord_message, stream):
+        seen.append(messages)
+        return "reply"
+    monkeypatch.setattr(llm_router, "_get_llm_response", fake_response)
+    monkeypatch.setattr(llm_router, "render_system_prompt", lambda prompt: prompt)
+
+
+def test_route_reaches_scheduler_with_metering_disabled(monkeypatch):
+    monkeypatch.setattr(Config, "METERING_ENABLED", False)
+    monkeypatch.setattr(Config, "LLM_COALESCE_ENABLED", False)
+    monkeypatch.setattr(Config, "FAQ_CACHE_ENABLED", False)
+    _stub_provider(monkeypatch, [])
+    before = scheduler.stats()["routes"].get("auto_reply", {}).get("admitted", 0)
+
+    async def run():
+        with metering.start_request("auto_reply", 1, 2):
+            assert metering.current_request() is None
+            return await llm_router.get_llm_response([{"role": "user", "content": "hi"}], "system",
+                                                     route="auto_reply", guild_id=2)
+
+    assert asyncio.run(run()) == "reply"
+    assert scheduler.stats()["routes"]["auto_reply"]["admitted"] == before + 1
+
+
+def _auto_reply(seen: list) -> str:
+    from bot.message_format import format_user_message
+
+    async def run():
+        await llm_router.get_llm_response([{"role": "user", "content": format_user_message("alice", "not working")}],
+                                          "system", route="auto_reply", guild_id=2)
+    asyncio.run(run())
+    return seen[-1][0]["content"]
+
+
+def test_author_kept_when_replies_are_not_shared(monkeypatch):
+    monkeypatch.setattr(Config, "LLM_COALESCE_ENABLED", False)
+    monkeypatch.setattr(Config, "FAQ_CACHE_ENABLED", False)
+    seen = []
+    _stub_provider(monkeypatch, seen)
+    assert "alice" in _auto_reply(seen)
+
+
+def test_author_stripped_when_coalescing(monkeypatch):
+    monkeypatch.setattr(Config, "LLM_COALESCE_ENABLED", True)
+    monkeypatch.setattr(Config, "FAQ_CACHE_ENABLED", False)
+    seen = []
+    _stub_provider(monkeypatch, seen)
+    assert "alice" not in _auto_reply(seen)
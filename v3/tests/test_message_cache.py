@@ -0,0 +1,13 @@
+from types import SimpleNamespace
+
+from bot import message_cache
+
+
+def test_forgotten_messages_are_not_found():
+    kept = SimpleNamespace(id=501)
+    deleted = SimpleNamespace(id=502)
+    message_cache.remember(kept)
+    message_cache.remember(deleted)
+    message_cache.forget({502, 503})
+    assert message_cache.lookup(501) == (kept, "lru")
+    assert message_cache.lookup(502) == (None, "missing")
@@ -0,0 +1,34 @@
+import asyncio
+import json
+
+from bot import runtime_stats, tool_runner
+from bot.config import Config
+
+
+def test_waiting_for_a_tool_slot_counts_against_the_deadline(monkeypatch):
+    monkeypatch.setattr(Config, "TOOL_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(Config, "TOOL_TIMEOUTS", {"slow_tool": 5, "quick_tool": 0.1})
+    monkeypatch.setattr(tool_runner, "_semaphore", None)
+    monkeypatch.setattr(tool_runner, "_stats", {})
+
+    async def slow_tool(tool_input):
+        await asyncio.sleep(0.5)
+        return "slow"
+
+    async def quick_tool(tool_input):
+        return "quick"
+
+    async def run():
+        slow = asyncio.create_task(tool_runner.run_tool("slow_tool", slow_tool, {}))
+        await asyncio.sleep(0)
+        # The only slot is held by another request's tool for longer than this deadline
+        quick = await asyncio.wait_for(tool_runner.run_tool("quick_tool", quick_tool, {}), 1)
+        return await slow, quick
+
+    slow, quick = asyncio.run(run())
+    assert slow == "slow"
+    assert json.loads(quick)["error"] == "timeout"
+    stats = tool_runner.get_stats()["quick_tool"]
+    assert stats["timeouts"] == 1
+    assert stats["queued_seconds"] >= 0.1
+    assert "`quick_tool`: 1 calls, 1 timed out" in runtime_stats.report()